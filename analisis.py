@@ -0,0 +1,42 @@
+import io
+
+import pandas as pd
+from sqlalchemy import Integer, cast, extract, func
+
+from models import CostoEnergia
+
+# Piezas comunes de los análisis sobre costos_energia (kpis.py, factor_potencia.py, anomalias.py):
+# el periodo de cada factura y la lectura y escritura por columnas con COPY.
+
+# Año y mes de la factura: si faltan se toman de fecha_inicio_factura. Los análisis usan estas
+# expresiones para que todos asignen cada factura al mismo periodo.
+ANO_FACTURA = func.coalesce(CostoEnergia.ano, cast(extract('year', CostoEnergia.fecha_inicio_factura), Integer)).label('ano')
+MES_FACTURA = func.coalesce(CostoEnergia.mes, cast(extract('month', CostoEnergia.fecha_inicio_factura), Integer)).label('mes')
+
+# Leer el resultado de una consulta con COPY ... TO STDOUT y pasarlo a columnas con tipos fijos.
+# Es varias veces más rápido que recorrer filas de SQLAlchemy, y con los tipos fijos una columna
+# toda nula sigue siendo numérica (si quedara como object, las agregaciones de pandas serían mucho
+# más lentas). COPY no admite parámetros, así que se incrustan como literales: usar solo con
+# valores numéricos. Corre en la transacción de la sesión.
+def leer_columnas(db, consulta, tipos):
+    sql = consulta.compile(dialect=db.get_bind().dialect, compile_kwargs={'literal_binds': True})
+    buffer = io.StringIO()
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    finally:
+        cursor.close()
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype=tipos)
+
+# Cargar columnas de un DataFrame en una tabla con COPY ... FROM STDIN (NaN y NA quedan como NULL).
+# Corre en la transacción de la sesión; el commit lo hace quien llama.
+def escribir_columnas(db, tabla, datos, columnas):
+    buffer = io.StringIO()
+    datos[columnas].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
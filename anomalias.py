@@ -0,0 +1,159 @@
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, column, delete, exists, func, select, table, text
+from sqlalchemy.dialects.postgresql import insert
+
+from analisis import ANO_FACTURA, MES_FACTURA, escribir_columnas, leer_columnas
+from database import SessionLocal
+from models import AnomaliaFactura, AnomaliaPendiente, CostoEnergia
+
+# Detección de facturas anómalas (errores de medidor, fugas) en costos_energia.
+# Las facturas de cada sede se ordenan por periodo y cada una se compara con las ANOMALIAS_VENTANA
+# facturas anteriores de la misma sede (media y desviación móviles, sin incluirla) y con el mismo
+# mes del año anterior. Las facturas marcadas quedan en anomalias_factura.
+# La corrida es incremental por sede: los triggers de costos_energia anotan en anomalias_pendientes
+# las sedes con facturas insertadas, borradas o corregidas, y la corrida reevalúa todo el histórico de
+# esas sedes (una corrección cambia también las ventanas de las facturas posteriores).
+
+# Llave del bloqueo consultivo que impide dos corridas a la vez
+BLOQUEO = 'anomalias'
+
+ANOMALIAS_VENTANA = int(os.getenv("ANOMALIAS_VENTANA", "12"))
+# Facturas anteriores necesarias para calcular la media y la desviación móviles
+ANOMALIAS_MIN_FACTURAS = int(os.getenv("ANOMALIAS_MIN_FACTURAS", "6"))
+# Desviaciones estándar respecto a la media móvil a partir de las cuales la factura se marca
+ANOMALIAS_UMBRAL_Z = float(os.getenv("ANOMALIAS_UMBRAL_Z", "3"))
+# Variación respecto al mismo mes del año anterior (0.5 = 50 % más o menos) a partir de la cual se marca
+ANOMALIAS_UMBRAL_ANUAL = float(os.getenv("ANOMALIAS_UMBRAL_ANUAL", "0.5"))
+
+TIPOS_FACTURAS = {
+    'costoid': 'int64', 'sedeid': 'int64', 'ano': 'float64', 'mes': 'float64',
+    'fecha_inicio_factura': 'object', 'consumo_pkwh': 'float64', 'valor_factura': 'float64',
+}
+
+# Métrica de costos_energia y sufijo de sus columnas en anomalias_factura
+METRICAS = {'consumo_pkwh': 'consumo', 'valor_factura': 'valor'}
+
+COLUMNAS_ANOMALIA = [columna.name for columna in AnomaliaFactura.__table__.columns]
+
+# Facturas con sede de las sedes indicadas, o de todas con sedes=None
+def consulta_facturas(sedes=None):
+    consulta = select(
+        CostoEnergia.costoid,
+        CostoEnergia.sedeid,
+        ANO_FACTURA,
+        MES_FACTURA,
+        CostoEnergia.fecha_inicio_factura,
+        CostoEnergia.consumo_pkwh,
+        CostoEnergia.valor_factura,
+    ).where(CostoEnergia.sedeid.is_not(None))
+    if sedes is not None:
+        consulta = consulta.where(CostoEnergia.sedeid.in_(sedes))
+    return consulta
+
+# Calcular las estadísticas de todas las facturas y devolver las que quedan marcadas. Las ventanas
+# móviles se calculan por sede con groupby().rolling; closed='left' deja la factura fuera de su propia
+# ventana. La referencia anual es el promedio de las facturas de la sede en el mismo mes del año
+# anterior. Las facturas sin periodo no se evalúan.
+def analizar(facturas, ventana=ANOMALIAS_VENTANA, min_facturas=ANOMALIAS_MIN_FACTURAS,
+             umbral_z=ANOMALIAS_UMBRAL_Z, umbral_anual=ANOMALIAS_UMBRAL_ANUAL):
+    facturas = (
+        facturas.dropna(subset=['ano', 'mes'])
+        .astype({'ano': 'int64', 'mes': 'int64'})
+        .sort_values(['sedeid', 'ano', 'mes', 'fecha_inicio_factura', 'costoid'], kind='stable', ignore_index=True)
+    )
+    metricas = list(METRICAS)
+
+    moviles = facturas.groupby('sedeid', sort=False)[metricas].rolling(ventana, min_periods=min_facturas, closed='left')
+    media = moviles.mean().reset_index(level=0, drop=True)
+    desviacion = moviles.std().reset_index(level=0, drop=True)
+
+    mensual = facturas.groupby(['sedeid', 'ano', 'mes'], as_index=False)[metricas].mean()
+    mensual['ano'] += 1
+    anterior = facturas[['sedeid', 'ano', 'mes']].merge(mensual, on=['sedeid', 'ano', 'mes'], how='left')
+
+    motivos = pd.Series('', index=facturas.index)
+    for metrica, sufijo in METRICAS.items():
+        valor = facturas[metrica]
+        facturas[f'media_{sufijo}'] = media[metrica]
+        facturas[f'desviacion_{sufijo}'] = desviacion[metrica]
+        facturas[f'z_{sufijo}'] = (valor - media[metrica]) / desviacion[metrica].where(desviacion[metrica] > 0)
+        facturas[f'variacion_anual_{sufijo}'] = valor / anterior[metrica].where(anterior[metrica] > 0) - 1
+        motivos += np.where(facturas[f'z_{sufijo}'].abs() >= umbral_z, f'{sufijo}_atipico,', '')
+        motivos += np.where(facturas[f'variacion_anual_{sufijo}'].abs() >= umbral_anual, f'{sufijo}_anual,', '')
+    facturas['motivos'] = motivos.str.rstrip(',')
+    facturas['detectado_en'] = datetime.now().replace(microsecond=0)
+
+    return facturas[facturas['motivos'] != '']
+
+# Guardar las anomalías de las sedes evaluadas (todas con sedes=None): se borran las de facturas que
+# ya no quedan marcadas y se insertan o actualizan las demás. Una factura que sigue marcada por los
+# mismos motivos conserva su detectado_en, así no vuelve a aparecer como reciente.
+def _guardar(db, marcadas, sedes):
+    db.execute(text("CREATE TEMP TABLE anomalias_nuevas (LIKE anomalias_factura) ON COMMIT DROP"))
+    escribir_columnas(db, 'anomalias_nuevas', marcadas, COLUMNAS_ANOMALIA)
+    nuevas = table('anomalias_nuevas', *(column(nombre) for nombre in COLUMNAS_ANOMALIA))
+
+    borrar = delete(AnomaliaFactura).where(~exists().where(nuevas.c.costoid == AnomaliaFactura.costoid))
+    if sedes is not None:
+        borrar = borrar.where(AnomaliaFactura.sedeid.in_(sedes))
+    db.execute(borrar)
+
+    guardar = insert(AnomaliaFactura).from_select(COLUMNAS_ANOMALIA, select(nuevas))
+    valores = {nombre: guardar.excluded[nombre] for nombre in COLUMNAS_ANOMALIA if nombre != 'costoid'}
+    valores['detectado_en'] = case(
+        (AnomaliaFactura.motivos == guardar.excluded.motivos, AnomaliaFactura.detectado_en),
+        else_=guardar.excluded.detectado_en,
+    )
+    db.execute(guardar.on_conflict_do_update(index_elements=['costoid'], set_=valores))
+
+# Reevaluar las sedes pendientes y guardar sus anomalías en una sola transacción; solo se borran las
+# filas pendientes leídas al inicio, así las que agregan otras transacciones mientras tanto quedan para
+# la siguiente corrida, y si algo falla todas siguen pendientes.
+# Con completo=True se reevalúan todas las sedes, p. ej. después de cambiar los umbrales.
+def ejecutar(db, completo=False, **parametros):
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(BLOQUEO))))
+    pendientes = db.execute(select(AnomaliaPendiente.id, AnomaliaPendiente.sedeid)).all()
+    sedes = None if completo else sorted({fila.sedeid for fila in pendientes})
+
+    evaluadas, anomalias = 0, 0
+    if sedes is None or sedes:
+        facturas = leer_columnas(db, consulta_facturas(sedes), TIPOS_FACTURAS)
+        marcadas = analizar(facturas, **parametros)
+        _guardar(db, marcadas, sedes)
+        evaluadas, anomalias = len(facturas), len(marcadas)
+    if pendientes:
+        db.execute(delete(AnomaliaPendiente).where(AnomaliaPendiente.id.in_([fila.id for fila in pendientes])))
+    db.commit()
+    return {'sedes': len(sedes) if sedes is not None else None, 'facturas': evaluadas, 'anomalias': anomalias}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Marca las facturas de costos_energia que se salen de la historia de su sede."
+    )
+    parser.add_argument("--completo", action="store_true", help="Reevaluar todas las sedes y no solo las pendientes")
+    parser.add_argument("--ventana", type=int, default=ANOMALIAS_VENTANA, help="Facturas anteriores en la ventana móvil")
+    parser.add_argument("--min-facturas", type=int, default=ANOMALIAS_MIN_FACTURAS, help="Facturas anteriores mínimas para evaluar la ventana")
+    parser.add_argument("--umbral-z", type=float, default=ANOMALIAS_UMBRAL_Z, help="Desviaciones estándar para marcar una factura")
+    parser.add_argument("--umbral-anual", type=float, default=ANOMALIAS_UMBRAL_ANUAL, help="Variación respecto al mismo mes del año anterior para marcarla")
+    args = parser.parse_args()
+    if not 2 <= args.min_facturas <= args.ventana:
+        parser.error("se requiere 2 <= min-facturas <= ventana")
+    if args.umbral_z <= 0 or args.umbral_anual <= 0:
+        parser.error("los umbrales deben ser mayores que cero")
+
+    db = SessionLocal()
+    try:
+        resumen = ejecutar(db, args.completo, ventana=args.ventana, min_facturas=args.min_facturas,
+                           umbral_z=args.umbral_z, umbral_anual=args.umbral_anual)
+    finally:
+        db.close()
+    if resumen['sedes'] == 0:
+        print("Sin facturas nuevas o corregidas desde la última corrida")
+    else:
+        sedes = "todas" if resumen['sedes'] is None else resumen['sedes']
+        print(f"Sedes evaluadas: {sedes}, facturas: {resumen['facturas']}, anomalías: {resumen['anomalias']}")
@@ -0,0 +1,101 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+from openpyxl import Workbook
+
+import data_loader
+
+# Tamaños por defecto de los libros sintéticos
+TAMANOS = [1000, 100000, 1000000]
+
+# Base de datos dedicada al benchmark: sus tablas se vacían antes de cada corrida
+DBNAME = 'benchmark_loader'
+
+REGIONALES = 33
+
+# Generar un libro sintético determinista con el mismo formato que Sedes_Centros.xlsx.
+# Cada centro pertenece siempre a la misma regional y cada sede aparece en dos filas.
+def generar_libro(ruta, filas):
+    centros = max(1, filas // 4)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(data_loader.COLUMNAS)
+    for i in range(filas):
+        centro = i % centros
+        regional = centro % REGIONALES + 1
+        ws.append([
+            regional,
+            f"Regional {regional}",
+            9000 + centro,
+            f"Centro de Formación {centro}",
+            f"Sede {i // 2}",
+            f"Calle {i % 200} # {i % 97}-{i % 53}",
+            f"Municipio {centro % 1100}",
+        ])
+    wb.save(ruta)
+
+# Devolver la ruta del libro de un tamaño, generándolo solo si no existe
+def libro_sintetico(directorio, filas):
+    ruta = Path(directorio) / f"sintetico_{filas}.xlsx"
+    if not ruta.exists():
+        inicio = time.perf_counter()
+        generar_libro(ruta, filas)
+        print(f"Generado {ruta} en {time.perf_counter() - inicio:.1f} s")
+    return str(ruta)
+
+# Vaciar las tablas que llena el cargador en la base de datos del benchmark
+def vaciar_tablas(dbname):
+    conn = data_loader.esperar_bd(dbname=dbname)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS manifiesto_sedes_centros (cod VARCHAR(50), sede VARCHAR(255), "
+                       "huella CHAR(32) NOT NULL, actualizado TIMESTAMP NOT NULL DEFAULT now(), PRIMARY KEY (cod, sede))")
+        cursor.execute("TRUNCATE sede_centro, sedes, centros, regionales, manifiesto_sedes_centros RESTART IDENTITY CASCADE")
+        conn.commit()
+    finally:
+        conn.close()
+
+# Ejecutar una carga completa y devolver sus métricas
+def ejecutar(ruta, filas, modo, chunk_size, dbname):
+    vaciar_tablas(dbname)
+    metricas = data_loader.MetricasCarga()
+    inicio = time.perf_counter()
+    data_loader.cargar(ruta, chunk_size, modo, metricas, dbname=dbname)
+    total = time.perf_counter() - inicio
+    return {
+        'filas': filas,
+        'modo': modo,
+        'chunk_size': chunk_size,
+        'segundos': round(total, 3),
+        'filas_por_segundo': round(filas / total, 1),
+        'fases': metricas.reporte(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de data_loader.py con libros sintéticos.")
+    parser.add_argument("--tamanos", default=",".join(str(t) for t in TAMANOS),
+                        help="Filas de cada libro, separadas por comas")
+    parser.add_argument("--modos", default="copy", help="Modos de carga a medir, separados por comas (filas,copy,delta)")
+    parser.add_argument("--chunk-size", type=int, default=data_loader.CHUNK_SIZE, help="Filas procesadas por bloque")
+    parser.add_argument("--directorio", default="benchmark_data", help="Directorio donde se guardan los libros generados")
+    parser.add_argument("--dbname", default=DBNAME, help="Base de datos dedicada al benchmark (se vacía en cada corrida)")
+    parser.add_argument("--salida", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    Path(args.directorio).mkdir(parents=True, exist_ok=True)
+    resultados = []
+    for filas in [int(t) for t in args.tamanos.split(",")]:
+        ruta = libro_sintetico(args.directorio, filas)
+        for modo in args.modos.split(","):
+            resultado = ejecutar(ruta, filas, modo, args.chunk_size, args.dbname)
+            resultados.append(resultado)
+            print(f"{filas:>9} filas  modo={modo:<6} {resultado['segundos']:>9.3f} s  "
+                  f"{resultado['filas_por_segundo']:>10.1f} filas/s")
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"Resultados guardados en {args.salida}")
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from pydantic_core import to_json
+
+# Caché de lectura para datos de referencia (regionales, centros, sedes y sus vínculos).
+# Cada espacio de nombres tiene un contador de versión que forma parte de la llave:
+# invalidar es subir la versión, y las entradas viejas dejan de leerse y expiran solas.
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "10000"))
+# Con REDIS_URL la caché y las versiones se comparten entre workers; sin ella cada proceso tiene la suya
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Caché en memoria del proceso con expiración por TTL y desalojo LRU
+class CacheLocal:
+    def __init__(self, ttl=CACHE_TTL, max_entradas=CACHE_MAX_ENTRADAS):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def leer(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return False, None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return False, None
+            self._datos.move_to_end(clave)
+            return True, valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def version(self, espacio):
+        with self._lock:
+            return self._versiones.get(espacio, 0)
+
+    def subir_version(self, espacio):
+        with self._lock:
+            self._versiones[espacio] = self._versiones.get(espacio, 0) + 1
+
+    def entradas(self):
+        return len(self._datos)
+
+# Caché compartida en Redis; los valores se guardan como JSON con expiración
+class CacheRedis:
+    def __init__(self, cliente, ttl=CACHE_TTL):
+        self.cliente = cliente
+        self.ttl = ttl
+
+    def leer(self, clave):
+        valor = self.cliente.get(f"cache:{clave}")
+        if valor is None:
+            return False, None
+        return True, json.loads(valor)
+
+    def guardar(self, clave, valor):
+        self.cliente.set(f"cache:{clave}", to_json(valor), ex=max(1, int(self.ttl)))
+
+    def version(self, espacio):
+        return int(self.cliente.get(f"cache_version:{espacio}") or 0)
+
+    def subir_version(self, espacio):
+        self.cliente.incr(f"cache_version:{espacio}")
+
+    def entradas(self):
+        return None
+
+# Elegir el almacenamiento: Redis si está configurado y disponible, si no memoria local
+def _crear_almacen():
+    if REDIS_URL:
+        try:
+            import redis
+            cliente = redis.Redis.from_url(REDIS_URL)
+            cliente.ping()
+            return CacheRedis(cliente)
+        except Exception as e:
+            print("Caché Redis no disponible, se usa caché local:", e)
+    return CacheLocal()
+
+almacen = _crear_almacen()
+
+# Contadores de aciertos y fallos por espacio de nombres (propios de cada proceso)
+_estadisticas = {}
+_lock_estadisticas = threading.Lock()
+
+def _contar(espacio, acierto):
+    with _lock_estadisticas:
+        contadores = _estadisticas.setdefault(espacio, {"aciertos": 0, "fallos": 0})
+        contadores["aciertos" if acierto else "fallos"] += 1
+
+# Devolver el valor en caché o calcularlo con cargar() y guardarlo.
+# Los valores deben ser datos simples (dict, list), nunca objetos ORM ligados a una sesión.
+def obtener(espacio, clave, cargar):
+    llave = f"{espacio}:{almacen.version(espacio)}:{clave}"
+    encontrado, valor = almacen.leer(llave)
+    _contar(espacio, encontrado)
+    if encontrado:
+        return valor
+    valor = cargar()
+    almacen.guardar(llave, valor)
+    return valor
+
+# Variante para cargas asíncronas (endpoints con AsyncSession)
+async def obtener_async(espacio, clave, cargar):
+    llave = f"{espacio}:{almacen.version(espacio)}:{clave}"
+    encontrado, valor = almacen.leer(llave)
+    _contar(espacio, encontrado)
+    if encontrado:
+        return valor
+    valor = await cargar()
+    almacen.guardar(llave, valor)
+    return valor
+
+# Invalidar uno o varios espacios de nombres después de una escritura
+def invalidar(*espacios):
+    for espacio in espacios:
+        almacen.subir_version(espacio)
+
+def version(espacio):
+    return almacen.version(espacio)
+
+# Convertir un objeto ORM en dict con sus columnas, para poder guardarlo en la caché
+def fila(objeto):
+    return {columna.name: getattr(objeto, columna.name) for columna in objeto.__table__.columns}
+
+# Resumen de aciertos y fallos para /metricas/cache
+def estadisticas():
+    with _lock_estadisticas:
+        espacios = {espacio: dict(contadores) for espacio, contadores in _estadisticas.items()}
+    for contadores in espacios.values():
+        total = contadores["aciertos"] + contadores["fallos"]
+        contadores["tasa_aciertos"] = round(contadores["aciertos"] / total, 4) if total else 0.0
+    return {
+        "backend": "redis" if isinstance(almacen, CacheRedis) else "local",
+        "ttl_segundos": CACHE_TTL,
+        "entradas": almacen.entradas(),
+        "espacios": espacios,
+    }
@@ -0,0 +1,267 @@
+import asyncio
+import csv
+import io
+import json
+import time
+from collections import deque
+from contextlib import suppress
+from itertools import islice
+
+from fastapi.concurrency import run_in_threadpool
+from openpyxl import load_workbook
+from pydantic import ValidationError
+
+import crud
+import schemas
+
+# Filas validadas e insertadas por lote
+TAMANO_LOTE = 1000
+
+# Segundos máximos que una lectura espera en el buffer antes de escribirse
+INTERVALO_VACIADO = 2.0
+
+# Normalizar el nombre de una columna del archivo ('Año' -> 'ano', 'Valor Factura' -> 'valor_factura')
+def normalizar_encabezado(encabezado):
+    if encabezado is None:
+        return ''
+    return str(encabezado).strip().lower().replace('ñ', 'n').replace(' ', '_')
+
+# Convertir celdas vacías en None para que los campos opcionales validen
+def limpiar_celda(valor):
+    if isinstance(valor, str):
+        valor = valor.strip()
+        return valor or None
+    return valor
+
+# Leer las filas de un CSV o XLSX subido, una por una, como diccionarios
+def leer_filas(archivo, nombre_archivo):
+    if nombre_archivo and nombre_archivo.lower().endswith('.xlsx'):
+        wb = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = wb.active.iter_rows(values_only=True)
+            encabezados = [normalizar_encabezado(celda) for celda in next(filas, ())]
+            for fila in filas:
+                if not any(celda is not None for celda in fila):
+                    continue
+                yield {encabezado: limpiar_celda(valor) for encabezado, valor in zip(encabezados, fila) if encabezado}
+        finally:
+            wb.close()
+    else:
+        texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        # Excel en español exporta los CSV separados por ';'
+        muestra = texto.readline()
+        delimitador = ';' if muestra.count(';') > muestra.count(',') else ','
+        encabezados = [normalizar_encabezado(celda) for celda in next(csv.reader([muestra], delimiter=delimitador), [])]
+        for fila in csv.reader(texto, delimiter=delimitador):
+            if not any(fila):
+                continue
+            yield {encabezado: limpiar_celda(valor) for encabezado, valor in zip(encabezados, fila) if encabezado}
+        texto.detach()
+
+# Agrupar las filas numeradas en lotes de tamaño fijo
+def por_lotes(filas, tamano=TAMANO_LOTE, primera_fila=2):
+    numeradas = enumerate(filas, start=primera_fila)
+    while True:
+        lote = list(islice(numeradas, tamano))
+        if not lote:
+            return
+        yield lote
+
+# Validar un lote contra un esquema Pydantic; devuelve las filas válidas y los errores por fila
+def validar_lote(lote, esquema):
+    validas = []
+    errores = []
+    for numero, fila in lote:
+        try:
+            validas.append((numero, esquema(**fila)))
+        except ValidationError as e:
+            errores.append({
+                'fila': numero,
+                'errores': [f"{'.'.join(str(parte) for parte in error['loc'])}: {error['msg']}" for error in e.errors()],
+            })
+    return validas, errores
+
+# Importar un archivo de facturas de energía: valida por lotes contra CostoEnergiaCreate,
+# descarta las filas con sede inexistente e inserta el resto en una sola transacción
+def importar_costos_energia(db, archivo, nombre_archivo, tamano_lote=TAMANO_LOTE):
+    leidas = 0
+    insertadas = 0
+    errores = []
+    try:
+        for lote in por_lotes(leer_filas(archivo, nombre_archivo), tamano_lote):
+            leidas += len(lote)
+            validas, errores_lote = validar_lote(lote, schemas.CostoEnergiaCreate)
+            errores.extend(errores_lote)
+
+            existentes = crud.get_sedeids_existentes(db, {costo.sedeid for _, costo in validas})
+            costos = []
+            for numero, costo in validas:
+                if costo.sedeid not in existentes:
+                    errores.append({'fila': numero, 'errores': [f"sedeid: la sede {costo.sedeid} no existe"]})
+                    continue
+                datos = costo.dict(exclude={'año'})
+                if datos['ano'] is None:
+                    datos['ano'] = costo.año
+                costos.append(datos)
+            insertadas += crud.create_costos_energia_bulk(db, costos)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        'filas_leidas': leidas,
+        'insertadas': insertadas,
+        'rechazadas': len(errores),
+        'errores': sorted(errores, key=lambda error: error['fila']),
+    }
+
+# Lecturas de un buffer de ingesta que se escriben juntas en una transacción; escrita se resuelve
+# cuando la transacción termina (bien o mal)
+class Tanda:
+    def __init__(self):
+        self.registros = []
+        self.creada = time.monotonic()
+        self.escrita = asyncio.get_running_loop().create_future()
+
+# Buffer de ingesta compartido por todas las peticiones del proceso: junta las lecturas validadas de
+# varias peticiones y las escribe en una sola transacción de varias filas cuando una tanda llega a
+# tamano o cuando su primera lectura lleva intervalo segundos esperando. El vaciado por tiempo lo hace
+# una tarea de fondo que se inicia y se detiene en el lifespan de la app; al detenerse escribe lo que
+# quede. Las escrituras corren de a una en el threadpool, cada una con su propia sesión.
+class BufferIngesta:
+    def __init__(self, abrir_sesion, esquema, insertar, existentes=None, campo_referencia=None,
+                 tamano=TAMANO_LOTE, intervalo=INTERVALO_VACIADO):
+        self.abrir_sesion = abrir_sesion
+        self.esquema = esquema
+        self.insertar = insertar
+        self.existentes = existentes
+        self.campo_referencia = campo_referencia
+        self.tamano = tamano
+        self.intervalo = intervalo
+        self.tandas = deque()
+        self._tarea = None
+        self._escribiendo = None
+        self._vaciados = set()
+
+    # Iniciar la tarea de vaciado por tiempo en el bucle de eventos actual
+    def iniciar(self):
+        bucle = asyncio.get_running_loop()
+        if self._tarea is None or self._tarea.get_loop() is not bucle:
+            self._escribiendo = asyncio.Lock()
+            self._tarea = bucle.create_task(self._vaciar_por_tiempo())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._tarea
+            self._tarea = None
+        while self.tandas:
+            await self.vaciar()
+
+    # Agregar una lectura validada de un lote; devuelve la tanda en la que quedó
+    def encolar(self, lote, numero, item):
+        # Sin lifespan (p. ej. un TestClient sin with) la tarea arranca con la primera lectura
+        self.iniciar()
+        if not self.tandas or len(self.tandas[-1].registros) >= self.tamano:
+            self.tandas.append(Tanda())
+        tanda = self.tandas[-1]
+        tanda.registros.append((lote, numero, item))
+        if len(tanda.registros) >= self.tamano:
+            # Guardar la referencia para que la tarea no se recolecte antes de terminar
+            tarea = asyncio.create_task(self.vaciar())
+            self._vaciados.add(tarea)
+            tarea.add_done_callback(self._vaciados.discard)
+        return tanda
+
+    # Escribir la tanda más antigua y pasar el resultado de cada lectura a su lote
+    async def vaciar(self):
+        async with self._escribiendo:
+            if not self.tandas:
+                return
+            tanda = self.tandas.popleft()
+            try:
+                aceptadas, errores = await run_in_threadpool(self._escribir, tanda.registros)
+                for lote, cantidad in aceptadas.items():
+                    lote.aceptadas += cantidad
+                for lote, error in errores:
+                    lote.errores.append(error)
+            finally:
+                tanda.escrita.set_result(None)
+
+    # shield: si la tarea se cancela durante una escritura, la escritura termina y avisa a sus lotes
+    async def _vaciar_por_tiempo(self):
+        while True:
+            espera = self.intervalo
+            if self.tandas:
+                espera = self.tandas[0].creada + self.intervalo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            else:
+                await asyncio.shield(self.vaciar())
+
+    # Insertar las lecturas en una transacción. Si la escritura falla, sus lecturas quedan como
+    # rechazadas con el error y las tandas ya escritas siguen contando como aceptadas.
+    def _escribir(self, registros):
+        aceptadas = {}
+        errores = []
+        db = self.abrir_sesion()
+        try:
+            if self.existentes is not None:
+                referencias = self.existentes(db, {getattr(item, self.campo_referencia) for _, _, item in registros})
+                validos = []
+                for lote, numero, item in registros:
+                    valor = getattr(item, self.campo_referencia)
+                    if valor in referencias:
+                        validos.append((lote, numero, item))
+                    else:
+                        errores.append((lote, {'fila': numero, 'errores': [f"{self.campo_referencia}: {valor} no existe"]}))
+                registros = validos
+            self.insertar(db, [item.dict() for _, _, item in registros])
+            db.commit()
+            for lote, _, _ in registros:
+                aceptadas[lote] = aceptadas.get(lote, 0) + 1
+        except Exception as e:
+            db.rollback()
+            print("Error al escribir una tanda de ingesta:", e)
+            errores.extend((lote, {'fila': numero, 'errores': [f"No se pudo guardar: {e.__class__.__name__}"]})
+                           for lote, numero, _ in registros)
+        finally:
+            db.close()
+        return aceptadas, errores
+
+# Lecturas enviadas en una petición: se validan al recibirlas y las válidas pasan al buffer compartido.
+# resultado() espera a que se escriban todas las tandas en las que quedaron.
+class LoteIngesta:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.aceptadas = 0
+        self.errores = []
+        self._tandas = set()
+
+    def agregar(self, numero, registro):
+        if not isinstance(registro, dict):
+            self.errores.append({'fila': numero, 'errores': ["El registro debe ser un objeto JSON"]})
+            return
+        validas, errores = validar_lote([(numero, registro)], self.buffer.esquema)
+        self.errores.extend(errores)
+        for numero, item in validas:
+            self._tandas.add(self.buffer.encolar(self, numero, item))
+
+    # Agregar un registro serializado como una línea JSON
+    def agregar_linea(self, numero, linea):
+        try:
+            registro = json.loads(linea)
+        except ValueError as e:
+            self.errores.append({'fila': numero, 'errores': [f"JSON inválido: {e}"]})
+            return
+        self.agregar(numero, registro)
+
+    async def resultado(self):
+        await asyncio.gather(*(tanda.escrita for tanda in self._tandas))
+        return {
+            'aceptadas': self.aceptadas,
+            'rechazadas': len(self.errores),
+            'errores': sorted(self.errores, key=lambda error: error['fila']),
+        }
@@ -1,19 +1,124 @@
-import pandas as pd
+import argparse
+import re
+import sys
 import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+# Archivos por defecto (cámbialos por la ruta de tus archivos)
+ENTRADA = 'Centros_formacion_Nacional_2024.xlsx'
+SALIDA = 'Centros2024.xlsx'
+
+# Filas leídas y escritas por bloque en el modo por streaming
+CHUNK_SIZE = 5000
+
+# Máximo de valores distintos que se guardan en la caché del normalizador
+MAX_CACHE = 100000
 
 def remove_accents_and_replace_n(string):
+    # Las celdas que no son texto (NaN, números, fechas) se devuelven sin cambios
+    if not isinstance(string, str):
+        return string
     # Normalize and remove accents
     nfkd_form = unicodedata.normalize('NFKD', string)
     without_accents = ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
     # Replace 'Ñ' with 'n'
     return without_accents.replace('Ñ', 'n').replace('ñ', 'n')
 
-# Load your Excel file (replace 'your_file.xlsx' with your actual file name)
-file_path = 'Centros_formacion_Nacional_2024.xlsx'  # Change to your file path
-df = pd.read_excel(file_path)
+# Expresión regular con todos los caracteres combinantes (acentos, tildes, diéresis...)
+@lru_cache(maxsize=1)
+def patron_combinantes():
+    marcas = ''.join(chr(c) for c in range(sys.maxunicode + 1) if unicodedata.combining(chr(c)))
+    return re.compile('[' + re.escape(marcas) + ']')
+
+# Normalizador por columnas: trabaja sobre los valores distintos de cada columna
+# con operaciones vectorizadas de pandas y recuerda los valores ya normalizados,
+# porque los nombres de municipios y regionales se repiten miles de veces.
+class NormalizadorTexto:
+    def __init__(self, max_cache=MAX_CACHE):
+        self.max_cache = max_cache
+        self.cache = {}
+
+    def _normalizar_pendientes(self, valores):
+        pendientes = [valor for valor in valores if valor not in self.cache]
+        if not pendientes:
+            return
+        if len(self.cache) + len(pendientes) > self.max_cache:
+            self.cache.clear()
+            pendientes = list(valores)
+        normalizados = (
+            pd.Series(pendientes, dtype=object)
+            .str.normalize('NFKD')
+            .str.replace(patron_combinantes(), '', regex=True)
+            .str.replace('Ñ', 'n', regex=False)
+            .str.replace('ñ', 'n', regex=False)
+        )
+        self.cache.update(zip(pendientes, normalizados))
+
+    def normalizar_serie(self, serie):
+        if not (pd.api.types.is_object_dtype(serie.dtype) or pd.api.types.is_string_dtype(serie.dtype)):
+            return serie
+        codigos, unicos = pd.factorize(serie)
+        if len(unicos) == 0:
+            return serie
+        unicos = np.asarray(unicos, dtype=object)
+        es_texto = np.fromiter((isinstance(valor, str) for valor in unicos), dtype=bool, count=len(unicos))
+        self._normalizar_pendientes(unicos[es_texto])
+        traducidos = unicos.copy()
+        traducidos[es_texto] = [self.cache[valor] for valor in unicos[es_texto]]
+        # Los códigos -1 corresponden a celdas vacías (NaN/None) y se conservan tal cual
+        resultado = pd.Series(traducidos[codigos], index=serie.index, dtype=object)
+        resultado = resultado.where(codigos != -1, serie)
+        return resultado.astype(serie.dtype)
+
+    def normalizar_dataframe(self, df):
+        return df.apply(self.normalizar_serie)
+
+# Leer el archivo Excel en bloques (DataFrames) sin cargar toda la hoja en memoria
+def leer_excel_por_bloques(file_path, chunk_size=CHUNK_SIZE):
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        filas = wb.active.iter_rows(values_only=True)
+        encabezados = list(next(filas, ()))
+        bloque = []
+        for fila in filas:
+            bloque.append(fila)
+            if len(bloque) >= chunk_size:
+                yield encabezados, pd.DataFrame(bloque, columns=encabezados, dtype=object)
+                bloque = []
+        if bloque:
+            yield encabezados, pd.DataFrame(bloque, columns=encabezados, dtype=object)
+    finally:
+        wb.close()
+
+# Normalizar un archivo Excel completo leyendo y escribiendo por bloques
+def normalizar_archivo(file_path=ENTRADA, salida=SALIDA, chunk_size=CHUNK_SIZE, normalizador=None):
+    normalizador = normalizador or NormalizadorTexto()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    encabezados_escritos = False
+    total = 0
+    for encabezados, df in leer_excel_por_bloques(file_path, chunk_size):
+        if not encabezados_escritos:
+            ws.append(encabezados)
+            encabezados_escritos = True
+        df = normalizador.normalizar_dataframe(df)
+        for fila in df.itertuples(index=False, name=None):
+            ws.append(list(fila))
+        total += len(df)
+    wb.save(salida)
+    return total
+
 
-# Apply the function to all string cells in the DataFrame
-df = df.apply(lambda col: col.map(remove_accents_and_replace_n) if col.dtype == "object" else col)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quita acentos y reemplaza la ñ en todas las celdas de texto.")
+    parser.add_argument("entrada", nargs="?", default=ENTRADA, help="Archivo Excel de entrada")
+    parser.add_argument("salida", nargs="?", default=SALIDA, help="Archivo Excel de salida")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Filas procesadas por bloque")
+    args = parser.parse_args()
 
-# Save the modified DataFrame to a new Excel file
-df.to_excel('Centros2024.xlsx', index=False)
+    total = normalizar_archivo(args.entrada, args.salida, args.chunk_size)
+    print(f"{total} filas normalizadas en {args.salida}")
@@ -0,0 +1,79 @@
+import hashlib
+import math
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import VersionTabla
+
+# GET condicional con ETag y Last-Modified tomados de versiones_tablas, que los triggers de cada tabla
+# suben en la misma transacción que la escritura (migraciones/008_versiones_tablas.sql): cualquier
+# escritura cambia el ETag, venga de este proceso, de otro worker o de un script.
+# Cuesta una lectura por llave primaria; si el cliente ya tiene la versión vigente se responde 304
+# sin consultar los datos ni serializarlos.
+
+def _consulta_versiones(tablas):
+    return select(VersionTabla.tabla, VersionTabla.version, VersionTabla.modificado_en).where(VersionTabla.tabla.in_(tablas))
+
+# Versión y momento (epoch en segundos enteros, ver migraciones/008_versiones_tablas.sql) de la última
+# escritura de cada tabla; una tabla sin fila cuenta como versión 0 sin fecha
+def _versiones(filas, tablas):
+    encontradas = {fila.tabla: (fila.version, fila.modificado_en.timestamp()) for fila in filas}
+    return {tabla: encontradas.get(tabla, (0, None)) for tabla in tablas}
+
+def leer_versiones(db: Session, *tablas):
+    return _versiones(db.execute(_consulta_versiones(tablas)), tablas)
+
+async def leer_versiones_async(db: AsyncSession, *tablas):
+    return _versiones(await db.execute(_consulta_versiones(tablas)), tablas)
+
+# Versión y fecha de cada tabla en un solo texto; sirve para el ETag y para ligar las entradas de la
+# caché de datos a la versión en la base. La fecha distingue una tabla recreada cuyo contador volvió a empezar.
+def etiqueta(versiones):
+    return ".".join(f"{tabla}{version}-{int((modificado or 0) * 1000)}" for tabla, (version, modificado) in versiones.items())
+
+# ETag débil: versiones de las tablas y la URL pedida (ruta y parámetros)
+def calcular_etag(request: Request, versiones):
+    url = hashlib.md5(str(request.url).encode("utf-8")).hexdigest()[:12]
+    return f'W/"{etiqueta(versiones)}-{url}"'
+
+def _coincide(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    # La comparación débil ignora el prefijo W/
+    comparable = etag.removeprefix("W/")
+    return any(candidato.strip().removeprefix("W/") == comparable for candidato in if_none_match.split(","))
+
+# Last-Modified lleva segundos enteros: se compara la fecha truncada igual que se envió. Como cada
+# versión tiene un segundo distinto, una escritura posterior nunca queda dentro del segundo del cliente.
+def _no_modificado_desde(if_modified_since, modificado):
+    try:
+        return math.floor(modificado) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+# Fijar ETag y Last-Modified en la respuesta y devolver un 304 si el cliente está al día.
+# If-None-Match tiene prioridad; If-Modified-Since solo se evalúa si no viene ETag.
+# Las versiones deben leerse antes que los datos: así el cuerpo nunca es más viejo que el ETag.
+def verificar(request: Request, response: Response, versiones):
+    etag = calcular_etag(request, versiones)
+    fechas = [modificado for _, modificado in versiones.values() if modificado is not None]
+    modificado = max(fechas) if fechas else None
+    encabezados = {"ETag": etag, "Cache-Control": "no-cache"}
+    if modificado is not None:
+        encabezados["Last-Modified"] = formatdate(math.floor(modificado), usegmt=True)
+    response.headers.update(encabezados)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        no_modificado = _coincide(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        no_modificado = (if_modified_since is not None and modificado is not None
+                         and _no_modificado_desde(if_modified_since, modificado))
+    if no_modificado:
+        return Response(status_code=304, headers=encabezados)
+    return None
@@ -1,11 +1,13 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, insert, update, delete, select, and_, or_, literal
+from sqlalchemy.exc import IntegrityError
 from models import (Usuario, Regional, Centro, Sede, Ambiente, Dispositivo, CostoEnergia, Ocupacion, Subestacion, SedeCentro)
 from fastapi import HTTPException
 from typing import Optional, List
-from datetime import date
+from datetime import date, timedelta
 import bcrypt
 import models
+import cache
 
 def create_Usuario(db: Session, Usuario_data: dict):
     Usuario_data["contrasena"] = bcrypt.hashpw(Usuario_data["contrasena"].encoode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -22,6 +24,50 @@ def format_city_name(city: str) -> str:
     formatted_words = [word.lower() if word.lower() in lowercase_words else word.capitalize() for word in words]
     return ' '.join(formatted_words)
 
+# Columnas del modelo presentes en los datos recibidos (los esquemas traen campos que la tabla no tiene)
+def columnas_modelo(modelo, datos: dict):
+    columnas = modelo.__table__.columns.keys()
+    if 'año' in datos and datos.get('ano') is None:
+        datos['ano'] = datos['año']
+    return {clave: valor for clave, valor in datos.items() if clave in columnas}
+
+# UPDATE ... WHERE llave = :id RETURNING en un solo viaje; sin fila devuelta el registro no existe.
+# Como antes, no se modifican la llave ni los campos nulos. El id se convierte al tipo de la
+# llave (regionales usa texto) para que Postgres compare sin conversión implícita.
+def _actualizar(db: Session, modelo, id_registro, updated_data: dict, detalle: str, invalidar=()):
+    llave = modelo.__mapper__.primary_key[0]
+    id_registro = llave.type.python_type(id_registro)
+    valores = {clave: valor for clave, valor in columnas_modelo(modelo, updated_data).items()
+               if clave != llave.key and valor is not None}
+    if valores:
+        consulta = (update(modelo).where(llave == id_registro).values(**valores)
+                    .returning(*modelo.__table__.columns)
+                    .execution_options(synchronize_session=False))
+    else:
+        consulta = select(*modelo.__table__.columns).where(llave == id_registro)
+    fila = db.execute(consulta).mappings().first()
+    if fila is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=detalle)
+    db.commit()
+    cache.invalidar(*invalidar)
+    return dict(fila)
+
+# DELETE ... WHERE llave = :id RETURNING en un solo viaje
+def _eliminar(db: Session, modelo, id_registro, detalle: str, invalidar=()):
+    llave = modelo.__mapper__.primary_key[0]
+    id_registro = llave.type.python_type(id_registro)
+    consulta = (delete(modelo).where(llave == id_registro)
+                .returning(*modelo.__table__.columns)
+                .execution_options(synchronize_session=False))
+    fila = db.execute(consulta).mappings().first()
+    if fila is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=detalle)
+    db.commit()
+    cache.invalidar(*invalidar)
+    return dict(fila)
+
 # **USUARIOS**
 
 # Obtener un usuario por ID
@@ -44,25 +90,13 @@ def create_usuario(db: Session, usuario: Usuario):
 
 # Actualizar un usuario existente
 def update_usuario(db: Session, userid: int, updated_data: dict):
-    usuario = get_usuario(db, userid)
-    if usuario:
-        if 'correo_electronico' in updated_data:
-            updated_data['correo_electronico'] = updated_data['correo_electronico'].lower()
-        for key, value in updated_data.items():
-            if key != "userid" and value is not None:
-                setattr(usuario, key, value)
-        db.commit()
-        db.refresh(usuario)
-    return usuario
+    if updated_data.get('correo_electronico'):
+        updated_data['correo_electronico'] = updated_data['correo_electronico'].lower()
+    return _actualizar(db, Usuario, userid, updated_data, "Usuario no encontrado")
 
 # Eliminar un usuario por ID
 def delete_usuario(db: Session, userid: int):
-    usuario = get_usuario(db, userid)
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    db.delete(usuario)
-    db.commit()
-    return usuario
+    return _eliminar(db, Usuario, userid, "Usuario no encontrado")
 
 # REGIONALES
 def get_regional(db: Session, regionalid: str):
@@ -74,30 +108,31 @@ def get_regional(db: Session, regionalid: str):
 def get_all_regionales(db: Session):
     return db.query(models.Regional).all()
 
+# Regional desde la caché de datos de referencia (dict con sus columnas)
+def get_regional_cacheada(db: Session, regionalid: str):
+    return cache.obtener('regionales', str(regionalid), lambda: cache.fila(get_regional(db, regionalid)))
+
 def create_regional(db: Session, regional: models.Regional):
     db.add(regional)
     db.commit()
+    cache.invalidar('regionales')
     db.refresh(regional)
     return regional
 
 def update_regional(db: Session, regionalid: int, updated_data: dict):
-    regional = get_regional(db, regionalid)
-    if not regional:
-        raise HTTPException(status_code=404, detail="Regional not found")
-    for key, value in updated_data.items():
-        if key != "regionalid" and value is not None:
-            setattr(regional, key, value)
-    db.commit()
-    db.refresh(regional)
-    return regional
+    return _actualizar(db, Regional, regionalid, updated_data, "Regional not found", invalidar=('regionales',))
 
 def delete_regional(db: Session, regionalid: int):
-    regional = get_regional(db, regionalid)
-    if not regional:
-        raise HTTPException(status_code=404, detail="Regional not found")
-    db.delete(regional)
-    db.commit()
-    return regional
+    return _eliminar(db, Regional, regionalid, "Regional not found", invalidar=('regionales',))
+
+# Devolver cuáles de las regionales recibidas existen; regionalid es texto en la tabla y entero en
+# el esquema de centros, así que se comparan como texto y vuelven tal como llegaron
+def get_regionalids_existentes(db: Session, regionalids):
+    if not regionalids:
+        return set()
+    filas = db.query(Regional.regionalid).filter(Regional.regionalid.in_([str(regionalid) for regionalid in regionalids])).all()
+    existentes = {fila.regionalid for fila in filas}
+    return {regionalid for regionalid in regionalids if str(regionalid) in existentes}
 
 # CENTROS
 def get_centro(db: Session, centroid: int):
@@ -106,6 +141,10 @@ def get_centro(db: Session, centroid: int):
         raise HTTPException(status_code=404, detail="Centro not found")
     return centro
 
+# Centro desde la caché de datos de referencia (dict con sus columnas)
+def get_centro_cacheado(db: Session, centroid: int):
+    return cache.obtener('centros', str(centroid), lambda: cache.fila(get_centro(db, centroid)))
+
 def create_centro(db: Session, centro: models.Centro):
     # Verificar si ya existe un centro con el mismo nombre en la misma regional
     existing_centro = db.query(models.Centro).filter(
@@ -116,73 +155,61 @@ def create_centro(db: Session, centro: models.Centro):
         raise HTTPException(status_code=400, detail="El centro con el mismo nombre ya existe en esta regional.")
     db.add(centro)
     db.commit()
+    cache.invalidar('centros')
     db.refresh(centro)
     return centro
 
+# Códigos de error de PostgreSQL para violaciones de unicidad y de llave foránea
+VIOLACION_UNICIDAD = '23505'
+VIOLACION_LLAVE_FORANEA = '23503'
+
 def update_centro(db: Session, centroid: int, updated_data: dict):
-    centro = get_centro(db, centroid)
-    if not centro:
-        raise HTTPException(status_code=404, detail="Centro not found")
-    # Verificar si la combinación de nombre y regional cambiaría y causaría un duplicado
-    if 'nombre_del_centro' in updated_data and 'regionalid' in updated_data:
-        existing_centro = db.query(models.Centro).filter(
-            models.Centro.nombre_del_centro == updated_data['nombre_del_centro'],
-            models.Centro.regionalid == updated_data['regionalid'],
-            models.Centro.centroid != centroid  # Excluir el registro actual
-        ).first()
-        if existing_centro:
+    # El índice único (nombre_del_centro, regionalid) detecta el duplicado sin una consulta previa;
+    # una regional o un usuario inexistente llega como violación de llave foránea
+    try:
+        return _actualizar(db, models.Centro, centroid, updated_data, "Centro not found", invalidar=('centros',))
+    except IntegrityError as e:
+        db.rollback()
+        codigo = getattr(e.orig, 'pgcode', None)
+        if codigo == VIOLACION_UNICIDAD:
             raise HTTPException(status_code=400, detail="El centro con el mismo nombre ya existe en esta regional.")
-
-    for key, value in updated_data.items():
-        if value is not None:
-            setattr(centro, key, value)
-    db.commit()
-    db.refresh(centro)
-    return centro
+        if codigo == VIOLACION_LLAVE_FORANEA:
+            raise HTTPException(status_code=400, detail=f"Referencia no válida: {e.orig.diag.message_detail}")
+        raise
 
 def delete_centro(db: Session, centroid: int):
-    centro = get_centro(db, centroid)
-    if not centro:
-        raise HTTPException(status_code=404, detail="Centro not found")
-    db.delete(centro)
-    db.commit()
-    return centro
+    return _eliminar(db, models.Centro, centroid, "Centro not found", invalidar=('centros', 'sede_centro'))
 
 # SEDES
 def get_sede(db: Session, sedeid: int):
-    sede = db.query(models.Sede).filter(models.Sede.sedeid == str (sedeid)).first()
+    sede = db.query(models.Sede).filter(models.Sede.sedeid == sedeid).first()
     if not sede:
         raise HTTPException(status_code=404, detail="Sede not found")
     return sede
 
+# Sede desde la caché de datos de referencia (dict con sus columnas). Con version (la etiqueta de
+# condicional.py) la entrada queda ligada a la versión de la tabla en la base, así el cuerpo nunca es
+# más viejo que el ETag aunque la escritura venga de otro proceso.
+def get_sede_cacheada(db: Session, sedeid: int, version: str = None):
+    clave = str(sedeid) if version is None else f"{sedeid}:{version}"
+    return cache.obtener('sedes', clave, lambda: cache.fila(get_sede(db, sedeid)))
+
 def create_sede(db: Session, sede: models.Sede):
     db.add(sede)
     db.commit()
+    cache.invalidar('sedes', 'sede_centro')
     db.refresh(sede)
     return sede
 
 def update_sede(db: Session, sedeid: int, updated_data: dict):
-    sede = get_sede(db, sedeid)
-    if not sede:
-        raise HTTPException(status_code=404, detail="Sede not found")
-    for key, value in updated_data.items():
-        if key != "sedeid" and value is not None:
-            setattr(sede, key, value)
-    db.commit()
-    db.refresh(sede)
-    return sede
+    return _actualizar(db, models.Sede, sedeid, updated_data, "Sede not found", invalidar=('sedes', 'sede_centro'))
 
 def delete_sede(db: Session, sedeid: int):
-    sede = get_sede(db, sedeid)
-    if not sede:
-        raise HTTPException(status_code=404, detail="Sede not found")
-    db.delete(sede)
-    db.commit()
-    return sede
+    return _eliminar(db, models.Sede, sedeid, "Sede not found", invalidar=('sedes', 'sede_centro'))
 
 # AMBIENTES
 def get_ambiente(db: Session, ambienteid: int):
-    ambiente = db.query(models.Ambiente).filter(models.Ambiente.ambienteid == str (ambienteid)).first()
+    ambiente = db.query(models.Ambiente).filter(models.Ambiente.ambienteid == ambienteid).first()
     if not ambiente:
         raise HTTPException(status_code=404, detail="Ambiente not found")
     return ambiente
@@ -194,27 +221,14 @@ def create_ambiente(db: Session, ambiente: models.Ambiente):
     return ambiente
 
 def update_ambiente(db: Session, ambienteid: int, updated_data: dict):
-    ambiente = get_ambiente(db, ambienteid)
-    if not ambiente:
-        raise HTTPException(status_code=404, detail="Ambiente not found")
-    for key, value in updated_data.items():
-        if key != "ambienteid" and value is not None:
-            setattr(ambiente, key, value)
-    db.commit()
-    db.refresh(ambiente)
-    return ambiente
+    return _actualizar(db, models.Ambiente, ambienteid, updated_data, "Ambiente not found")
 
 def delete_ambiente(db: Session, ambienteid: int):
-    ambiente = get_ambiente(db, ambienteid)
-    if not ambiente:
-        raise HTTPException(status_code=404, detail="Ambiente not found")
-    db.delete(ambiente)
-    db.commit()
-    return ambiente
+    return _eliminar(db, models.Ambiente, ambienteid, "Ambiente not found")
 
 # DISPOSITIVOS
 def get_dispositivo(db: Session, deviceid: int):
-    dispositivo = db.query(models.Dispositivo).filter(models.Dispositivo.deviceid == str (deviceid)).first()
+    dispositivo = db.query(models.Dispositivo).filter(models.Dispositivo.deviceid == deviceid).first()
     if not dispositivo:
         raise HTTPException(status_code=404, detail="Dispositivo not found")
     return dispositivo
@@ -226,27 +240,14 @@ def create_dispositivo(db: Session, dispositivo: models.Dispositivo):
     return dispositivo
 
 def update_dispositivo(db: Session, deviceid: int, updated_data: dict):
-    dispositivo = get_dispositivo(db, deviceid)
-    if not dispositivo:
-        raise HTTPException(status_code=404, detail="Dispositivo not found")
-    for key, value in updated_data.items():
-        if key != "deviceid" and value is not None:
-            setattr(dispositivo, key, value)
-    db.commit()
-    db.refresh(dispositivo)
-    return dispositivo
+    return _actualizar(db, models.Dispositivo, deviceid, updated_data, "Dispositivo not found")
 
 def delete_dispositivo(db: Session, deviceid: int):
-    dispositivo = get_dispositivo(db, deviceid)
-    if not dispositivo:
-        raise HTTPException(status_code=404, detail="Dispositivo not found")
-    db.delete(dispositivo)
-    db.commit()
-    return dispositivo
+    return _eliminar(db, models.Dispositivo, deviceid, "Dispositivo not found")
 
 # OCUPACION
 def get_ocupacion(db: Session, ocupacionid: int):
-    ocupacion = db.query(models.Ocupacion).filter(models.Ocupacion.ocupacionid == str (ocupacionid)).first()
+    ocupacion = db.query(models.Ocupacion).filter(models.Ocupacion.ocupacionid == ocupacionid).first()
     if not ocupacion:
         raise HTTPException(status_code=404, detail="Ocupacion not found")
     return ocupacion
@@ -257,28 +258,28 @@ def create_ocupacion(db: Session, ocupacion: models.Ocupacion):
     db.refresh(ocupacion)
     return ocupacion
 
+# Insertar varias lecturas de ocupación con un INSERT de varias filas (sin commit)
+def create_ocupaciones_bulk(db: Session, ocupaciones: List[dict]):
+    if ocupaciones:
+        db.execute(insert(models.Ocupacion), ocupaciones)
+    return len(ocupaciones)
+
+# Devolver cuáles de los ambienteid recibidos existen en la tabla ambientes
+def get_ambienteids_existentes(db: Session, ambienteids):
+    if not ambienteids:
+        return set()
+    filas = db.query(models.Ambiente.ambienteid).filter(models.Ambiente.ambienteid.in_(list(ambienteids))).all()
+    return {fila.ambienteid for fila in filas}
+
 def update_ocupacion(db: Session, ocupacionid: int, updated_data: dict):
-    ocupacion = get_ocupacion(db, ocupacionid)
-    if not ocupacion:
-        raise HTTPException(status_code=404, detail="Ocupacion not found")
-    for key, value in updated_data.items():
-        if key != "ocupacionid" and value is not None:
-            setattr(ocupacion, key, value)
-    db.commit()
-    db.refresh(ocupacion)
-    return ocupacion
+    return _actualizar(db, models.Ocupacion, ocupacionid, updated_data, "Ocupacion not found")
 
 def delete_ocupacion(db: Session, ocupacionid: int):
-    ocupacion = get_ocupacion(db, ocupacionid)
-    if not ocupacion:
-        raise HTTPException(status_code=404, detail="Ocupacion not found")
-    db.delete(ocupacion)
-    db.commit()
-    return ocupacion
+    return _eliminar(db, models.Ocupacion, ocupacionid, "Ocupacion not found")
 
 # COSTOS_ENERGIA
 def get_costo_energia(db: Session, costoid: int):
-    costo_energia = db.query(models.CostoEnergia).filter(models.CostoEnergia.costoid == str (costoid)).first()
+    costo_energia = db.query(models.CostoEnergia).filter(models.CostoEnergia.costoid == costoid).first()
     if not costo_energia:
         raise HTTPException(status_code=404, detail="CostoEnergia not found")
     return costo_energia
@@ -289,28 +290,28 @@ def create_costo_energia(db: Session, costo_energia: models.CostoEnergia):
     db.refresh(costo_energia)
     return costo_energia
 
+# Insertar varios costos de energía con un INSERT de varias filas (sin commit)
+def create_costos_energia_bulk(db: Session, costos: List[dict]):
+    if costos:
+        db.execute(insert(models.CostoEnergia), costos)
+    return len(costos)
+
+# Devolver cuáles de los sedeid recibidos existen en la tabla sedes
+def get_sedeids_existentes(db: Session, sedeids):
+    if not sedeids:
+        return set()
+    filas = db.query(models.Sede.sedeid).filter(models.Sede.sedeid.in_(list(sedeids))).all()
+    return {fila.sedeid for fila in filas}
+
 def update_costo_energia(db: Session, costoid: int, updated_data: dict):
-    costo = get_costo_energia(db, costoid)
-    if not costo:
-        raise HTTPException(status_code=404, detail="CostoEnergia not found")
-    for key, value in updated_data.items():
-        if key != "costoid" and value is not None:
-            setattr(costo, key, value)
-    db.commit()
-    db.refresh(costo)
-    return costo
+    return _actualizar(db, models.CostoEnergia, costoid, updated_data, "CostoEnergia not found")
 
 def delete_costo_energia(db: Session, costoid: int):
-    costo = get_costo_energia(db, costoid)
-    if not costo:
-        raise HTTPException(status_code=404, detail="CostoEnergia not found")
-    db.delete(costo)
-    db.commit()
-    return costo
+    return _eliminar(db, models.CostoEnergia, costoid, "CostoEnergia not found")
 
 # SUBESTACIONES
 def get_subestacion(db: Session, subestacionid: int):
-    subestacion = db.query(models.Subestacion).filter(models.Subestacion.subestacionid == str (subestacionid)).first()
+    subestacion = db.query(models.Subestacion).filter(models.Subestacion.subestacionid == subestacionid).first()
     if not subestacion:
         raise HTTPException(status_code=404, detail="Subestacion not found")
     return subestacion
@@ -322,23 +323,59 @@ def create_subestacion(db: Session, subestacion: models.Subestacion):
     return subestacion
 
 def update_subestacion(db: Session, subestacionid: int, updated_data: dict):
-    subestacion = get_subestacion(db, subestacionid)
-    if not subestacion:
-        raise HTTPException(status_code=404, detail="Subestacion not found")
-    for key, value in updated_data.items():
-        if key != "subestacionid" and value is not None:
-            setattr(subestacion, key, value)
-    db.commit()
-    db.refresh(subestacion)
-    return subestacion
+    return _actualizar(db, models.Subestacion, subestacionid, updated_data, "Subestacion not found")
 
 def delete_subestacion(db: Session, subestacionid: int):
-    subestacion = get_subestacion(db, subestacionid)
-    if not subestacion:
-        raise HTTPException(status_code=404, detail="Subestacion not found")
-    db.delete(subestacion)
-    db.commit()
-    return subestacion
+    return _eliminar(db, models.Subestacion, subestacionid, "Subestacion not found")
+
+# OPERACIONES POR LOTES (sin commit: la transacción la cierra quien llama)
+def _llave(modelo):
+    return modelo.__mapper__.primary_key[0]
+
+# Insertar varias filas con un solo INSERT ... RETURNING; las llaves vuelven en el orden de las filas
+def create_lote(db: Session, modelo, filas: List[dict]):
+    if not filas:
+        return []
+    llave = _llave(modelo)
+    resultado = db.execute(insert(modelo).returning(llave, sort_by_parameter_order=True), filas)
+    return list(resultado.scalars())
+
+# Devolver cuáles de las llaves recibidas existen en la tabla del modelo
+def get_ids_existentes(db: Session, modelo, ids):
+    if not ids:
+        return set()
+    llave = _llave(modelo)
+    return set(db.execute(select(llave).where(llave.in_(list(ids)))).scalars())
+
+# Actualizar varias filas por llave primaria; cada dict trae la llave y los campos a cambiar
+def update_lote(db: Session, modelo, filas: List[dict]):
+    if filas:
+        db.execute(update(modelo), filas)
+    return len(filas)
+
+# Devolver las llaves recibidas que todavía aparecen en otra tabla por una llave foránea sin ON DELETE
+# CASCADE, con el nombre de esa tabla; una consulta por llave foránea hacia el modelo
+def get_ids_referenciados(db: Session, modelo, ids):
+    referenciados = {}
+    for tabla in models.Base.metadata.sorted_tables:
+        for foranea in tabla.foreign_keys:
+            if foranea.column.table is not modelo.__table__ or foranea.ondelete in ('CASCADE', 'SET NULL'):
+                continue
+            pendientes = [id_item for id_item in ids if id_item not in referenciados]
+            if not pendientes:
+                return referenciados
+            consulta = select(foranea.parent).where(foranea.parent.in_(pendientes)).distinct()
+            for id_item in db.execute(consulta).scalars():
+                referenciados[id_item] = tabla.name
+    return referenciados
+
+# Eliminar varias filas con un solo DELETE ... RETURNING y devolver las llaves eliminadas
+def delete_lote(db: Session, modelo, ids):
+    if not ids:
+        return set()
+    llave = _llave(modelo)
+    consulta = delete(modelo).where(llave.in_(list(ids))).returning(llave)
+    return set(db.execute(consulta, execution_options={"synchronize_session": False}).scalars())
 
 # USUARIOS
 def get_usuarios_by_tipo(db: Session, tipo_de_usuario: str):
@@ -363,7 +400,7 @@ def get_sedes_by_centro(db: Session, centro_id: int):
 
 # AMBIENTES
 def get_ambientes_by_sede(db: Session, sedeid: int):
-    ambientes = db.query(Ambiente).filter(Ambiente.sedeid == str (sedeid)).all()
+    ambientes = db.query(Ambiente).filter(Ambiente.sedeid == sedeid).all()
     return ambientes
 
 def get_ambientes_por_tipo_de_circuito(db: Session, tipo_de_circuito: str):
@@ -372,7 +409,7 @@ def get_ambientes_por_tipo_de_circuito(db: Session, tipo_de_circuito: str):
 
 # DISPOSITIVOS
 def get_dispositivos_by_ambiente(db: Session, ambienteid: int):
-    dispositivos = db.query(Dispositivo).filter(Dispositivo.ambienteid == str (ambienteid)).all()
+    dispositivos = db.query(Dispositivo).filter(Dispositivo.ambienteid == ambienteid).all()
     return dispositivos
 
 def get_dispositivos_por_fecha_instalacion(db: Session, fecha_inicio, fecha_fin):
@@ -385,25 +422,216 @@ def obtener_dispositivos_alto_consumo(db: Session, ambienteid: int, consumo_mini
 
 # COSTOS ENERGÍA
 def get_costos_energia_por_ano_mes(db: Session, sedeid: int, año: int, mes: int):
-    costos = db.query(CostoEnergia).filter(CostoEnergia.sedeid == sedeid, CostoEnergia.año == año, CostoEnergia.mes == str (mes)).all()
+    costos = db.query(CostoEnergia).filter(CostoEnergia.sedeid == sedeid, CostoEnergia.ano == año, CostoEnergia.mes == mes).all()
     return costos
 
 def get_consumo_energetico_por_fecha(db: Session, sedeid: int, fecha_inicio, fecha_fin):
     consumo = db.query(CostoEnergia).filter(CostoEnergia.sedeid == sedeid, CostoEnergia.fecha_inicio_factura.between(fecha_inicio, fecha_fin)).all()
     return consumo
 
+# Totales de consumo y facturación de una región en una sola consulta:
+# regionales -> centros -> sede_centro -> resumen_consumo_sede (los totales por sede que mantienen
+# los triggers de costos_energia). Cada sede cuenta una vez aunque esté en varios centros de la región.
+# Devuelve None si la región no existe y totales en cero si no tiene facturas.
+def get_resumen_consumo_total_por_region(db: Session, regionalid: str):
+    sedes_region = (
+        select(Centro.regionalid, SedeCentro.sedeid)
+        .join(SedeCentro, SedeCentro.centroid == Centro.centroid)
+        .distinct()
+        .subquery()
+    )
+    resumen = models.ResumenConsumoSede
+    consulta = (
+        select(
+            func.coalesce(func.sum(resumen.total_consumo_kw), 0).label('total_consumo_kw'),
+            func.coalesce(func.sum(resumen.total_consumo_qvarh), 0).label('total_consumo_qvarh'),
+            func.coalesce(func.sum(resumen.total_valor_factura), 0).label('total_valor_factura'),
+        )
+        .select_from(Regional)
+        .outerjoin(sedes_region, sedes_region.c.regionalid == Regional.regionalid)
+        .outerjoin(resumen, resumen.sedeid == sedes_region.c.sedeid)
+        .where(Regional.regionalid == str(regionalid))
+        .group_by(Regional.regionalid)
+    )
+    fila = db.execute(consulta).mappings().first()
+    return dict(fila) if fila is not None else None
+
+# Niveles de rollup_energia_mensual; el nivel nacional tiene una sola serie con id 'nacional'
+NIVELES_ROLLUP = ('sede', 'centro', 'regional', 'nacional')
+
+# Serie mensual de consumo de una sede, centro, regional o del país, leída solo de rollup_energia_mensual
+# (los triggers de costos_energia la mantienen al día). Es un rango de la llave primaria, así el costo
+# depende de los meses pedidos y no de cuántas facturas hay detrás. El nivel nacional no se guarda
+# (una sola fila por mes serializaría las escrituras de facturas): se suman las filas de las sedes,
+# que cuentan cada factura una vez aunque la sede esté en varios centros o en ninguno.
+def get_rollup_energia_mensual(db: Session, nivel: str, id=None, ano_inicio: int = None, ano_fin: int = None):
+    if nivel not in NIVELES_ROLLUP:
+        raise HTTPException(status_code=400, detail=f"Nivel no válido; use uno de: {', '.join(NIVELES_ROLLUP)}")
+    if nivel != 'nacional' and id is None:
+        raise HTTPException(status_code=400, detail=f"Se requiere el id para el nivel '{nivel}'")
+    rollup = models.RollupEnergiaMensual
+    if nivel == 'nacional':
+        consulta = (
+            select(
+                literal('nacional').label('nivel'), literal('nacional').label('id'), rollup.ano, rollup.mes,
+                func.sum(rollup.consumo_pkwh).label('consumo_pkwh'),
+                func.sum(rollup.consumo_qvarh).label('consumo_qvarh'),
+                func.sum(rollup.valor_factura).label('valor_factura'),
+                func.sum(rollup.cantidad_aprendices).label('cantidad_aprendices'),
+                func.sum(rollup.cantidad_administrativos).label('cantidad_administrativos'),
+                func.sum(rollup.facturas).label('facturas'),
+            )
+            .where(rollup.nivel == 'sede')
+            .group_by(rollup.ano, rollup.mes)
+            .having(func.sum(rollup.facturas) > 0)
+        )
+    else:
+        consulta = select(*rollup.__table__.columns).where(rollup.nivel == nivel, rollup.id == str(id), rollup.facturas > 0)
+    if ano_inicio is not None:
+        consulta = consulta.where(rollup.ano >= ano_inicio)
+    if ano_fin is not None:
+        consulta = consulta.where(rollup.ano <= ano_fin)
+    return [dict(fila) for fila in db.execute(consulta.order_by(rollup.ano, rollup.mes)).mappings()]
+
+# FACTOR DE POTENCIA (resultados de la última corrida de factor_potencia.py)
+ESTADOS_FACTOR_POTENCIA = ('normal', 'bajo', 'critico')
+
+def get_factor_potencia_sede(db: Session, sedeid: int):
+    tabla = models.FactorPotenciaSede.__table__
+    fila = db.execute(select(*tabla.columns).where(tabla.c.sedeid == sedeid)).mappings().first()
+    return dict(fila) if fila is not None else None
+
+# Sedes en un estado, de mayor a menor costo evitable (índice por estado y costo)
+def get_sedes_por_factor_potencia(db: Session, estado: str, limite: int = 100):
+    if estado not in ESTADOS_FACTOR_POTENCIA:
+        raise HTTPException(status_code=400, detail=f"Estado no válido; use uno de: {', '.join(ESTADOS_FACTOR_POTENCIA)}")
+    if limite < 1:
+        raise HTTPException(status_code=400, detail="limite debe ser mayor que cero")
+    tabla = models.FactorPotenciaSede.__table__
+    consulta = (
+        select(*tabla.columns)
+        .where(tabla.c.estado == estado)
+        .order_by(tabla.c.costo_evitable.desc())
+        .limit(limite)
+    )
+    return [dict(fila) for fila in db.execute(consulta).mappings()]
+
+# Facturas de una sede con factor de potencia bajo el mínimo, por periodo
+def get_facturas_factor_potencia(db: Session, sedeid: int):
+    tabla = models.FactorPotenciaFactura.__table__
+    consulta = select(*tabla.columns).where(tabla.c.sedeid == sedeid).order_by(tabla.c.ano, tabla.c.mes)
+    return [dict(fila) for fila in db.execute(consulta).mappings()]
+
+# ANOMALÍAS DE FACTURACIÓN (acumuladas por las corridas de anomalias.py)
+# Las detectadas más recientemente en todas las sedes (índice por detectado_en y costoid)
+def get_anomalias_recientes(db: Session, limite: int = 100):
+    if limite < 1:
+        raise HTTPException(status_code=400, detail="limite debe ser mayor que cero")
+    tabla = models.AnomaliaFactura.__table__
+    consulta = (
+        select(*tabla.columns)
+        .order_by(tabla.c.detectado_en.desc(), tabla.c.costoid.desc())
+        .limit(limite)
+    )
+    return [dict(fila) for fila in db.execute(consulta).mappings()]
+
+# Anomalías de una sede por periodo
+def get_anomalias_sede(db: Session, sedeid: int):
+    tabla = models.AnomaliaFactura.__table__
+    consulta = select(*tabla.columns).where(tabla.c.sedeid == sedeid).order_by(tabla.c.ano, tabla.c.mes)
+    return [dict(fila) for fila in db.execute(consulta).mappings()]
+
 # OCUPACIÓN
+# Niveles de ocupacion_buckets y duración de cada periodo
+NIVELES_OCUPACION = ('ambiente', 'sede')
+PERIODOS_OCUPACION = {'dia': timedelta(days=1), 'semana': timedelta(weeks=1)}
+
+def _validar_ocupacion(nivel: str, fecha_inicio, fecha_fin, periodo: str = 'dia'):
+    if nivel not in NIVELES_OCUPACION:
+        raise HTTPException(status_code=400, detail=f"Nivel no válido; use uno de: {', '.join(NIVELES_OCUPACION)}")
+    if periodo not in PERIODOS_OCUPACION:
+        raise HTTPException(status_code=400, detail=f"Periodo no válido; use uno de: {', '.join(PERIODOS_OCUPACION)}")
+    if fecha_fin < fecha_inicio:
+        raise HTTPException(status_code=400, detail="fecha_fin no puede ser anterior a fecha_inicio")
+
+# Ambientes sobre los que se reparte el tiempo disponible al calcular la utilización
+def _ambientes_ocupacion(db: Session, nivel: str, id: int):
+    if nivel == 'ambiente':
+        return 1
+    return db.query(func.count(Ambiente.ambienteid)).filter(Ambiente.sedeid == id).scalar()
+
+# Promedio de personas por lectura y fracción del tiempo disponible que estuvo ocupado
+def _indicadores_ocupacion(lecturas, suma_personas, tiempo_total, disponible):
+    promedio = suma_personas / lecturas if lecturas else None
+    utilizacion = tiempo_total / disponible if disponible else None
+    return promedio, utilizacion
+
+# Serie de buckets diarios o semanales de un ambiente o sede; las semanas se incluyen
+# si su lunes cae en la semana de fecha_inicio o después
+def get_serie_ocupacion(db: Session, nivel: str, id: int, periodo: str, fecha_inicio: date, fecha_fin: date):
+    _validar_ocupacion(nivel, fecha_inicio, fecha_fin, periodo)
+    if periodo == 'semana':
+        fecha_inicio = fecha_inicio - timedelta(days=fecha_inicio.weekday())
+    bucket = models.OcupacionBucket
+    consulta = (
+        select(*bucket.__table__.columns)
+        .where(bucket.nivel == nivel, bucket.id == id, bucket.periodo == periodo, bucket.inicio.between(fecha_inicio, fecha_fin))
+        .order_by(bucket.inicio)
+    )
+    disponible = PERIODOS_OCUPACION[periodo] * _ambientes_ocupacion(db, nivel, id)
+    serie = []
+    for fila in db.execute(consulta).mappings():
+        promedio, utilizacion = _indicadores_ocupacion(fila['lecturas'], fila['suma_personas'], fila['tiempo_total'], disponible)
+        serie.append({**fila, 'promedio_personas': promedio, 'utilizacion': utilizacion})
+    return serie
+
+# Totales de ocupación de un rango combinando buckets: las semanas ISO completas dentro del rango
+# se leen del bucket semanal y solo los días sueltos de los bordes del bucket diario,
+# así un rango de un año lee unas 60 filas en lugar de todas sus lecturas
+def get_resumen_ocupacion(db: Session, nivel: str, id: int, fecha_inicio: date, fecha_fin: date):
+    _validar_ocupacion(nivel, fecha_inicio, fecha_fin)
+    bucket = models.OcupacionBucket
+    lunes = fecha_inicio + timedelta(days=-fecha_inicio.weekday() % 7)
+    semanas = ((fecha_fin - lunes).days + 1) // 7
+    if semanas > 0:
+        fin_semanas = lunes + timedelta(weeks=semanas)
+        tramos = or_(
+            and_(bucket.periodo == 'semana', bucket.inicio >= lunes, bucket.inicio < fin_semanas),
+            and_(bucket.periodo == 'dia', bucket.inicio >= fecha_inicio, bucket.inicio < lunes),
+            and_(bucket.periodo == 'dia', bucket.inicio >= fin_semanas, bucket.inicio <= fecha_fin),
+        )
+    else:
+        tramos = and_(bucket.periodo == 'dia', bucket.inicio.between(fecha_inicio, fecha_fin))
+    consulta = select(
+        func.coalesce(func.sum(bucket.lecturas), 0).label('lecturas'),
+        func.coalesce(func.sum(bucket.suma_personas), 0).label('suma_personas'),
+        func.min(bucket.min_personas).label('min_personas'),
+        func.max(bucket.max_personas).label('max_personas'),
+        func.coalesce(func.sum(bucket.tiempo_total), timedelta(0)).label('tiempo_total'),
+    ).where(bucket.nivel == nivel, bucket.id == id, tramos)
+    fila = db.execute(consulta).mappings().one()
+
+    disponible = timedelta(days=(fecha_fin - fecha_inicio).days + 1) * _ambientes_ocupacion(db, nivel, id)
+    promedio, utilizacion = _indicadores_ocupacion(int(fila['lecturas']), int(fila['suma_personas']), fila['tiempo_total'], disponible)
+    return {
+        'lecturas': int(fila['lecturas']),
+        'promedio_personas': promedio,
+        'min_personas': fila['min_personas'],
+        'max_personas': fila['max_personas'],
+        'tiempo_total': fila['tiempo_total'],
+        'utilizacion': utilizacion,
+    }
+
 def obtener_ocupacion_promedio(db: Session, ambienteid: int, fecha_inicio, fecha_fin):
-    ocupacion_promedio = db.query(func.avg(Ocupacion.cantidad_de_personas)).filter(Ocupacion.ambienteid == ambienteid, Ocupacion.fecha.between == str (fecha_inicio, fecha_fin)).scalar()
-    return ocupacion_promedio
+    return get_resumen_ocupacion(db, 'ambiente', ambienteid, fecha_inicio, fecha_fin)['promedio_personas']
 
 def get_ocupacion_por_ambiente_y_fecha(db: Session, ambienteid: int, fecha):
-    ocupacion = db.query(Ocupacion).filter(Ocupacion.ambienteid == ambienteid, Ocupacion.fecha == str (fecha)).all()
+    ocupacion = db.query(Ocupacion).filter(Ocupacion.ambienteid == ambienteid, Ocupacion.fecha == fecha).all()
     return ocupacion
 
 # SUBESTACIONES
 def get_subestaciones_por_sede(db: Session, sedeid: int):
-    subestaciones = db.query(Subestacion).filter(Subestacion.sedeid == str (sedeid)).all()
+    subestaciones = db.query(Subestacion).filter(Subestacion.sedeid == sedeid).all()
     return subestaciones
 
 def obtener_subestaciones_por_nivel_tension(db: Session, nivel_tension_kva: float):
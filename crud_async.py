@@ -0,0 +1,117 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import (Usuario, Regional, Centro, Sede, Ambiente, Dispositivo, CostoEnergia, Ocupacion, Subestacion, SedeCentro)
+from crud import format_city_name
+from paginacion import LIMITE_POR_DEFECTO, validar_cursor
+import cache
+
+# Consultas de solo lectura para los endpoints asíncronos.
+# Las listas se paginan por cursor (keyset) sobre la llave primaria, que da un orden estable:
+# cada función devuelve (filas, siguiente) donde siguiente es la llave de la última fila
+# si hay más resultados, o None en la última página.
+# Las filas son dicts con las columnas de la tabla: se seleccionan columnas y no entidades,
+# así no se construyen objetos ORM ni se llenan el identity map de la sesión.
+
+# Ejecutar una consulta con las columnas de la tabla de la entidad y devolver dicts
+async def _todos(db: AsyncSession, consulta):
+    tabla = consulta.column_descriptions[0]['entity'].__table__
+    resultado = await db.execute(consulta.with_only_columns(*tabla.columns))
+    return [dict(fila) for fila in resultado.mappings()]
+
+# Ejecutar una consulta paginada por la columna de orden
+async def _pagina(db: AsyncSession, consulta, orden, limit, after):
+    if after is not None:
+        consulta = consulta.where(orden > validar_cursor(after, orden))
+    filas = await _todos(db, consulta.order_by(orden).limit(limit + 1))
+    if len(filas) <= limit:
+        return filas, None
+    filas = filas[:limit]
+    return filas, filas[-1][orden.key]
+
+# Página guardada en la caché de datos de referencia, con su cursor siguiente
+async def _pagina_cacheada(espacio, clave, db: AsyncSession, consulta, orden, limit, after, version=None):
+    if after is not None:
+        validar_cursor(after, orden)
+    async def cargar():
+        return await _pagina(db, consulta, orden, limit, after)
+    filas, siguiente = await cache.obtener_async(espacio, f"{clave}:{limit}:{after}:{version}", cargar)
+    return filas, siguiente
+
+# USUARIOS
+async def get_usuarios_by_tipo(db: AsyncSession, tipo_de_usuario: str, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Usuario).where(Usuario.tipo_de_usuario == tipo_de_usuario), Usuario.userid, limit, after)
+
+# REGIONALES
+# version es la etiqueta de condicional.py: liga la página cacheada a la versión de la tabla en la base
+async def get_all_regionales(db: AsyncSession, limit: int = LIMITE_POR_DEFECTO, after=None, version=None):
+    return await _pagina_cacheada('regionales', 'todas', db, select(Regional), Regional.regionalid, limit, after, version)
+
+# CENTROS
+async def get_centros_by_region(db: AsyncSession, regionalid: int, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Centro).where(Centro.regionalid == str(regionalid)), Centro.centroid, limit, after)
+
+async def get_centros_por_ciudad(db: AsyncSession, ciudad: str, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Centro).where(Centro.ciudad == format_city_name(ciudad)), Centro.centroid, limit, after)
+
+# SEDES
+async def get_sedes_by_centro(db: AsyncSession, centroid: int, limit: int = LIMITE_POR_DEFECTO, after=None):
+    consulta = (
+        select(Sede)
+        .join(SedeCentro, SedeCentro.sedeid == Sede.sedeid)
+        .where(SedeCentro.centroid == str(centroid))
+    )
+    return await _pagina_cacheada('sede_centro', centroid, db, consulta, Sede.sedeid, limit, after)
+
+# AMBIENTES
+async def get_ambientes_by_sede(db: AsyncSession, sedeid: int, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Ambiente).where(Ambiente.sedeid == sedeid), Ambiente.ambienteid, limit, after)
+
+async def get_ambientes_por_tipo_de_circuito(db: AsyncSession, tipo_de_circuito: str, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Ambiente).where(Ambiente.tipo_de_circuito == tipo_de_circuito), Ambiente.ambienteid, limit, after)
+
+# DISPOSITIVOS
+async def get_dispositivos_by_ambiente(db: AsyncSession, ambienteid: int, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Dispositivo).where(Dispositivo.ambienteid == ambienteid), Dispositivo.deviceid, limit, after)
+
+async def get_dispositivos_por_fecha_instalacion(db: AsyncSession, fecha_inicio, fecha_fin, limit: int = LIMITE_POR_DEFECTO, after=None):
+    consulta = select(Dispositivo)
+    if fecha_inicio is not None:
+        consulta = consulta.where(Dispositivo.fecha_de_instalacion >= fecha_inicio)
+    if fecha_fin is not None:
+        consulta = consulta.where(Dispositivo.fecha_de_instalacion <= fecha_fin)
+    return await _pagina(db, consulta, Dispositivo.deviceid, limit, after)
+
+async def obtener_dispositivos_alto_consumo(db: AsyncSession, ambienteid: int, consumo_minimo: float, limit: int = LIMITE_POR_DEFECTO, after=None):
+    consulta = select(Dispositivo).where(
+        Dispositivo.ambienteid == ambienteid,
+        Dispositivo.consumo_energetico > consumo_minimo
+    )
+    return await _pagina(db, consulta, Dispositivo.deviceid, limit, after)
+
+# COSTOS ENERGÍA
+async def get_costos_energia_por_ano_mes(db: AsyncSession, sedeid: int, ano: int, mes: int, limit: int = LIMITE_POR_DEFECTO, after=None):
+    consulta = select(CostoEnergia).where(
+        CostoEnergia.sedeid == sedeid,
+        CostoEnergia.ano == ano,
+        CostoEnergia.mes == mes
+    )
+    return await _pagina(db, consulta, CostoEnergia.costoid, limit, after)
+
+async def get_consumo_energetico_por_fecha(db: AsyncSession, sedeid: int, fecha_inicio, fecha_fin, limit: int = LIMITE_POR_DEFECTO, after=None):
+    consulta = select(CostoEnergia).where(
+        CostoEnergia.sedeid == sedeid,
+        CostoEnergia.fecha_inicio_factura.between(fecha_inicio, fecha_fin)
+    )
+    return await _pagina(db, consulta, CostoEnergia.costoid, limit, after)
+
+# OCUPACIÓN
+async def get_ocupacion_por_ambiente_y_fecha(db: AsyncSession, ambienteid: int, fecha, limit: int = LIMITE_POR_DEFECTO, after=None):
+    consulta = select(Ocupacion).where(Ocupacion.ambienteid == ambienteid, Ocupacion.fecha == fecha)
+    return await _pagina(db, consulta, Ocupacion.ocupacionid, limit, after)
+
+# SUBESTACIONES
+async def get_subestaciones_por_sede(db: AsyncSession, sedeid: int, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Subestacion).where(Subestacion.sedeid == sedeid), Subestacion.subestacionid, limit, after)
+
+async def obtener_subestaciones_por_nivel_tension(db: AsyncSession, nivel_tension_kva: float, limit: int = LIMITE_POR_DEFECTO, after=None):
+    return await _pagina(db, select(Subestacion).where(Subestacion.nivel_tension_kva == nivel_tension_kva), Subestacion.subestacionid, limit, after)
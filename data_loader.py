@@ -1,101 +1,558 @@
-import pandas as pd
+import argparse
+import csv
+import io
 import psycopg2
 import time
+from collections import defaultdict
+from contextlib import contextmanager
+from openpyxl import load_workbook
 
-# Esperar unos segundos para asegurar que la base de datos esté lista (opcional)
-time.sleep(10)
+import cache
 
-# Leer el archivo Excel (ajusta la ruta si es necesario)
-excel_file = 'Sedes_Centros.xlsx'
-df = pd.read_excel(excel_file)
+# Archivo Excel por defecto (ajusta la ruta si es necesario)
+EXCEL_FILE = 'Sedes_Centros.xlsx'
 
-# Imprimir los nombres de las columnas para verificar
-print("Columnas en el archivo Excel:", df.columns)
+# Columnas que usa el cargador, en el orden en que se normalizan
+COLUMNAS = [
+    'Codigo Regional',
+    'Regional',
+    'Cod',
+    'Descripcion Centro de Costos',
+    'Sedes',
+    'Direccion',
+    'Municipio',
+]
 
-# Verificar si hay NaN en las columnas críticas
-print("Filas con NaN en la columna 'Sedes':")
-print(df[df['Sedes'].isna()])
+# Cantidad de filas que se leen y procesan por bloque
+CHUNK_SIZE = 5000
 
-# Limpiar los datos, reemplazando los NaN con valores vacíos o valores por defecto
-df = df.fillna('')
-
-# Asegurarse de que las columnas críticas sean de tipo string
-df['Codigo Regional'] = df['Codigo Regional'].astype(str)
-df['Regional'] = df['Regional'].astype(str)
-df['Cod'] = df['Cod'].astype(str)
-df['Descripcion Centro de Costos'] = df['Descripcion Centro de Costos'].astype(str)
-df['Sedes'] = df['Sedes'].astype(str)
-df['Direccion'] = df['Direccion'].astype(str)
-df['Municipio'] = df['Municipio'].astype(str)
+# Parámetros de conexión a la base de datos PostgreSQL
+CONEXION = {
+    'dbname': 'postgres',
+    'user': 'postgres',
+    'password': 'sena2024',  # Reemplaza con tu contraseña de usuario postgres
+    'host': 'localhost',     # Cambia 'localhost' si estás usando otro host
+    'port': '5432',          # Cambia el puerto si es diferente
+}
 
 # Conexión a la base de datos PostgreSQL
-conn = psycopg2.connect(
-    dbname='postgres',
-    user='postgres',
-    password='sena2024',  # Reemplaza con tu contraseña de usuario postgres
-    host='localhost',     # Cambia 'localhost' si estás usando otro host
-    port='5432'           # Cambia el puerto si es diferente
-)
-cursor = conn.cursor()
-
-# Insertar datos en la tabla regionales
-for index, row in df.iterrows():
+def conectar(**parametros):
+    return psycopg2.connect(**{**CONEXION, **parametros})
+
+# Esperar a que la base de datos acepte conexiones, reintentando con espera exponencial
+def esperar_bd(intentos=8, espera_inicial=0.5, espera_maxima=10.0, **parametros):
+    espera = espera_inicial
+    for intento in range(1, intentos + 1):
+        try:
+            return conectar(**parametros)
+        except psycopg2.OperationalError as e:
+            if intento == intentos:
+                raise
+            print(f"Base de datos no disponible (intento {intento}/{intentos}): {e}".strip()
+                  + f" Reintentando en {espera:.1f} s")
+            time.sleep(espera)
+            espera = min(espera * 2, espera_maxima)
+
+# Tiempo y filas por fase de la carga, para saber dónde se va el tiempo
+class MetricasCarga:
+    FASES = ['lectura', 'limpieza', 'regionales', 'centros', 'sedes', 'sede_centro']
+
+    def __init__(self):
+        self.segundos = defaultdict(float)
+        self.filas = defaultdict(int)
+
+    def registrar(self, fase, segundos, filas=0):
+        self.segundos[fase] += segundos
+        self.filas[fase] += filas
+
+    @contextmanager
+    def medir(self, fase, filas=0):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(fase, time.perf_counter() - inicio, filas)
+
+    def reporte(self):
+        fases = self.FASES + [fase for fase in self.segundos if fase not in self.FASES]
+        return [
+            {
+                'fase': fase,
+                'filas': self.filas[fase],
+                'segundos': round(self.segundos[fase], 4),
+                'filas_por_segundo': round(self.filas[fase] / self.segundos[fase], 1) if self.segundos[fase] else None,
+            }
+            for fase in fases if fase in self.segundos
+        ]
+
+    def imprimir(self):
+        print(f"{'fase':<16}{'filas':>12}{'segundos':>12}{'filas/s':>14}")
+        for fila in self.reporte():
+            por_segundo = '-' if fila['filas_por_segundo'] is None else f"{fila['filas_por_segundo']:.1f}"
+            print(f"{fila['fase']:<16}{fila['filas']:>12}{fila['segundos']:>12.3f}{por_segundo:>14}")
+
+# Convertir una celda a texto limpio (equivalente a fillna('') + astype(str))
+def limpiar_valor(valor):
+    if valor is None:
+        return ''
+    # Los códigos numéricos llegan como float cuando la celda tiene formato decimal
+    if isinstance(valor, float):
+        if valor != valor:  # NaN
+            return ''
+        if valor.is_integer():
+            return str(int(valor))
+    return str(valor)
+
+# Leer el archivo Excel en bloques de tamaño fijo sin cargar toda la hoja en memoria
+# Con métricas, el tiempo de limpieza se mide por fila y el resto del tiempo del generador cuenta como lectura.
+def leer_excel_por_bloques(excel_file, chunk_size=CHUNK_SIZE, metricas=None):
+    metricas = metricas or MetricasCarga()
+    inicio = time.perf_counter()
+    limpieza = 0.0
+    wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        filas = wb.active.iter_rows(values_only=True)
+        encabezados = [limpiar_valor(celda).strip() for celda in next(filas, ())]
+        print("Columnas en el archivo Excel:", encabezados)
+
+        faltantes = [columna for columna in COLUMNAS if columna not in encabezados]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el archivo Excel: {faltantes}")
+        posiciones = [encabezados.index(columna) for columna in COLUMNAS]
+
+        bloque = []
+        for numero, fila in enumerate(filas, start=2):
+            # Ignorar filas completamente vacías al final de la hoja
+            if not any(celda is not None for celda in fila):
+                continue
+            inicio_limpieza = time.perf_counter()
+            valores = {}
+            for columna, posicion in zip(COLUMNAS, posiciones):
+                valores[columna] = limpiar_valor(fila[posicion] if posicion < len(fila) else None)
+            limpieza += time.perf_counter() - inicio_limpieza
+            if valores['Sedes'] == '':
+                print(f"Fila {numero} sin valor en la columna 'Sedes'")
+            bloque.append(valores)
+            if len(bloque) >= chunk_size:
+                metricas.registrar('lectura', time.perf_counter() - inicio - limpieza, len(bloque))
+                metricas.registrar('limpieza', limpieza, len(bloque))
+                yield bloque
+                bloque = []
+                inicio = time.perf_counter()
+                limpieza = 0.0
+        if bloque:
+            metricas.registrar('lectura', time.perf_counter() - inicio - limpieza, len(bloque))
+            metricas.registrar('limpieza', limpieza, len(bloque))
+            yield bloque
+    finally:
+        wb.close()
+
+# Insertar un bloque en regionales, centros, sedes y sede_centro en una sola pasada
+def insertar_bloque(cursor, bloque, metricas=None):
+    metricas = metricas or MetricasCarga()
+    regionales_vistas = set()
+    centros_vistos = set()
+
+    for row in bloque:
+        # Insertar datos en la tabla regionales
+        if row['Codigo Regional'] not in regionales_vistas:
+            regionales_vistas.add(row['Codigo Regional'])
+            with metricas.medir('regionales', 1):
+                cursor.execute(
+                    """
+                    INSERT INTO regionales (regionalid, nombre_de_la_region)
+                    VALUES (%s, %s)
+                    ON CONFLICT DO NOTHING
+                    """,
+                    (row['Codigo Regional'], row['Regional'])
+                )
+
+        # Insertar datos en la tabla centros
+        if row['Cod'] not in centros_vistos:
+            centros_vistos.add(row['Cod'])
+            with metricas.medir('centros', 1):
+                cursor.execute(
+                    """
+                    INSERT INTO centros (centroid, nombre_del_centro, ciudad, regionalid)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                    """,
+                    (row['Cod'], row['Descripcion Centro de Costos'], row['Municipio'], row['Codigo Regional'])
+                )
+
+        # Saltar filas donde 'Sedes' está vacío o es 'nan'
+        if row['Sedes'] == '' or row['Sedes'].lower() == 'nan':
+            continue
+
+        with metricas.medir('sedes', 1):
+            # Verificar si la sede ya existe
+            cursor.execute("SELECT sedeid FROM sedes WHERE nombre_de_la_sede = %s", (row['Sedes'],))
+            result = cursor.fetchone()
+
+            if result:
+                sede_id = result[0]
+            else:
+                cursor.execute(
+                    """
+                    INSERT INTO sedes (nombre_de_la_sede, direccion)
+                    VALUES (%s, %s)
+                    RETURNING sedeid
+                    """,
+                    (row['Sedes'], row['Direccion'])
+                )
+                sede_id = cursor.fetchone()[0]
+
+        # Insertar en la tabla intermedia sede_centro
+        with metricas.medir('sede_centro', 1):
+            cursor.execute(
+                """
+                INSERT INTO sede_centro (sedeid, centroid)
+                VALUES (%s, %s)
+                ON CONFLICT DO NOTHING
+                """,
+                (sede_id, row['Cod'])
+            )
+
+# Crear la tabla temporal donde se copian las filas limpias antes de fusionarlas
+def crear_staging(cursor):
     cursor.execute(
         """
-        INSERT INTO regionales (regionalid, nombre_de_la_region) 
-        VALUES (%s, %s) 
-        ON CONFLICT DO NOTHING
-        """,
-        (row['Codigo Regional'], row['Regional'])
+        CREATE TEMP TABLE staging_sedes_centros (
+            fila BIGINT,
+            codigo_regional VARCHAR(50),
+            regional VARCHAR(255),
+            cod VARCHAR(50),
+            descripcion_centro VARCHAR(255),
+            sedes VARCHAR(255),
+            direccion VARCHAR(255),
+            municipio VARCHAR(255)
+        ) ON COMMIT DROP
+        """
     )
 
-# Insertar datos en la tabla centros
-for index, row in df.iterrows():
-    cursor.execute(
+# Convertir un bloque al texto CSV que recibe COPY
+def bloque_a_csv(bloque, primera_fila=0):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for numero, row in enumerate(bloque, start=primera_fila):
+        writer.writerow([numero] + [row[columna] for columna in COLUMNAS])
+    return buffer.getvalue()
+
+# Copiar texto CSV ya preparado a la tabla temporal
+def copiar_csv(cursor, texto):
+    cursor.copy_expert(
         """
-        INSERT INTO centros (centroid, nombre_del_centro, ciudad, regionalid) 
-        VALUES (%s, %s, %s, %s) 
-        ON CONFLICT DO NOTHING
+        COPY staging_sedes_centros (fila, codigo_regional, regional, cod, descripcion_centro,
+                                    sedes, direccion, municipio)
+        FROM STDIN WITH (FORMAT csv)
         """,
-        (row['Cod'], row['Descripcion Centro de Costos'], row['Municipio'], row['Codigo Regional'])
+        io.StringIO(texto)
     )
 
-# Insertar datos en las tablas sedes y sede_centro
-for index, row in df.iterrows():
-    # Saltar filas donde 'Sedes' está vacío o es 'nan'
-    if row['Sedes'] == '' or row['Sedes'].lower() == 'nan':
-        continue
+# Copiar un bloque a la tabla temporal con COPY (un solo viaje por bloque)
+def copiar_bloque(cursor, bloque, primera_fila=0):
+    copiar_csv(cursor, bloque_a_csv(bloque, primera_fila))
+
+# Fusionar la tabla temporal con las tablas definitivas usando sentencias por conjuntos.
+# Ante duplicados gana la primera fila del archivo, igual que en la carga fila por fila.
+def fusionar_staging(cursor, metricas=None):
+    metricas = metricas or MetricasCarga()
+    cursor.execute("ANALYZE staging_sedes_centros")
+
+    with metricas.medir('regionales'):
+        cursor.execute(
+            """
+            INSERT INTO regionales (regionalid, nombre_de_la_region)
+            SELECT DISTINCT ON (codigo_regional) codigo_regional, regional
+            FROM staging_sedes_centros
+            ORDER BY codigo_regional, fila
+            ON CONFLICT DO NOTHING
+            """
+        )
+        regionales = cursor.rowcount
+    metricas.filas['regionales'] += regionales
+
+    with metricas.medir('centros'):
+        cursor.execute(
+            """
+            INSERT INTO centros (centroid, nombre_del_centro, ciudad, regionalid)
+            SELECT DISTINCT ON (cod) cod, descripcion_centro, municipio, codigo_regional
+            FROM staging_sedes_centros
+            ORDER BY cod, fila
+            ON CONFLICT DO NOTHING
+            """
+        )
+        centros = cursor.rowcount
+    metricas.filas['centros'] += centros
 
-    # Verificar si la sede ya existe
-    cursor.execute("SELECT sedeid FROM sedes WHERE nombre_de_la_sede = %s", (row['Sedes'],))
-    result = cursor.fetchone()
+    # sedes no tiene restricción única por nombre, así que las nuevas se detectan con NOT EXISTS.
+    # Los ids que devuelve RETURNING quedan en una tabla temporal para enlazar sede_centro en la
+    # sentencia siguiente (separada para medir cada fase)
+    with metricas.medir('sedes'):
+        cursor.execute("DROP TABLE IF EXISTS sedes_nuevas")
+        cursor.execute("CREATE TEMP TABLE sedes_nuevas (sedeid INT, nombre_de_la_sede VARCHAR(255)) ON COMMIT DROP")
+        cursor.execute(
+            """
+            WITH nuevas AS (
+                INSERT INTO sedes (nombre_de_la_sede, direccion)
+                SELECT sedes, direccion
+                FROM (
+                    SELECT DISTINCT ON (s.sedes) s.sedes, s.direccion, s.fila
+                    FROM staging_sedes_centros s
+                    WHERE s.sedes <> '' AND lower(s.sedes) <> 'nan'
+                      AND NOT EXISTS (SELECT 1 FROM sedes se WHERE se.nombre_de_la_sede = s.sedes)
+                    ORDER BY s.sedes, s.fila
+                ) primeras
+                ORDER BY fila
+                RETURNING sedeid, nombre_de_la_sede
+            )
+            INSERT INTO sedes_nuevas SELECT sedeid, nombre_de_la_sede FROM nuevas
+            """
+        )
+        sedes = cursor.rowcount
+    metricas.filas['sedes'] += sedes
 
-    if result:
-        sede_id = result[0]
-    else:
+    # Las sedes recién insertadas se enlazan con el id que devolvió RETURNING; las que ya existían,
+    # con la de menor id si hay varias con el mismo nombre, como hacía la consulta fila por fila
+    with metricas.medir('sede_centro'):
         cursor.execute(
             """
-            INSERT INTO sedes (nombre_de_la_sede, direccion) 
-            VALUES (%s, %s) 
-            RETURNING sedeid
-            """,
-            (row['Sedes'], row['Direccion'])
+            INSERT INTO sede_centro (sedeid, centroid)
+            SELECT DISTINCT ids.sedeid, s.cod
+            FROM staging_sedes_centros s
+            JOIN (
+                SELECT nombre_de_la_sede, sedeid FROM sedes_nuevas
+                UNION ALL
+                SELECT nombre_de_la_sede, min(sedeid) AS sedeid
+                FROM sedes
+                WHERE nombre_de_la_sede IN (SELECT sedes FROM staging_sedes_centros)
+                  AND sedeid NOT IN (SELECT sedeid FROM sedes_nuevas)
+                GROUP BY nombre_de_la_sede
+            ) ids ON ids.nombre_de_la_sede = s.sedes
+            JOIN centros c ON c.centroid = s.cod
+            ON CONFLICT DO NOTHING
+            """
         )
-        sede_id = cursor.fetchone()[0]
+        sede_centro = cursor.rowcount
+    metricas.filas['sede_centro'] += sede_centro
 
-    # Insertar en la tabla intermedia sede_centro
+    return {
+        'regionales': regionales,
+        'centros': centros,
+        'sedes': sedes,
+        'sede_centro': sede_centro,
+    }
+
+# Crear (si no existe) la tabla con la huella de cada fila cargada, clave Cod + Sedes
+def crear_manifiesto(cursor):
     cursor.execute(
         """
-        INSERT INTO sede_centro (sedeid, centroid) 
-        VALUES (%s, %s) 
-        ON CONFLICT DO NOTHING
-        """,
-        (sede_id, row['Cod'])
+        CREATE TABLE IF NOT EXISTS manifiesto_sedes_centros (
+            cod VARCHAR(50),
+            sede VARCHAR(255),
+            huella CHAR(32) NOT NULL,
+            actualizado TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (cod, sede)
+        )
+        """
     )
 
-# Confirmar los cambios y cerrar la conexión
-conn.commit()
-cursor.close()
-conn.close()
+# Comparar la tabla temporal con el manifiesto y dejar en ella solo las filas insertadas o modificadas
+def calcular_delta(cursor):
+    cursor.execute(
+        """
+        CREATE TEMP TABLE delta_sedes_centros ON COMMIT DROP AS
+        WITH fuente AS (
+            SELECT DISTINCT ON (cod, sedes) cod, sedes,
+                   md5(concat_ws('|', codigo_regional, regional, cod, descripcion_centro,
+                                 sedes, direccion, municipio)) AS huella
+            FROM staging_sedes_centros
+            ORDER BY cod, sedes, fila
+        )
+        SELECT f.cod, f.sedes AS sede, f.huella,
+               CASE WHEN m.cod IS NULL THEN 'insertada' ELSE 'modificada' END AS cambio
+        FROM fuente f
+        LEFT JOIN manifiesto_sedes_centros m ON m.cod = f.cod AND m.sede = f.sedes
+        WHERE m.huella IS DISTINCT FROM f.huella
+        UNION ALL
+        SELECT m.cod, m.sede, m.huella, 'eliminada'
+        FROM manifiesto_sedes_centros m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM staging_sedes_centros s WHERE s.cod = m.cod AND s.sedes = m.sede
+        )
+        """
+    )
+    cursor.execute(
+        """
+        DELETE FROM staging_sedes_centros s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM delta_sedes_centros d
+            WHERE d.cod = s.cod AND d.sede = s.sedes AND d.cambio <> 'eliminada'
+        )
+        """
+    )
+    cursor.execute("SELECT cambio, count(*) FROM delta_sedes_centros GROUP BY cambio")
+    resumen = {'insertada': 0, 'modificada': 0, 'eliminada': 0}
+    resumen.update(dict(cursor.fetchall()))
+    return resumen
+
+# Aplicar a regionales, centros y sedes los valores de las filas modificadas
+def actualizar_modificadas(cursor):
+    cursor.execute(
+        """
+        UPDATE regionales r
+        SET nombre_de_la_region = s.regional
+        FROM (
+            SELECT DISTINCT ON (codigo_regional) codigo_regional, regional
+            FROM staging_sedes_centros
+            ORDER BY codigo_regional, fila
+        ) s
+        WHERE r.regionalid = s.codigo_regional
+          AND r.nombre_de_la_region IS DISTINCT FROM s.regional
+        """
+    )
+    regionales = cursor.rowcount
+
+    cursor.execute(
+        """
+        UPDATE centros c
+        SET nombre_del_centro = s.descripcion_centro, ciudad = s.municipio, regionalid = s.codigo_regional
+        FROM (
+            SELECT DISTINCT ON (cod) cod, descripcion_centro, municipio, codigo_regional
+            FROM staging_sedes_centros
+            ORDER BY cod, fila
+        ) s
+        WHERE c.centroid = s.cod
+          AND (c.nombre_del_centro, c.ciudad, c.regionalid)
+              IS DISTINCT FROM (s.descripcion_centro, s.municipio, s.codigo_regional)
+        """
+    )
+    centros = cursor.rowcount
+
+    cursor.execute(
+        """
+        UPDATE sedes se
+        SET direccion = s.direccion
+        FROM (
+            SELECT DISTINCT ON (sedes) sedes, direccion
+            FROM staging_sedes_centros
+            WHERE sedes <> '' AND lower(sedes) <> 'nan'
+            ORDER BY sedes, fila
+        ) s
+        WHERE se.nombre_de_la_sede = s.sedes
+          AND se.direccion IS DISTINCT FROM s.direccion
+        """
+    )
+    sedes = cursor.rowcount
+
+    return {'regionales': regionales, 'centros': centros, 'sedes': sedes}
+
+# Quitar los enlaces sede_centro de las filas que desaparecieron del archivo.
+# Las sedes y centros se conservan porque pueden tener ambientes o costos asociados.
+def eliminar_removidas(cursor):
+    cursor.execute(
+        """
+        DELETE FROM sede_centro sc
+        USING delta_sedes_centros d, sedes se
+        WHERE d.cambio = 'eliminada'
+          AND se.nombre_de_la_sede = d.sede
+          AND sc.sedeid = se.sedeid
+          AND sc.centroid = d.cod
+        """
+    )
+    return cursor.rowcount
+
+# Registrar en el manifiesto las huellas de las filas aplicadas
+def actualizar_manifiesto(cursor):
+    cursor.execute(
+        """
+        DELETE FROM manifiesto_sedes_centros m
+        USING delta_sedes_centros d
+        WHERE d.cambio = 'eliminada' AND m.cod = d.cod AND m.sede = d.sede
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO manifiesto_sedes_centros (cod, sede, huella)
+        SELECT cod, sede, huella
+        FROM delta_sedes_centros
+        WHERE cambio <> 'eliminada'
+        ON CONFLICT (cod, sede) DO UPDATE
+        SET huella = EXCLUDED.huella, actualizado = now()
+        """
+    )
+
+# Aplicar solo las filas insertadas, modificadas o eliminadas desde la última carga
+def aplicar_delta(cursor, metricas=None):
+    metricas = metricas or MetricasCarga()
+    crear_manifiesto(cursor)
+    with metricas.medir('delta'):
+        cambios = calcular_delta(cursor)
+    metricas.filas['delta'] += sum(cambios.values())
+    with metricas.medir('actualizaciones'):
+        actualizadas = actualizar_modificadas(cursor)
+    nuevas = fusionar_staging(cursor, metricas)
+    with metricas.medir('sede_centro'):
+        enlaces_eliminados = eliminar_removidas(cursor)
+    with metricas.medir('manifiesto', cambios['insertada'] + cambios['modificada'] + cambios['eliminada']):
+        actualizar_manifiesto(cursor)
+    return {
+        'filas': cambios,
+        'nuevas': nuevas,
+        'actualizadas': actualizadas,
+        'sede_centro_eliminados': enlaces_eliminados,
+    }
+
+# Cargar el archivo completo procesando un bloque a la vez.
+# modo='filas' inserta fila por fila; modo='copy' usa COPY + tabla temporal;
+# modo='delta' usa COPY pero solo aplica los cambios respecto al manifiesto.
+def cargar(excel_file=EXCEL_FILE, chunk_size=CHUNK_SIZE, modo='filas', metricas=None, **conexion):
+    metricas = metricas or MetricasCarga()
+    conn = esperar_bd(**conexion)
+    cursor = conn.cursor()
+    total = 0
+    try:
+        if modo in ('copy', 'delta'):
+            crear_staging(cursor)
+        for bloque in leer_excel_por_bloques(excel_file, chunk_size, metricas):
+            if modo in ('copy', 'delta'):
+                with metricas.medir('copy', len(bloque)):
+                    copiar_bloque(cursor, bloque, total)
+            else:
+                insertar_bloque(cursor, bloque, metricas)
+            total += len(bloque)
+        if modo == 'copy':
+            print("Filas nuevas por tabla:", fusionar_staging(cursor, metricas))
+        elif modo == 'delta':
+            reporte = aplicar_delta(cursor, metricas)
+            print("Filas del archivo:", reporte['filas'])
+            print("Filas nuevas por tabla:", reporte['nuevas'])
+            print("Filas actualizadas por tabla:", reporte['actualizadas'])
+            print("Enlaces sede_centro eliminados:", reporte['sede_centro_eliminados'])
+        # Confirmar los cambios
+        with metricas.medir('commit'):
+            conn.commit()
+        # Con la caché compartida en Redis, los workers de la API dejan de servir los datos viejos
+        cache.invalidar('regionales', 'centros', 'sedes', 'sede_centro')
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga regionales, centros y sedes desde el archivo Excel.")
+    parser.add_argument("excel_file", nargs="?", default=EXCEL_FILE, help="Ruta del archivo Excel")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Filas procesadas por bloque")
+    parser.add_argument("--modo", choices=["filas", "copy", "delta"], default="filas",
+                        help="'filas' inserta fila por fila; 'copy' usa COPY y fusión por conjuntos; "
+                             "'delta' aplica solo los cambios desde la última carga")
+    args = parser.parse_args()
 
-print("Datos insertados correctamente.")
+    metricas = MetricasCarga()
+    total = cargar(args.excel_file, args.chunk_size, args.modo, metricas)
+    print(f"Datos insertados correctamente ({total} filas).")
+    metricas.imprimir()
@@ -0,0 +1,85 @@
+import csv
+import io
+
+from fastapi import HTTPException
+from pydantic_core import to_json
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Ambiente, CostoEnergia, Dispositivo, Ocupacion
+
+# Filas que se traen del cursor del servidor en cada viaje a la base
+FILAS_POR_LOTE = 2000
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Tablas exportables: modelo, columna de fecha para el rango y cómo se filtra por sede.
+# Ocupación y dispositivos no tienen sedeid propio: se filtran por la sede de su ambiente.
+EXPORTACIONES = {
+    'costos_energia': {'modelo': CostoEnergia, 'fecha': CostoEnergia.fecha_inicio_factura, 'por_ambiente': False},
+    'ocupacion': {'modelo': Ocupacion, 'fecha': Ocupacion.fecha, 'por_ambiente': True},
+    'dispositivos': {'modelo': Dispositivo, 'fecha': Dispositivo.fecha_de_instalacion, 'por_ambiente': True},
+}
+
+# Armar la consulta de exportación con los filtros pedidos, ordenada por la llave primaria.
+# Se seleccionan columnas y no objetos ORM para que la sesión no acumule instancias.
+def consulta_exportacion(entidad, sedeid=None, ambienteid=None, fecha_inicio=None, fecha_fin=None):
+    config = EXPORTACIONES.get(entidad)
+    if config is None:
+        raise HTTPException(status_code=404, detail=f"No se puede exportar '{entidad}'")
+    modelo = config['modelo']
+    tabla = modelo.__table__
+    consulta = select(*tabla.columns)
+
+    if ambienteid is not None:
+        if not config['por_ambiente']:
+            raise HTTPException(status_code=400, detail=f"'{entidad}' no se puede filtrar por ambiente")
+        consulta = consulta.where(modelo.ambienteid == ambienteid)
+    if sedeid is not None:
+        if config['por_ambiente']:
+            consulta = consulta.join(Ambiente, Ambiente.ambienteid == modelo.ambienteid).where(Ambiente.sedeid == sedeid)
+        else:
+            consulta = consulta.where(modelo.sedeid == sedeid)
+    if fecha_inicio is not None:
+        consulta = consulta.where(config['fecha'] >= fecha_inicio)
+    if fecha_fin is not None:
+        consulta = consulta.where(config['fecha'] <= fecha_fin)
+
+    return consulta.order_by(*tabla.primary_key.columns), [columna.name for columna in tabla.columns]
+
+# Recorrer el resultado por lotes con un cursor del lado del servidor.
+# La sesión se abre aquí porque el generador sigue vivo después de que termina el endpoint.
+def _lotes(consulta):
+    db = SessionLocal()
+    try:
+        resultado = db.execute(consulta.execution_options(stream_results=True, yield_per=FILAS_POR_LOTE))
+        for lote in resultado.partitions():
+            yield lote
+    finally:
+        db.close()
+
+def _ndjson(consulta, columnas):
+    for lote in _lotes(consulta):
+        yield b''.join(to_json(dict(zip(columnas, fila))) + b'\n' for fila in lote)
+
+def _csv(consulta, columnas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for lote in _lotes(consulta):
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Si no hubo filas, al menos se envían los encabezados
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+# Generador de bytes para StreamingResponse en el formato pedido
+def generar(formato, consulta, columnas):
+    if formato == 'csv':
+        return _csv(consulta, columnas)
+    return _ndjson(consulta, columnas)
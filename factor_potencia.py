@@ -0,0 +1,119 @@
+import argparse
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, select
+
+from analisis import ANO_FACTURA, MES_FACTURA, escribir_columnas, leer_columnas
+from database import SessionLocal
+from models import CostoEnergia, FactorPotenciaFactura, FactorPotenciaSede
+
+# Análisis de factor de potencia y energía reactiva sobre costos_energia.
+# Recorre todas las facturas de una vez con operaciones de numpy y reescribe las tablas
+# factor_potencia_sede (una fila por sede) y factor_potencia_factura (solo las facturas bajo
+# el mínimo), que la API lee por llave o por índice. Los resultados son los de la última corrida.
+
+# Umbrales por variables de entorno; también se pueden pasar como argumentos al ejecutar el análisis
+FACTOR_POTENCIA_MINIMO = float(os.getenv("FACTOR_POTENCIA_MINIMO", "0.9"))
+FACTOR_POTENCIA_CRITICO = float(os.getenv("FACTOR_POTENCIA_CRITICO", "0.85"))
+# Precio de cada kVArh por encima del permitido; sin valor se usa el costo por kWh de cada factura
+TARIFA_REACTIVA = float(os.environ["TARIFA_REACTIVA"]) if os.getenv("TARIFA_REACTIVA") else None
+
+TIPOS_FACTURAS = {
+    'costoid': 'int64', 'sedeid': 'int64', 'ano': 'float64', 'mes': 'float64',
+    'consumo_pkwh': 'float64', 'consumo_qvarh': 'float64', 'valor_factura': 'float64',
+}
+
+COLUMNAS_FACTURA = [columna.name for columna in FactorPotenciaFactura.__table__.columns]
+COLUMNAS_SEDE = [columna.name for columna in FactorPotenciaSede.__table__.columns]
+
+# Facturas con sede: sedeid es opcional en costos_energia y los resultados son por sede
+def consulta_facturas():
+    return select(
+        CostoEnergia.costoid,
+        CostoEnergia.sedeid,
+        ANO_FACTURA,
+        MES_FACTURA,
+        CostoEnergia.consumo_pkwh,
+        CostoEnergia.consumo_qvarh,
+        CostoEnergia.valor_factura,
+    ).where(CostoEnergia.sedeid.is_not(None))
+
+# Calcular el factor de potencia de cada factura y el resumen por sede.
+# FP = kWh / sqrt(kWh² + kVArh²). La energía reactiva permitida es kWh * tan(acos(minimo));
+# lo que la supera es el exceso, y el costo evitable es el exceso por la tarifa.
+# Solo se analizan las facturas con kWh positivo y kVArh informado.
+def analizar(facturas, minimo=FACTOR_POTENCIA_MINIMO, critico=FACTOR_POTENCIA_CRITICO, tarifa=TARIFA_REACTIVA):
+    kwh = facturas['consumo_pkwh'].to_numpy()
+    kvarh = facturas['consumo_qvarh'].to_numpy()
+    validas = (kwh > 0) & (kvarh >= 0)
+    facturas = facturas[validas].copy()
+    kwh, kvarh = kwh[validas], kvarh[validas]
+
+    facturas['factor_potencia'] = kwh / np.hypot(kwh, kvarh)
+    facturas['exceso_qvarh'] = np.maximum(kvarh - kwh * math.tan(math.acos(minimo)), 0.0)
+    precio = tarifa if tarifa is not None else facturas['valor_factura'].to_numpy() / kwh
+    facturas['costo_evitable'] = np.nan_to_num(facturas['exceso_qvarh'].to_numpy() * precio)
+    facturas['penalizada'] = facturas['factor_potencia'] < minimo
+    facturas = facturas.astype({'ano': 'Int64', 'mes': 'Int64'})
+
+    # El factor de la sede se calcula con la energía total, no como promedio de los factores
+    sedes = facturas.groupby('sedeid', as_index=False).agg(
+        facturas=('costoid', 'size'),
+        facturas_penalizadas=('penalizada', 'sum'),
+        consumo_pkwh=('consumo_pkwh', 'sum'),
+        consumo_qvarh=('consumo_qvarh', 'sum'),
+        factor_potencia_min=('factor_potencia', 'min'),
+        exceso_qvarh=('exceso_qvarh', 'sum'),
+        costo_evitable=('costo_evitable', 'sum'),
+    )
+    sedes['factor_potencia'] = sedes['consumo_pkwh'] / np.hypot(sedes['consumo_pkwh'], sedes['consumo_qvarh'])
+    sedes['estado'] = np.select(
+        [sedes['factor_potencia'] < critico, sedes['factor_potencia'] < minimo], ['critico', 'bajo'], 'normal'
+    )
+    sedes['calculado_en'] = datetime.now().replace(microsecond=0)
+
+    return facturas[facturas['penalizada']], sedes
+
+# Reemplazar los resultados anteriores en una sola transacción: las lecturas de la API ven
+# la corrida anterior hasta el commit y la nueva después, nunca una mezcla
+def guardar(db, facturas, sedes):
+    db.execute(delete(FactorPotenciaFactura))
+    db.execute(delete(FactorPotenciaSede))
+    escribir_columnas(db, FactorPotenciaFactura.__tablename__, facturas, COLUMNAS_FACTURA)
+    escribir_columnas(db, FactorPotenciaSede.__tablename__, sedes, COLUMNAS_SEDE)
+    db.commit()
+
+def ejecutar(db, minimo=FACTOR_POTENCIA_MINIMO, critico=FACTOR_POTENCIA_CRITICO, tarifa=TARIFA_REACTIVA):
+    facturas, sedes = analizar(leer_columnas(db, consulta_facturas(), TIPOS_FACTURAS), minimo, critico, tarifa)
+    guardar(db, facturas, sedes)
+    return {
+        'sedes': len(sedes),
+        'sedes_bajo': int((sedes['estado'] == 'bajo').sum()),
+        'sedes_critico': int((sedes['estado'] == 'critico').sum()),
+        'facturas_penalizadas': len(facturas),
+        'costo_evitable': float(sedes['costo_evitable'].sum()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Calcula el factor de potencia de todas las facturas y guarda el resumen por sede."
+    )
+    parser.add_argument("--minimo", type=float, default=FACTOR_POTENCIA_MINIMO, help="Factor de potencia mínimo sin penalización")
+    parser.add_argument("--critico", type=float, default=FACTOR_POTENCIA_CRITICO, help="Factor bajo el cual la sede queda en estado crítico")
+    parser.add_argument("--tarifa", type=float, default=TARIFA_REACTIVA, help="Precio por kVArh en exceso (por defecto, el costo por kWh de cada factura)")
+    args = parser.parse_args()
+    if not 0 < args.critico <= args.minimo < 1:
+        parser.error("se requiere 0 < critico <= minimo < 1")
+
+    db = SessionLocal()
+    try:
+        resumen = ejecutar(db, args.minimo, args.critico, args.tarifa)
+    finally:
+        db.close()
+    print(f"Sedes analizadas: {resumen['sedes']}, bajo el mínimo: {resumen['sedes_bajo']}, "
+          f"críticas: {resumen['sedes_critico']}")
+    print(f"Facturas penalizadas: {resumen['facturas_penalizadas']}, costo evitable: {resumen['costo_evitable']:,.0f}")
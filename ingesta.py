@@ -0,0 +1,109 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+import cache
+import data_loader
+from change_caracteres import NormalizadorTexto
+
+# Normalizador propio de cada proceso; su caché se reutiliza entre archivos
+_normalizador = None
+
+# Leer, limpiar y normalizar un archivo en un proceso del pool.
+# Devuelve los bloques ya convertidos a CSV para que el escritor solo haga COPY.
+def procesar_archivo(ruta, chunk_size=data_loader.CHUNK_SIZE):
+    global _normalizador
+    if _normalizador is None:
+        _normalizador = NormalizadorTexto()
+
+    bloques_csv = []
+    total = 0
+    for bloque in data_loader.leer_excel_por_bloques(ruta, chunk_size):
+        df = _normalizador.normalizar_dataframe(pd.DataFrame(bloque, columns=data_loader.COLUMNAS, dtype=object))
+        bloques_csv.append(data_loader.bloque_a_csv(df.to_dict('records'), total))
+        total += len(df)
+    return ruta, total, bloques_csv
+
+# Escribir un archivo ya procesado en su propia transacción
+def escribir_archivo(conn, bloques_csv):
+    cursor = conn.cursor()
+    try:
+        data_loader.crear_staging(cursor)
+        for texto in bloques_csv:
+            data_loader.copiar_csv(cursor, texto)
+        resultado = data_loader.fusionar_staging(cursor)
+        conn.commit()
+        cache.invalidar('regionales', 'centros', 'sedes', 'sede_centro')
+        return resultado
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# Buscar los libros de Excel del directorio (ignora los temporales de Office '~$...')
+def listar_archivos(directorio):
+    return sorted(
+        str(ruta) for ruta in Path(directorio).glob('*.xlsx')
+        if not ruta.name.startswith('~$')
+    )
+
+# Procesar todos los archivos en paralelo y escribirlos con una sola conexión
+def ingerir_directorio(directorio, workers=None, chunk_size=data_loader.CHUNK_SIZE):
+    archivos = listar_archivos(directorio)
+    if not archivos:
+        print(f"No se encontraron archivos .xlsx en {directorio}")
+        return {}
+
+    workers = workers or os.cpu_count() or 1
+    resultados = {}
+    conn = data_loader.esperar_bd()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pendientes = iter(archivos)
+            # Limitar los archivos en vuelo para no acumular en memoria más de los que se pueden escribir
+            futuros = {}
+            for ruta in pendientes:
+                futuros[pool.submit(procesar_archivo, ruta, chunk_size)] = ruta
+                if len(futuros) >= workers * 2:
+                    break
+
+            while futuros:
+                futuro = next(as_completed(futuros))
+                ruta = futuros.pop(futuro)
+                inicio = time.perf_counter()
+                try:
+                    _, total, bloques_csv = futuro.result()
+                    nuevas = escribir_archivo(conn, bloques_csv)
+                    resultados[ruta] = {'estado': 'ok', 'filas': total, 'nuevas': nuevas}
+                    print(f"{ruta}: {total} filas en {time.perf_counter() - inicio:.2f} s, nuevas {nuevas}")
+                except Exception as e:
+                    resultados[ruta] = {'estado': 'error', 'error': str(e)}
+                    print(f"{ruta}: error, el archivo no se cargó ({e})")
+
+                siguiente = next(pendientes, None)
+                if siguiente is not None:
+                    futuros[pool.submit(procesar_archivo, siguiente, chunk_size)] = siguiente
+    finally:
+        conn.close()
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Normaliza y carga en paralelo todos los libros de Excel de un directorio."
+    )
+    parser.add_argument("directorio", help="Directorio con un archivo .xlsx por regional")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de lectura (por defecto, todos los núcleos)")
+    parser.add_argument("--chunk-size", type=int, default=data_loader.CHUNK_SIZE, help="Filas procesadas por bloque")
+    args = parser.parse_args()
+
+    resultados = ingerir_directorio(args.directorio, args.workers, args.chunk_size)
+    errores = [ruta for ruta, resultado in resultados.items() if resultado['estado'] == 'error']
+    print(f"Archivos cargados: {len(resultados) - len(errores)}, con error: {len(errores)}")
+    if errores:
+        raise SystemExit(1)
@@ -21,6 +21,8 @@ CREATE TABLE centros (
     ciudad VARCHAR(255),                      
     regionalid VARCHAR(50),                   
     FOREIGN KEY (regionalid) REFERENCES regionales (regionalid),
+    usuario_id INT,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (userid),
     UNIQUE (nombre_del_centro, regionalid)    
 );
 
@@ -55,7 +57,9 @@ CREATE TABLE dispositivos (
     ambienteid INT,
     FOREIGN KEY (ambienteid) REFERENCES ambientes (ambienteid),
     tipo_de_lugar VARCHAR(255),
-    referencias_a_mediciones TEXT
+    referencias_a_mediciones TEXT,
+    usuario_id INT,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (userid)
 );
 
 CREATE TABLE ocupacion (
@@ -90,3 +94,59 @@ CREATE TABLE subestaciones (
     nivel_tension_kva FLOAT,
     FOREIGN KEY (sedeid) REFERENCES sedes (sedeid)
 );
+
+-- Índices para los filtros de las consultas de crud.py
+CREATE INDEX ix_centros_regionalid ON centros (regionalid);
+CREATE INDEX ix_sede_centro_centroid ON sede_centro (centroid);
+CREATE INDEX ix_ambientes_sedeid ON ambientes (sedeid);
+CREATE INDEX ix_ambientes_tipo_de_circuito ON ambientes (tipo_de_circuito);
+CREATE INDEX ix_dispositivos_ambienteid_consumo ON dispositivos (ambienteid, consumo_energetico);
+CREATE INDEX ix_dispositivos_fecha_de_instalacion ON dispositivos (fecha_de_instalacion);
+CREATE INDEX ix_ocupacion_ambienteid_fecha ON ocupacion (ambienteid, fecha);
+CREATE INDEX ix_costos_energia_sedeid_ano_mes ON costos_energia (sedeid, ano, mes);
+CREATE INDEX ix_costos_energia_sedeid_fecha_inicio ON costos_energia (sedeid, fecha_inicio_factura);
+CREATE INDEX ix_subestaciones_sedeid ON subestaciones (sedeid);
+
+
+-- Huella de cada fila del archivo de sedes y centros (carga incremental de data_loader.py)
+CREATE TABLE manifiesto_sedes_centros (
+    cod VARCHAR(50),
+    sede VARCHAR(255),
+    huella CHAR(32) NOT NULL,
+    actualizado TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (cod, sede)
+);
+
+
+-- Totales de costos_energia por sede para /resumen/consumo/region. Los triggers de costos_energia
+-- aplican a esta tabla la diferencia de cada sentencia (tablas de transición), así el resumen de
+-- una región suma unas filas por sede en lugar de recorrer todas sus facturas.
+\ir migraciones/003_resumen_consumo_sede.sql
+
+
+-- Consumo mensual preagregado por nivel (sede, centro y regional) y por (ano, mes); el total nacional
+-- se suma al leer. Los triggers de costos_energia suman o restan la diferencia de cada sentencia; los
+-- de sede_centro y centros recalculan los centros y regionales cuya asignación de sedes cambió.
+\ir migraciones/004_rollup_energia_mensual.sql
+
+
+-- Lecturas de ocupación agrupadas por día y por semana ISO (inicio = lunes), por ambiente y por sede.
+-- Los triggers de ocupacion suman cada inserción al bucket; en actualizaciones y borrados los días
+-- tocados se recalculan desde las lecturas porque el mínimo y el máximo no se pueden restar.
+\ir migraciones/005_ocupacion_buckets.sql
+
+
+-- Versión por tabla de regionales, sedes y subestaciones para los ETag de los GET condicionales;
+-- la suben los triggers de esas tablas en la misma transacción que cada escritura.
+\ir migraciones/008_versiones_tablas.sql
+
+
+-- Resultados del análisis de factor de potencia (factor_potencia.py): resumen por sede y facturas
+-- bajo el mínimo. Cada corrida los reemplaza; no tienen llaves foráneas porque son una foto de la
+-- última corrida y no deben impedir borrar sedes o facturas.
+\ir migraciones/006_factor_potencia.sql
+
+
+-- Facturas marcadas por la detección de anomalías (anomalias.py) y sedes con facturas nuevas o
+-- corregidas desde la última corrida, que agregan los triggers de costos_energia.
+\ir migraciones/007_anomalias_factura.sql
@@ -0,0 +1,105 @@
+import threading
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from analisis import ANO_FACTURA, MES_FACTURA, leer_columnas
+from models import CostoEnergia, ResumenConsumoSede
+
+# Indicadores de intensidad energética por sede y mes para todas las sedes a la vez.
+# El histórico de facturas se lee en una sola consulta y los indicadores y percentiles
+# se calculan con operaciones vectorizadas de pandas. La tabla resultante queda en memoria
+# del proceso mientras no cambie la versión de las facturas en la base (ver version_facturas), así
+# cualquier escritura, venga de este proceso, de otro worker o de un script, la deja vencida.
+
+METRICAS = ('kwh_por_aprendiz', 'kwh_por_administrativo', 'costo_por_kwh')
+
+TIPOS_FACTURAS = {
+    'sedeid': 'int64', 'ano': 'float64', 'mes': 'float64', 'consumo_pkwh': 'float64', 'valor_factura': 'float64',
+    'cantidad_aprendices': 'float64', 'cantidad_administrativos': 'float64',
+}
+
+_tabla = None
+_version = None
+_lock = threading.Lock()
+
+# Versión de las facturas leída de resumen_consumo_sede, una fila por sede: los triggers de
+# costos_energia dan a cambio un valor nuevo de secuencia en cada fila que tocan, así cualquier
+# inserción, actualización o borrado cambia la suma (y borrar sedes cambia el número de filas).
+# Las facturas sin sede no entran en el resumen, pero tampoco en los indicadores.
+def version_facturas(db):
+    return tuple(db.execute(select(func.count(), func.coalesce(func.sum(ResumenConsumoSede.cambio), 0))).one())
+
+# Facturas con sede y su periodo
+def consulta_facturas():
+    return select(
+        CostoEnergia.sedeid,
+        ANO_FACTURA,
+        MES_FACTURA,
+        CostoEnergia.consumo_pkwh,
+        CostoEnergia.valor_factura,
+        CostoEnergia.cantidad_aprendices,
+        CostoEnergia.cantidad_administrativos,
+    ).where(CostoEnergia.sedeid.is_not(None))
+
+# Año y mes son float porque pueden faltar
+def cargar_facturas(db):
+    return leer_columnas(db, consulta_facturas(), TIPOS_FACTURAS)
+
+# Calcular los indicadores de todas las sedes y meses.
+# Consumo y valor se suman entre las facturas del mes; la población es la mayor informada
+# en el mes, porque varias facturas de una sede repiten la misma cantidad de personas.
+# Los percentiles comparan cada sede con las demás del mismo mes: 1.0 es la de mayor intensidad.
+def calcular_kpis(facturas):
+    facturas = facturas.dropna(subset=['ano', 'mes'])
+    tabla = (
+        facturas.groupby(['sedeid', 'ano', 'mes'], as_index=False)
+        .agg(consumo_pkwh=('consumo_pkwh', 'sum'), valor_factura=('valor_factura', 'sum'),
+             cantidad_aprendices=('cantidad_aprendices', 'max'),
+             cantidad_administrativos=('cantidad_administrativos', 'max'))
+    )
+    consumo = tabla['consumo_pkwh']
+    tabla['kwh_por_aprendiz'] = consumo / tabla['cantidad_aprendices'].where(tabla['cantidad_aprendices'] > 0)
+    tabla['kwh_por_administrativo'] = consumo / tabla['cantidad_administrativos'].where(tabla['cantidad_administrativos'] > 0)
+    tabla['costo_por_kwh'] = tabla['valor_factura'] / consumo.where(consumo > 0)
+
+    percentiles = tabla.groupby(['ano', 'mes'])[list(METRICAS)].rank(pct=True)
+    for metrica in METRICAS:
+        tabla[f'percentil_{metrica}'] = percentiles[metrica]
+    return tabla.astype({'sedeid': 'int64', 'ano': 'int64', 'mes': 'int64',
+                         'cantidad_aprendices': 'Int64', 'cantidad_administrativos': 'Int64'})
+
+# Tabla de indicadores vigente; se recalcula una sola vez por versión aunque lleguen varias peticiones.
+# La versión se lee antes de cargar: una escritura durante el cálculo deja la tabla vencida y la próxima
+# petición la recalcula.
+def tabla_kpis(db):
+    global _tabla, _version
+    version = version_facturas(db)
+    with _lock:
+        if _version != version:
+            _tabla = calcular_kpis(cargar_facturas(db))
+            _version = version
+        return _tabla
+
+# Filas de la tabla como dicts con tipos de Python (NaN y NA pasan a None)
+def _registros(tabla):
+    return tabla.astype(object).where(tabla.notna(), None).to_dict('records')
+
+# Indicadores filtrados por periodo o sede; con orden se devuelven de mayor a menor en esa métrica
+def consultar(db, ano=None, mes=None, sedeid=None, orden=None, limite=None):
+    if orden is not None and orden not in METRICAS:
+        raise HTTPException(status_code=400, detail=f"Métrica no válida; use una de: {', '.join(METRICAS)}")
+    if limite is not None and limite < 1:
+        raise HTTPException(status_code=400, detail="limite debe ser mayor que cero")
+    tabla = tabla_kpis(db)
+    if ano is not None:
+        tabla = tabla[tabla['ano'] == ano]
+    if mes is not None:
+        tabla = tabla[tabla['mes'] == mes]
+    if sedeid is not None:
+        tabla = tabla[tabla['sedeid'] == sedeid]
+    if orden is not None:
+        tabla = tabla.sort_values(orden, ascending=False, na_position='last', kind='stable')
+    if limite is not None:
+        tabla = tabla.head(limite)
+    return _registros(tabla)
@@ -0,0 +1,265 @@
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+import cache
+import crud
+import models
+import schemas
+from cargas import validar_lote
+
+# Máximo de elementos aceptados en una sola petición por lotes
+LIMITE_LOTE = 5000
+
+# Entidades con operaciones por lotes: modelo, esquema de entrada (el mismo de POST/PUT),
+# llave foránea que se verifica antes de escribir y espacios de caché que se invalidan.
+# llave_manual indica que la tabla no genera la llave y cada objeto creado la trae (código del centro).
+ENTIDADES = {
+    'usuarios': {'modelo': models.Usuario, 'esquema': schemas.UsuarioCreate},
+    'centros': {'modelo': models.Centro, 'esquema': schemas.CentroCreate, 'cache': ('centros', 'sede_centro'),
+                'llave_manual': True, 'referencia': ('regionalid', 'regional', crud.get_regionalids_existentes)},
+    'sedes': {'modelo': models.Sede, 'esquema': schemas.SedeCreate, 'cache': ('sedes', 'sede_centro')},
+    'ambientes': {'modelo': models.Ambiente, 'esquema': schemas.AmbienteCreate,
+                  'referencia': ('sedeid', 'sede', crud.get_sedeids_existentes)},
+    'dispositivos': {'modelo': models.Dispositivo, 'esquema': schemas.DispositivoCreate,
+                     'referencia': ('ambienteid', 'ambiente', crud.get_ambienteids_existentes)},
+    'ocupacion': {'modelo': models.Ocupacion, 'esquema': schemas.OcupacionCreate,
+                  'referencia': ('ambienteid', 'ambiente', crud.get_ambienteids_existentes)},
+    'costos_energia': {'modelo': models.CostoEnergia, 'esquema': schemas.CostoEnergiaCreate,
+                       'referencia': ('sedeid', 'sede', crud.get_sedeids_existentes)},
+    'subestaciones': {'modelo': models.Subestacion, 'esquema': schemas.SubestacionCreate,
+                      'referencia': ('sedeid', 'sede', crud.get_sedeids_existentes)},
+}
+
+def _config(entidad):
+    config = ENTIDADES.get(entidad)
+    if config is None:
+        raise HTTPException(status_code=404, detail=f"No hay operaciones por lotes para '{entidad}'")
+    return config
+
+def _verificar_tamano(items):
+    if len(items) > LIMITE_LOTE:
+        raise HTTPException(status_code=400, detail=f"El lote supera el máximo de {LIMITE_LOTE} elementos")
+
+def _error(indice, *mensajes):
+    return {'indice': indice, 'estado': 'error', 'errores': list(mensajes)}
+
+# Convertir una llave recibida al tipo de la llave primaria (centros usa texto), como crud._actualizar.
+# Devuelve None si no es un entero ni un texto convertible.
+def _convertir_llave(llave, valor):
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        return None
+    try:
+        return llave.type.python_type(valor)
+    except ValueError:
+        return None
+
+# Validar cada objeto con el esquema de la entidad; los que no son objetos JSON se rechazan aquí
+def _validar(items, esquema, resultados):
+    objetos = []
+    for indice, item in enumerate(items):
+        if isinstance(item, dict):
+            objetos.append((indice, item))
+        else:
+            resultados[indice] = _error(indice, "Se esperaba un objeto JSON")
+    validas, errores = validar_lote(objetos, esquema)
+    for error in errores:
+        resultados[error['fila']] = _error(error['fila'], *error['errores'])
+    return validas
+
+# Descartar las filas cuya llave foránea no existe, con una sola consulta
+def _verificar_referencias(db, config, filas, resultados):
+    if 'referencia' not in config:
+        return filas
+    campo, nombre, existentes = config['referencia']
+    validos = existentes(db, {datos[campo] for _, datos in filas})
+    aceptadas = []
+    for indice, datos in filas:
+        if datos[campo] in validos:
+            aceptadas.append((indice, datos))
+        else:
+            resultados[indice] = _error(indice, f"{campo}: la {nombre} {datos[campo]} no existe")
+    return aceptadas
+
+# Rechazar correos repetidos dentro del lote o ya registrados
+def _verificar_correos(db, filas, resultados):
+    if not filas:
+        return filas
+    registrados = {
+        correo for (correo,) in db.query(models.Usuario.correo_electronico)
+        .filter(models.Usuario.correo_electronico.in_([datos['correo_electronico'] for _, datos in filas]))
+    }
+    aceptadas = []
+    for indice, datos in filas:
+        correo = datos['correo_electronico']
+        if correo in registrados:
+            resultados[indice] = _error(indice, "correo_electronico: el correo electrónico ya está registrado")
+            continue
+        registrados.add(correo)
+        aceptadas.append((indice, datos))
+    return aceptadas
+
+# Tomar de cada objeto la llave que la tabla no genera y rechazar las repetidas en el lote o ya registradas
+def _asignar_llaves(db, modelo, items, filas, resultados):
+    columna_llave = modelo.__mapper__.primary_key[0]
+    llave = columna_llave.key
+    vistos = set()
+    con_llave = []
+    for indice, datos in filas:
+        id_item = _convertir_llave(columna_llave, items[indice].get(llave))
+        if id_item is None:
+            resultados[indice] = _error(indice, f"{llave}: se requiere la llave del registro")
+        elif id_item in vistos:
+            resultados[indice] = _error(indice, f"{llave}: el registro {id_item} aparece más de una vez en el lote")
+        else:
+            vistos.add(id_item)
+            con_llave.append((indice, {**datos, llave: id_item}))
+
+    existentes = crud.get_ids_existentes(db, modelo, vistos)
+    aceptadas = []
+    for indice, datos in con_llave:
+        if datos[llave] in existentes:
+            resultados[indice] = _error(indice, f"{llave}: el registro {datos[llave]} ya existe")
+        else:
+            aceptadas.append((indice, datos))
+    return aceptadas
+
+# Rechazar centros con el mismo nombre en la misma regional, dentro del lote o ya registrados,
+# igual que crud.create_centro
+def _verificar_nombres_centros(db, filas, resultados):
+    if not filas:
+        return filas
+    registrados = {
+        (nombre, regionalid) for nombre, regionalid in db.query(models.Centro.nombre_del_centro, models.Centro.regionalid)
+        .filter(models.Centro.nombre_del_centro.in_({datos['nombre_del_centro'] for _, datos in filas}))
+    }
+    aceptadas = []
+    for indice, datos in filas:
+        clave = (datos['nombre_del_centro'], str(datos['regionalid']))
+        if clave in registrados:
+            resultados[indice] = _error(indice, "El centro con el mismo nombre ya existe en esta regional.")
+            continue
+        registrados.add(clave)
+        aceptadas.append((indice, datos))
+    return aceptadas
+
+# Escribir todas las filas (indice, datos) con una sola sentencia y confirmar una vez. Si aun así falla
+# una restricción (otra transacción escribió entre la verificación y la escritura), se repite fila por
+# fila, cada una en su SAVEPOINT, y solo se rechazan las que fallan.
+# Devuelve pares (filas escritas, resultado de escribir) para que quien llama arme las respuestas.
+def _confirmar(db, config, filas, escribir, resultados):
+    try:
+        try:
+            escritas = [(filas, escribir([datos for _, datos in filas]))]
+        except IntegrityError:
+            db.rollback()
+            escritas = []
+            for indice, datos in filas:
+                try:
+                    with db.begin_nested():
+                        escritas.append(([(indice, datos)], escribir([datos])))
+                except IntegrityError as e:
+                    resultados[indice] = _error(indice, f"No se aplicó: {str(e.orig).strip()}")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    cache.invalidar(*config.get('cache', ()))
+    return escritas
+
+def _respuesta(resultados):
+    exitosos = sum(1 for resultado in resultados if resultado['estado'] != 'error')
+    return {'exitosos': exitosos, 'fallidos': len(resultados) - exitosos, 'resultados': resultados}
+
+# Crear varias filas con un INSERT ... RETURNING de varias filas
+def crear(db, entidad, items):
+    config = _config(entidad)
+    _verificar_tamano(items)
+    modelo = config['modelo']
+    resultados = [None] * len(items)
+
+    filas = [(indice, crud.columnas_modelo(modelo, objeto.dict())) for indice, objeto in _validar(items, config['esquema'], resultados)]
+    if config.get('llave_manual'):
+        filas = _asignar_llaves(db, modelo, items, filas, resultados)
+    filas = _verificar_referencias(db, config, filas, resultados)
+    if modelo is models.Usuario:
+        filas = _verificar_correos(db, filas, resultados)
+    elif modelo is models.Centro:
+        filas = _verificar_nombres_centros(db, filas, resultados)
+
+    for escritas, ids in _confirmar(db, config, filas, lambda lote: crud.create_lote(db, modelo, lote), resultados):
+        for (indice, _), llave in zip(escritas, ids):
+            resultados[indice] = {'indice': indice, 'estado': 'creado', 'id': llave}
+    return _respuesta(resultados)
+
+# Actualizar varias filas: cada objeto trae la llave primaria y el mismo cuerpo que el PUT individual.
+# Como en crud.update_*, los campos nulos no se modifican.
+def actualizar(db, entidad, items):
+    config = _config(entidad)
+    _verificar_tamano(items)
+    modelo = config['modelo']
+    columna_llave = modelo.__mapper__.primary_key[0]
+    llave = columna_llave.key
+    resultados = [None] * len(items)
+
+    vistos = set()
+    filas = []
+    for indice, objeto in _validar(items, config['esquema'], resultados):
+        id_item = _convertir_llave(columna_llave, items[indice].get(llave))
+        if id_item is None:
+            resultados[indice] = _error(indice, f"{llave}: se requiere la llave del registro")
+        elif id_item in vistos:
+            resultados[indice] = _error(indice, f"{llave}: el registro {id_item} aparece más de una vez en el lote")
+        else:
+            vistos.add(id_item)
+            datos = {clave: valor for clave, valor in objeto.dict(exclude_unset=True).items() if valor is not None}
+            filas.append((indice, {**crud.columnas_modelo(modelo, datos), llave: id_item}))
+
+    existentes = crud.get_ids_existentes(db, modelo, {datos[llave] for _, datos in filas})
+    encontradas = []
+    for indice, datos in filas:
+        if datos[llave] in existentes:
+            encontradas.append((indice, datos))
+        else:
+            resultados[indice] = _error(indice, f"{llave}: el registro {datos[llave]} no existe")
+    filas = _verificar_referencias(db, config, encontradas, resultados)
+
+    for escritas, _ in _confirmar(db, config, filas, lambda lote: crud.update_lote(db, modelo, lote), resultados):
+        for indice, datos in escritas:
+            resultados[indice] = {'indice': indice, 'estado': 'actualizado', 'id': datos[llave]}
+    return _respuesta(resultados)
+
+# Eliminar varias filas por llave con un DELETE ... RETURNING; las que otra tabla todavía referencia
+# se rechazan antes de escribir
+def eliminar(db, entidad, ids):
+    config = _config(entidad)
+    _verificar_tamano(ids)
+    modelo = config['modelo']
+    columna_llave = modelo.__mapper__.primary_key[0]
+    resultados = [None] * len(ids)
+    vistos = set()
+    filas = []
+    for indice, id_item in enumerate(ids):
+        id_item = _convertir_llave(columna_llave, id_item)
+        if id_item is None:
+            resultados[indice] = _error(indice, f"Llave no válida: {ids[indice]!r}")
+        elif id_item in vistos:
+            resultados[indice] = _error(indice, f"El registro {id_item} aparece más de una vez en el lote")
+        else:
+            vistos.add(id_item)
+            filas.append((indice, id_item))
+
+    referenciados = crud.get_ids_referenciados(db, modelo, vistos)
+    libres = []
+    for indice, id_item in filas:
+        if id_item in referenciados:
+            resultados[indice] = _error(indice, f"El registro {id_item} todavía se usa en {referenciados[id_item]}")
+        else:
+            libres.append((indice, id_item))
+
+    for escritas, eliminados in _confirmar(db, config, libres, lambda lote: crud.delete_lote(db, modelo, lote), resultados):
+        for indice, id_item in escritas:
+            if id_item in eliminados:
+                resultados[indice] = {'indice': indice, 'estado': 'eliminado', 'id': id_item}
+            else:
+                resultados[indice] = _error(indice, f"El registro {id_item} no existe")
+    return _respuesta(resultados)
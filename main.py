@@ -1,20 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Response, Body
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
+from contextlib import asynccontextmanager
 from datetime import date
 from typing import Optional, List
 import crud
+import crud_async
+import cache
+import cargas
+import condicional
+import lotes
+import exportacion
+import kpis
+from paginacion import Paginacion
 import models, schemas
-from database import engine, get_db
+from database import engine, SessionLocal, get_db, get_async_db, estado_pools
 
 # Configuración de logging para depuración
 logging.basicConfig(level=logging.DEBUG)
 
+# Buffer de ingesta de lecturas de ocupación, compartido por todas las peticiones del proceso
+ingesta_ocupacion = cargas.BufferIngesta(
+    SessionLocal, schemas.OcupacionCreate, crud.create_ocupaciones_bulk,
+    existentes=crud.get_ambienteids_existentes, campo_referencia="ambienteid",
+)
+
+# Iniciar el vaciado por tiempo del buffer de ingesta y escribir lo pendiente al apagar
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ingesta_ocupacion.iniciar()
+    yield
+    await ingesta_ocupacion.detener()
+
 # Instancia de FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Montar directorio estático para servir archivos como HTML, CSS, JS, etc.
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -42,9 +66,10 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
     return {"message": "Login exitoso", "usuario_id": usuario.nombre}
 
 # Endpoint para obtener usuarios por tipo de usuario
-@app.get("/usuarios/tipo/{tipo_usuario}", response_model=List[schemas.Usuario])
-def read_usuarios_by_tipo(tipo_usuario: str, db: Session = Depends(get_db)):
-    return crud.get_usuarios_by_tipo(db=db, tipo_usuario=tipo_usuario)
+@app.get("/usuarios/tipo/{tipo_usuario}", response_model=schemas.Pagina[schemas.Usuario])
+async def read_usuarios_by_tipo(tipo_usuario: str, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_usuarios_by_tipo(db=db, tipo_de_usuario=tipo_usuario, limit=pag.limit, after=pag.after)
+    return pag.respuesta(filas, siguiente, schemas.Usuario)
 
 # Endpoint para obtener un usuario por correo electrónico
 @app.get("/usuarios/correo/{correo_electronico}", response_model=schemas.Usuario)
@@ -59,6 +84,16 @@ def read_usuario_by_correo(correo_electronico: str, db: Session = Depends(get_db
 def read_root():
     return {"message": "Bienvenido a la API"}
 
+# Estado de los pools de conexiones (en uso, overflow, esperas y timeouts)
+@app.get("/metricas/pool")
+def read_metricas_pool():
+    return estado_pools()
+
+# Aciertos y fallos de la caché de datos de referencia
+@app.get("/metricas/cache")
+def read_metricas_cache():
+    return cache.estadisticas()
+
 # Crear todas las tablas si no existen
 models.Base.metadata.create_all(bind=engine)
 
@@ -105,13 +140,18 @@ if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
 
 # REGIONALES
-@app.get("/regionales/", response_model=List[schemas.Regional])
-def read_regionales(db: Session = Depends(get_db)):
-    return crud.get_all_regionales(db)
+@app.get("/regionales/", response_model=schemas.Pagina[schemas.Regional])
+async def read_regionales(request: Request, response: Response, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    versiones = await condicional.leer_versiones_async(db, "regionales")
+    no_modificado = condicional.verificar(request, response, versiones)
+    if no_modificado:
+        return no_modificado
+    filas, siguiente = await crud_async.get_all_regionales(db, limit=pag.limit, after=pag.after, version=condicional.etiqueta(versiones))
+    return pag.respuesta(filas, siguiente, schemas.Regional, response)
 
 @app.get("/regionales/{regionalid}", response_model=schemas.Regional)
 def read_regional(regionalid: str, db: Session = Depends(get_db)):
-    regional = crud.get_regional(db, regionalid=regionalid)
+    regional = crud.get_regional_cacheada(db, regionalid=regionalid)
     if not regional:
         raise HTTPException(status_code=404, detail="Regional not found")
     return regional
@@ -135,7 +175,7 @@ def delete_regional(regionalid: int, db: Session = Depends(get_db)):
 # CENTROS
 @app.get("/centros/{centroid}", response_model=schemas.Centro)
 def read_centro(centroid: int, db: Session = Depends(get_db)):
-    centro = crud.get_centro(db, centroid=centroid)
+    centro = crud.get_centro_cacheado(db, centroid=centroid)
     if centro is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Centro not found")
     return centro
@@ -158,8 +198,12 @@ def delete_centro(centroid: int, db: Session = Depends(get_db)):
 
 # SEDES
 @app.get("/sedes/{sedeid}", response_model=schemas.Sede)
-def read_sede(sedeid: int, db: Session = Depends(get_db)):
-    sede = crud.get_sede(db, sedeid=sedeid)
+def read_sede(sedeid: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    versiones = condicional.leer_versiones(db, "sedes")
+    no_modificado = condicional.verificar(request, response, versiones)
+    if no_modificado:
+        return no_modificado
+    sede = crud.get_sede_cacheada(db, sedeid=sedeid, version=condicional.etiqueta(versiones))
     if sede is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sede not found")
     return sede
@@ -252,6 +296,49 @@ def delete_ocupacion(ocupacionid: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ocupacion not found")
     return {"detail": "Ocupacion deleted"}
 
+# Ingesta por lotes de lecturas de ocupación enviadas como arreglo JSON. Las lecturas se juntan con
+# las de otras peticiones en el buffer compartido; la respuesta llega cuando están escritas (a lo sumo
+# INTERVALO_VACIADO segundos) e informa por lectura las rechazadas, incluidas las de una tanda que no
+# se pudo escribir.
+@app.post("/ocupacion/ingesta", response_model=schemas.ResultadoIngesta)
+async def ingerir_ocupacion(lecturas: list = Body(...)):
+    lote = cargas.LoteIngesta(ingesta_ocupacion)
+    for numero, lectura in enumerate(lecturas, start=1):
+        lote.agregar(numero, lectura)
+    return await lote.resultado()
+
+# Ingesta de lecturas de ocupación como flujo NDJSON (una lectura JSON por línea)
+@app.post("/ocupacion/ingesta/ndjson", response_model=schemas.ResultadoIngesta)
+async def ingerir_ocupacion_ndjson(request: Request):
+    lote = cargas.LoteIngesta(ingesta_ocupacion)
+    numero = 0
+    resto = b""
+    async for fragmento in request.stream():
+        lineas = (resto + fragmento).split(b"\n")
+        resto = lineas.pop()
+        for linea in lineas:
+            numero += 1
+            if linea.strip():
+                lote.agregar_linea(numero, linea)
+    if resto.strip():
+        numero += 1
+        lote.agregar_linea(numero, resto)
+    return await lote.resultado()
+
+# OPERACIONES POR LOTES
+# Entidades: usuarios, centros, sedes, ambientes, dispositivos, ocupacion, costos_energia, subestaciones
+@app.post("/lote/{entidad}", response_model=schemas.ResultadoLote)
+def crear_lote(entidad: str, items: list = Body(...), db: Session = Depends(get_db)):
+    return lotes.crear(db, entidad, items)
+
+@app.put("/lote/{entidad}", response_model=schemas.ResultadoLote)
+def actualizar_lote(entidad: str, items: list = Body(...), db: Session = Depends(get_db)):
+    return lotes.actualizar(db, entidad, items)
+
+@app.post("/lote/{entidad}/eliminar", response_model=schemas.ResultadoLote)
+def eliminar_lote(entidad: str, ids: list = Body(...), db: Session = Depends(get_db)):
+    return lotes.eliminar(db, entidad, ids)
+
 # COSTOS_ENERGIA
 @app.get("/costos_energia/{costoid}", response_model=schemas.CostoEnergia)
 def read_costo_energia(costoid: int, db: Session = Depends(get_db)):
@@ -276,6 +363,46 @@ def delete_costo_energia(costoid: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="CostoEnergia not found")
     return {"detail": "CostoEnergia deleted"}
 
+# Carga masiva de facturas de energía desde un archivo CSV o XLSX
+@app.post("/costos_energia/carga", response_model=schemas.ResultadoCarga)
+def cargar_costos_energia(archivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    nombre = (archivo.filename or '').lower()
+    if not nombre.endswith(('.csv', '.xlsx')):
+        raise HTTPException(status_code=400, detail="El archivo debe ser .csv o .xlsx")
+    return cargas.importar_costos_energia(db, archivo.file, nombre)
+
+# Indicadores de intensidad energética (kWh por aprendiz y por administrativo, costo por kWh)
+# de todas las sedes, con su percentil entre las sedes del mismo mes
+@app.get("/kpis/energia", response_model=List[schemas.KpiEnergia])
+def read_kpis_energia(ano: Optional[int] = None, mes: Optional[int] = None, sedeid: Optional[int] = None,
+                      orden: Optional[str] = None, limite: Optional[int] = None, db: Session = Depends(get_db)):
+    return kpis.consultar(db, ano=ano, mes=mes, sedeid=sedeid, orden=orden, limite=limite)
+
+# Resultados del análisis de factor de potencia (python factor_potencia.py)
+@app.get("/factor_potencia/sedes", response_model=List[schemas.FactorPotenciaSede])
+def read_sedes_por_factor_potencia(estado: str = 'critico', limite: int = 100, db: Session = Depends(get_db)):
+    return crud.get_sedes_por_factor_potencia(db=db, estado=estado, limite=limite)
+
+@app.get("/factor_potencia/sede/{sedeid}", response_model=schemas.FactorPotenciaSede)
+def read_factor_potencia_sede(sedeid: int, db: Session = Depends(get_db)):
+    resultado = crud.get_factor_potencia_sede(db=db, sedeid=sedeid)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="No hay análisis de factor de potencia para esta sede.")
+    return resultado
+
+@app.get("/factor_potencia/sede/{sedeid}/facturas", response_model=List[schemas.FactorPotenciaFactura])
+def read_facturas_factor_potencia(sedeid: int, db: Session = Depends(get_db)):
+    return crud.get_facturas_factor_potencia(db=db, sedeid=sedeid)
+
+# Facturas marcadas por la detección de anomalías (python anomalias.py)
+@app.get("/anomalias/facturas", response_model=List[schemas.AnomaliaFactura])
+def read_anomalias_recientes(limite: int = 100, db: Session = Depends(get_db)):
+    return crud.get_anomalias_recientes(db=db, limite=limite)
+
+@app.get("/anomalias/sede/{sedeid}", response_model=List[schemas.AnomaliaFactura])
+def read_anomalias_sede(sedeid: int, db: Session = Depends(get_db)):
+    return crud.get_anomalias_sede(db=db, sedeid=sedeid)
+
 # SUBESTACIONES
 @app.get("/subestaciones/{subestacionid}", response_model=schemas.Subestacion)
 def read_subestacion(subestacionid: int, db: Session = Depends(get_db)):
@@ -302,9 +429,10 @@ def delete_subestacion(subestacionid: int, db: Session = Depends(get_db)):
 
 #****************************************ENDPOINTs CONSULTAS*****************************************************************
 # Endpoint para obtener usuarios por tipo de usuario
-@app.get("/usuarios/tipo/{tipo_usuario}", response_model=List[schemas.Usuario])
-def read_usuarios_by_tipo(tipo_usuario: str, db: Session = Depends(get_db)):
-    return crud.get_usuarios_by_tipo(db=db, tipo_usuario=tipo_usuario)
+@app.get("/usuarios/tipo/{tipo_usuario}", response_model=schemas.Pagina[schemas.Usuario])
+async def read_usuarios_by_tipo(tipo_usuario: str, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_usuarios_by_tipo(db=db, tipo_de_usuario=tipo_usuario, limit=pag.limit, after=pag.after)
+    return pag.respuesta(filas, siguiente, schemas.Usuario)
 
 # Endpoint para obtener un usuario por correo electrónico
 @app.get("/usuarios/correo/{correo_electronico}", response_model=schemas.Usuario)
@@ -335,73 +463,78 @@ def consulta_correo_y_tipo(
     }
 
 # Endpoint para obtener centros por región
-@app.get("/centros/regional/{regionalid}", response_model=List[schemas.Centro])
-def read_centros_by_region(regionalid: int, db: Session = Depends(get_db)):
-    return crud.get_centros_by_region(db=db, regionalid=regionalid)
+@app.get("/centros/regional/{regionalid}", response_model=schemas.Pagina[schemas.Centro])
+async def read_centros_by_region(regionalid: int, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_centros_by_region(db=db, regionalid=regionalid, limit=pag.limit, after=pag.after)
+    return pag.respuesta(filas, siguiente, schemas.Centro)
 
 # Endpoint para obtener sedes por centro
-@app.get("/sedes/centro/{centro_id}", response_model=List[schemas.Sede])
-def read_sedes_by_centro(centro_id: int, db: Session = Depends(get_db)):
-    sedes = crud.get_sedes_by_centro(db=db, centroid=centroid) # type: ignore
-    if not sedes:
+@app.get("/sedes/centro/{centro_id}", response_model=schemas.Pagina[schemas.Sede])
+async def read_sedes_by_centro(centro_id: int, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_sedes_by_centro(db=db, centroid=centro_id, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No se encontraron sedes para este centro.")
-    return sedes
+    return pag.respuesta(filas, siguiente, schemas.Sede)
 
 # Endpoint para obtener ambientes por sede
-@app.get("/ambientes/sede/{sedeid}", response_model=List[schemas.Ambiente])
-def read_ambientes_by_sede(sedeid: int, db: Session = Depends(get_db)):
-    ambientes = crud.get_ambientes_by_sede(db=db, sedeid=sedeid)
-    if not ambientes:
+@app.get("/ambientes/sede/{sedeid}", response_model=schemas.Pagina[schemas.Ambiente])
+async def read_ambientes_by_sede(sedeid: int, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_ambientes_by_sede(db=db, sedeid=sedeid, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron ambientes para esta sede.")
-    return ambientes
+    return pag.respuesta(filas, siguiente, schemas.Ambiente)
 
 # Endpoint para obtener dispositivos por ambiente
-@app.get("/dispositivos/ambiente/{ambienteid}", response_model=List[schemas.Dispositivo])
-def read_dispositivos_by_ambiente(ambienteid: int, db: Session = Depends(get_db)):
-    dispositivos = crud.get_dispositivos_by_ambiente(db=db, ambienteid=ambienteid)
-    if not dispositivos:
+@app.get("/dispositivos/ambiente/{ambienteid}", response_model=schemas.Pagina[schemas.Dispositivo])
+async def read_dispositivos_by_ambiente(ambienteid: int, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_dispositivos_by_ambiente(db=db, ambienteid=ambienteid, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron dispositivos para este ambiente.")
-    return dispositivos
+    return pag.respuesta(filas, siguiente, schemas.Dispositivo)
 
 # Endpoint para obtener consumo energético por fecha
-@app.get("/consumo/energia/{sedeid}", response_model=List[schemas.CostoEnergia])
-def read_consumo_energetico_por_fecha(sedeid: int, fecha_inicio: date, fecha_fin: date, db: Session = Depends(get_db)):
-    consumo = crud.get_consumo_energetico_por_fecha(db=db, sedeid=sedeid, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
-    if not consumo:
+@app.get("/consumo/energia/{sedeid}", response_model=schemas.Pagina[schemas.CostoEnergia])
+async def read_consumo_energetico_por_fecha(sedeid: int, fecha_inicio: date, fecha_fin: date, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_consumo_energetico_por_fecha(db=db, sedeid=sedeid, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontró consumo energético en el rango de fechas proporcionado.")
-    return consumo
+    return pag.respuesta(filas, siguiente, schemas.CostoEnergia)
 
 # Endpoint para obtener costos de energía por año y mes
-@app.get("/costos/energia/{sedeid}/{ano}/{mes}", response_model=List[schemas.CostoEnergia])
-def read_costos_energia_por_ano_mes(sedeid: int, ano: int, mes: int, db: Session = Depends(get_db)):
-    costos = crud.get_costos_energia_por_ano_mes(db=db, sedeid=sedeid, ano=ano, mes=mes)
-    if not costos:
+@app.get("/costos/energia/{sedeid}/{ano}/{mes}", response_model=schemas.Pagina[schemas.CostoEnergia])
+async def read_costos_energia_por_ano_mes(sedeid: int, ano: int, mes: int, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_costos_energia_por_ano_mes(db=db, sedeid=sedeid, ano=ano, mes=mes, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron costos de energía para el año y mes proporcionados.")
-    return costos
+    return pag.respuesta(filas, siguiente, schemas.CostoEnergia)
 
 # Endpoint para obtener ocupación por ambiente y fecha
-@app.get("/ocupacion/ambiente/{ambienteid}/{fecha}", response_model=List[schemas.Ocupacion])
-def read_ocupacion_por_ambiente_y_fecha(ambienteid: int, fecha: date, db: Session = Depends(get_db)):
-    ocupacion = crud.get_ocupacion_por_ambiente_y_fecha(db=db, ambienteid=ambienteid, fecha=fecha)
-    if not ocupacion:
+@app.get("/ocupacion/ambiente/{ambienteid}/{fecha}", response_model=schemas.Pagina[schemas.Ocupacion])
+async def read_ocupacion_por_ambiente_y_fecha(ambienteid: int, fecha: date, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_ocupacion_por_ambiente_y_fecha(db=db, ambienteid=ambienteid, fecha=fecha, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontró ocupación para el ambiente y fecha proporcionados.")
-    return ocupacion
+    return pag.respuesta(filas, siguiente, schemas.Ocupacion)
 
 # Endpoint para obtener subestaciones por sede
-@app.get("/subestaciones/sede/{sedeid}", response_model=List[schemas.Subestacion])
-def read_subestaciones_por_sede(sedeid: int, db: Session = Depends(get_db)):
-    subestaciones = crud.get_subestaciones_por_sede(db=db, sedeid=sedeid)
-    if not subestaciones:
+@app.get("/subestaciones/sede/{sedeid}", response_model=schemas.Pagina[schemas.Subestacion])
+async def read_subestaciones_por_sede(sedeid: int, request: Request, response: Response, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    versiones = await condicional.leer_versiones_async(db, "subestaciones")
+    no_modificado = condicional.verificar(request, response, versiones)
+    if no_modificado:
+        return no_modificado
+    filas, siguiente = await crud_async.get_subestaciones_por_sede(db=db, sedeid=sedeid, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron subestaciones para esta sede.")
-    return subestaciones
+    return pag.respuesta(filas, siguiente, schemas.Subestacion, response)
 
 # Endpoint para obtener centros por ciudad
-@app.get("/centros/ciudad/{ciudad}", response_model=List[schemas.Centro])
-def read_centros_por_ciudad(ciudad: str, db: Session = Depends(get_db)):
-    centros = crud.get_centros_por_ciudad(db=db, ciudad=ciudad)
-    if not centros:
+@app.get("/centros/ciudad/{ciudad}", response_model=schemas.Pagina[schemas.Centro])
+async def read_centros_por_ciudad(ciudad: str, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_centros_por_ciudad(db=db, ciudad=ciudad, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron centros para la ciudad proporcionada.")
-    return centros
+    return pag.respuesta(filas, siguiente, schemas.Centro)
 
 # Endpoint para obtener resumen de consumo total por región
 @app.get("/resumen/consumo/region/{regionalid}", response_model=schemas.ResumenConsumo)
@@ -411,21 +544,26 @@ def read_resumen_consumo_total_por_region(regionalid: int, db: Session = Depends
         raise HTTPException(status_code=404, detail="No se encontró resumen de consumo para esta región.")
     return resumen
 
+# Endpoint para obtener el consumo mes a mes de una sede, centro, regional o del país (nivel 'nacional')
+@app.get("/energia/mensual/{nivel}", response_model=List[schemas.RollupEnergiaMensual])
+def read_rollup_energia_mensual(nivel: str, id: Optional[str] = None, ano_inicio: Optional[int] = None, ano_fin: Optional[int] = None, db: Session = Depends(get_db)):
+    return crud.get_rollup_energia_mensual(db=db, nivel=nivel, id=id, ano_inicio=ano_inicio, ano_fin=ano_fin)
+
 # Endpoint para obtener ambientes por tipo de circuito
-@app.get("/ambientes/tipo/{tipo_circuito}", response_model=List[schemas.Ambiente])
-def read_ambientes_por_tipo_de_circuito(tipo_circuito: str, db: Session = Depends(get_db)):
-    ambientes = crud.get_ambientes_por_tipo_de_circuito(db=db, tipo_circuito=tipo_circuito)
-    if not ambientes:
+@app.get("/ambientes/tipo/{tipo_circuito}", response_model=schemas.Pagina[schemas.Ambiente])
+async def read_ambientes_por_tipo_de_circuito(tipo_circuito: str, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_ambientes_por_tipo_de_circuito(db=db, tipo_de_circuito=tipo_circuito, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron ambientes para el tipo de circuito proporcionado.")
-    return ambientes
+    return pag.respuesta(filas, siguiente, schemas.Ambiente)
 
 # Endpoint para obtener dispositivos por fecha de instalación
-@app.get("/dispositivos/fecha", response_model=List[schemas.Dispositivo])
-def read_dispositivos_por_fecha_instalacion(fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None, db: Session = Depends(get_db)):
-    dispositivos = crud.get_dispositivos_por_fecha_instalacion(db=db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
-    if not dispositivos:
+@app.get("/dispositivos/fecha", response_model=schemas.Pagina[schemas.Dispositivo])
+async def read_dispositivos_por_fecha_instalacion(fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.get_dispositivos_por_fecha_instalacion(db=db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron dispositivos en el rango de fechas proporcionado.")
-    return dispositivos
+    return pag.respuesta(filas, siguiente, schemas.Dispositivo)
 
 # Endpoint para obtener ocupación promedio
 @app.get("/ocupacion/promedio/{ambienteid}", response_model=float)
@@ -435,18 +573,47 @@ def read_ocupacion_promedio(ambienteid: int, fecha_inicio: date, fecha_fin: date
         raise HTTPException(status_code=404, detail="No se encontró ocupación promedio para el ambiente en el rango de fechas proporcionado.")
     return ocupacion_promedio
 
+# Endpoint para obtener la serie diaria o semanal de ocupación de un ambiente o una sede
+@app.get("/ocupacion/serie/{nivel}/{id}", response_model=List[schemas.BucketOcupacion])
+def read_serie_ocupacion(nivel: str, id: int, fecha_inicio: date, fecha_fin: date, periodo: str = 'dia', db: Session = Depends(get_db)):
+    return crud.get_serie_ocupacion(db=db, nivel=nivel, id=id, periodo=periodo, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+
+# Endpoint para obtener los totales de ocupación de un ambiente o una sede en un rango de fechas
+@app.get("/ocupacion/resumen/{nivel}/{id}", response_model=schemas.ResumenOcupacion)
+def read_resumen_ocupacion(nivel: str, id: int, fecha_inicio: date, fecha_fin: date, db: Session = Depends(get_db)):
+    return crud.get_resumen_ocupacion(db=db, nivel=nivel, id=id, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+
 # Endpoint para obtener dispositivos de alto consumo
-@app.get("/dispositivos/alto_consumo/{ambienteid}", response_model=List[schemas.Dispositivo])
-def read_dispositivos_alto_consumo(ambienteid: int, consumo_minimo: float, db: Session = Depends(get_db)):
-    dispositivos = crud.obtener_dispositivos_alto_consumo(db=db, ambienteid=ambienteid, consumo_minimo=consumo_minimo)
-    if not dispositivos:
+@app.get("/dispositivos/alto_consumo/{ambienteid}", response_model=schemas.Pagina[schemas.Dispositivo])
+async def read_dispositivos_alto_consumo(ambienteid: int, consumo_minimo: float, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.obtener_dispositivos_alto_consumo(db=db, ambienteid=ambienteid, consumo_minimo=consumo_minimo, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron dispositivos con alto consumo para el ambiente proporcionado.")
-    return dispositivos
+    return pag.respuesta(filas, siguiente, schemas.Dispositivo)
 
 # Endpoint para obtener subestaciones por nivel de tensión
-@app.get("/subestaciones/nivel_tension/{nivel_tension_kva}", response_model=List[schemas.Subestacion])
-def read_subestaciones_por_nivel_tension(nivel_tension_kva: float, db: Session = Depends(get_db)):
-    subestaciones = crud.obtener_subestaciones_por_nivel_tension(db=db, nivel_tension_kva=nivel_tension_kva)
-    if not subestaciones:
+@app.get("/subestaciones/nivel_tension/{nivel_tension_kva}", response_model=schemas.Pagina[schemas.Subestacion])
+async def read_subestaciones_por_nivel_tension(nivel_tension_kva: float, pag: Paginacion = Depends(), db: AsyncSession = Depends(get_async_db)):
+    filas, siguiente = await crud_async.obtener_subestaciones_por_nivel_tension(db=db, nivel_tension_kva=nivel_tension_kva, limit=pag.limit, after=pag.after)
+    if not filas and pag.primera_pagina:
         raise HTTPException(status_code=404, detail="No se encontraron subestaciones para el nivel de tensión proporcionado.")
-    return subestaciones
+    return pag.respuesta(filas, siguiente, schemas.Subestacion)
+
+# Exportación en streaming (NDJSON o CSV) de costos_energia, ocupacion y dispositivos
+@app.get("/exportar/{entidad}")
+def exportar(
+    entidad: str,
+    formato: str = "ndjson",
+    sedeid: Optional[int] = None,
+    ambienteid: Optional[int] = None,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+):
+    if formato not in exportacion.FORMATOS:
+        raise HTTPException(status_code=400, detail="Formato no soportado, use ndjson o csv")
+    consulta, columnas = exportacion.consulta_exportacion(entidad, sedeid, ambienteid, fecha_inicio, fecha_fin)
+    return StreamingResponse(
+        exportacion.generar(formato, consulta, columnas),
+        media_type=exportacion.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{entidad}.{formato}"'},
+    )
@@ -0,0 +1,23 @@
+-- Índices para los filtros de las consultas de crud.py en bases ya existentes.
+-- CREATE INDEX CONCURRENTLY no bloquea las escrituras sobre la tabla mientras se construye el índice,
+-- pero no puede correr dentro de una transacción: ejecutar con psql sin la opción -1 / --single-transaction.
+-- Si una construcción falla, el índice queda marcado INVALID y IF NOT EXISTS lo omitiría al reintentar:
+-- borrarlo antes con DROP INDEX CONCURRENTLY <nombre>; (ver la consulta de verificación al final).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_centros_regionalid ON centros (regionalid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sede_centro_centroid ON sede_centro (centroid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ambientes_sedeid ON ambientes (sedeid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ambientes_tipo_de_circuito ON ambientes (tipo_de_circuito);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_dispositivos_ambienteid_consumo ON dispositivos (ambienteid, consumo_energetico);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_dispositivos_fecha_de_instalacion ON dispositivos (fecha_de_instalacion);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ocupacion_ambienteid_fecha ON ocupacion (ambienteid, fecha);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_costos_energia_sedeid_ano_mes ON costos_energia (sedeid, ano, mes);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_costos_energia_sedeid_fecha_inicio ON costos_energia (sedeid, fecha_inicio_factura);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_subestaciones_sedeid ON subestaciones (sedeid);
+
+ANALYZE centros, sede_centro, ambientes, dispositivos, ocupacion, costos_energia, subestaciones;
+
+-- Verificación: no debe devolver filas
+SELECT c.relname AS indice_invalido
+FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+WHERE NOT i.indisvalid AND c.relname LIKE 'ix\_%';
@@ -0,0 +1,6 @@
+-- Columnas que models.py ya mapea y que faltaban en init.sql: sin ellas cualquier consulta ORM
+-- sobre centros o dispositivos falla con "column does not exist".
+-- Son columnas nulas sin valor por defecto, así que ADD COLUMN no reescribe la tabla.
+
+ALTER TABLE centros ADD COLUMN IF NOT EXISTS usuario_id INT REFERENCES usuarios (userid);
+ALTER TABLE dispositivos ADD COLUMN IF NOT EXISTS usuario_id INT REFERENCES usuarios (userid);
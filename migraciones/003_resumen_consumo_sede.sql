@@ -0,0 +1,83 @@
+-- Tabla resumen de consumo por sede y sus triggers sobre costos_energia. Es la única copia de este SQL:
+-- init.sql la incluye y models.py la ejecuta cuando create_all crea la tabla; en bases ya existentes
+-- se aplica con psql. Todo corre en una transacción: el LOCK impide escrituras en costos_energia entre
+-- el recálculo y la creación de los triggers (las lecturas siguen). Volver a ejecutarla recalcula el
+-- resumen desde cero. Las facturas sin sede (sedeid es opcional en costos_energia) no se resumen.
+-- cambio toma un valor nuevo de la secuencia cada vez que el trigger toca la fila: con la suma de
+-- cambio y el número de filas, kpis.py sabe si cambió alguna factura sin leer costos_energia.
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS resumen_consumo_sede_cambio_seq;
+
+CREATE TABLE IF NOT EXISTS resumen_consumo_sede (
+    sedeid INT PRIMARY KEY,
+    total_consumo_kw FLOAT NOT NULL,
+    total_consumo_qvarh FLOAT NOT NULL,
+    total_valor_factura FLOAT NOT NULL,
+    facturas INT NOT NULL,
+    cambio BIGINT NOT NULL DEFAULT nextval('resumen_consumo_sede_cambio_seq'),
+    FOREIGN KEY (sedeid) REFERENCES sedes (sedeid) ON DELETE CASCADE
+);
+ALTER TABLE resumen_consumo_sede
+    ADD COLUMN IF NOT EXISTS cambio BIGINT NOT NULL DEFAULT nextval('resumen_consumo_sede_cambio_seq');
+
+LOCK TABLE costos_energia IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE OR REPLACE FUNCTION actualizar_resumen_consumo_sede() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO resumen_consumo_sede AS r (sedeid, total_consumo_kw, total_consumo_qvarh, total_valor_factura, facturas)
+        SELECT sedeid, COALESCE(SUM(consumo_pkwh), 0), COALESCE(SUM(consumo_qvarh), 0), COALESCE(SUM(valor_factura), 0), COUNT(*)
+        FROM nuevas WHERE sedeid IS NOT NULL GROUP BY sedeid ORDER BY sedeid
+        ON CONFLICT (sedeid) DO UPDATE SET
+            total_consumo_kw = r.total_consumo_kw + EXCLUDED.total_consumo_kw,
+            total_consumo_qvarh = r.total_consumo_qvarh + EXCLUDED.total_consumo_qvarh,
+            total_valor_factura = r.total_valor_factura + EXCLUDED.total_valor_factura,
+            facturas = r.facturas + EXCLUDED.facturas,
+            cambio = nextval('resumen_consumo_sede_cambio_seq');
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE resumen_consumo_sede AS r SET
+            total_consumo_kw = r.total_consumo_kw - v.kw,
+            total_consumo_qvarh = r.total_consumo_qvarh - v.qvarh,
+            total_valor_factura = r.total_valor_factura - v.valor,
+            facturas = r.facturas - v.facturas,
+            cambio = nextval('resumen_consumo_sede_cambio_seq')
+        FROM (SELECT sedeid, COALESCE(SUM(consumo_pkwh), 0) AS kw, COALESCE(SUM(consumo_qvarh), 0) AS qvarh,
+                     COALESCE(SUM(valor_factura), 0) AS valor, COUNT(*) AS facturas
+              FROM viejas WHERE sedeid IS NOT NULL GROUP BY sedeid) AS v
+        WHERE r.sedeid = v.sedeid;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION vaciar_resumen_consumo_sede() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM resumen_consumo_sede;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS resumen_consumo_sede_insert ON costos_energia;
+DROP TRIGGER IF EXISTS resumen_consumo_sede_update ON costos_energia;
+DROP TRIGGER IF EXISTS resumen_consumo_sede_delete ON costos_energia;
+DROP TRIGGER IF EXISTS resumen_consumo_sede_truncate ON costos_energia;
+CREATE TRIGGER resumen_consumo_sede_insert AFTER INSERT ON costos_energia
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION actualizar_resumen_consumo_sede();
+CREATE TRIGGER resumen_consumo_sede_update AFTER UPDATE ON costos_energia
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION actualizar_resumen_consumo_sede();
+CREATE TRIGGER resumen_consumo_sede_delete AFTER DELETE ON costos_energia
+    REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION actualizar_resumen_consumo_sede();
+CREATE TRIGGER resumen_consumo_sede_truncate AFTER TRUNCATE ON costos_energia
+    FOR EACH STATEMENT EXECUTE FUNCTION vaciar_resumen_consumo_sede();
+
+DELETE FROM resumen_consumo_sede;
+INSERT INTO resumen_consumo_sede (sedeid, total_consumo_kw, total_consumo_qvarh, total_valor_factura, facturas)
+SELECT sedeid, COALESCE(SUM(consumo_pkwh), 0), COALESCE(SUM(consumo_qvarh), 0), COALESCE(SUM(valor_factura), 0), COUNT(*)
+FROM costos_energia WHERE sedeid IS NOT NULL GROUP BY sedeid;
+
+COMMIT;
+
+ANALYZE resumen_consumo_sede;
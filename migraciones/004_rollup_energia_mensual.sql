@@ -0,0 +1,221 @@
+-- Tabla rollup_energia_mensual y sus triggers. Es la única copia de este SQL: init.sql la incluye y
+-- models.py la ejecuta cuando create_all crea la tabla; en bases ya existentes se aplica con psql.
+-- Todo corre en una transacción: los LOCK impiden escrituras en costos_energia, sede_centro y centros
+-- entre el recálculo y la creación de los triggers (las lecturas siguen). Volver a ejecutarla
+-- recalcula la tabla desde cero (y borra las filas del nivel nacional que guardaban versiones anteriores).
+-- Las facturas sin sede no se agregan.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS rollup_energia_mensual (
+    nivel VARCHAR(10),
+    id VARCHAR(50),
+    ano INT,
+    mes INT,
+    consumo_pkwh FLOAT NOT NULL,
+    consumo_qvarh FLOAT NOT NULL,
+    valor_factura FLOAT NOT NULL,
+    cantidad_aprendices INT NOT NULL,
+    cantidad_administrativos INT NOT NULL,
+    facturas INT NOT NULL,
+    PRIMARY KEY (nivel, id, ano, mes)
+);
+
+LOCK TABLE costos_energia, sede_centro, centros IN SHARE ROW EXCLUSIVE MODE;
+
+-- Las sumas se aplican como diferencia de la sentencia. La población de una sede en un mes es el
+-- máximo de sus facturas (como en kpis.py) y no se puede restar: después de aplicar las sumas, que
+-- bloquean las filas tocadas, se recalcula desde costos_energia para cada sede y mes tocados y la
+-- diferencia con lo guardado se aplica a la sede, sus centros y sus regionales. El nivel nacional
+-- no se guarda (una sola fila serializaría todas las escrituras de facturas); se suma al leer.
+CREATE OR REPLACE FUNCTION aplicar_rollup_energia() RETURNS trigger AS $$
+DECLARE
+    cambios TEXT;
+BEGIN
+    cambios := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT 1 AS signo, * FROM nuevas'
+        WHEN 'DELETE' THEN 'SELECT -1 AS signo, * FROM viejas'
+        ELSE 'SELECT 1 AS signo, * FROM nuevas UNION ALL SELECT -1, * FROM viejas'
+    END;
+    EXECUTE $sql$
+        WITH c AS (
+            SELECT signo, sedeid,
+                   COALESCE(ano, EXTRACT(YEAR FROM fecha_inicio_factura)::INT) AS ano,
+                   COALESCE(mes, EXTRACT(MONTH FROM fecha_inicio_factura)::INT) AS mes,
+                   consumo_pkwh, consumo_qvarh, valor_factura
+            FROM ($sql$ || cambios || $sql$) t
+        ), d AS (
+            SELECT sedeid, ano, mes,
+                   SUM(signo * COALESCE(consumo_pkwh, 0)) AS consumo_pkwh,
+                   SUM(signo * COALESCE(consumo_qvarh, 0)) AS consumo_qvarh,
+                   SUM(signo * COALESCE(valor_factura, 0)) AS valor_factura,
+                   SUM(signo) AS facturas
+            FROM c
+            WHERE sedeid IS NOT NULL AND ano IS NOT NULL AND mes IS NOT NULL
+            GROUP BY 1, 2, 3
+        ), niveles AS (
+            SELECT 'sede' AS nivel, d.sedeid::TEXT AS id, d.* FROM d
+            UNION ALL
+            SELECT 'centro', sc.centroid, d.* FROM d JOIN sede_centro sc ON sc.sedeid = d.sedeid
+            UNION ALL
+            SELECT 'regional', x.regionalid, d.* FROM d
+            JOIN (SELECT DISTINCT sc.sedeid, c.regionalid FROM sede_centro sc JOIN centros c ON c.centroid = sc.centroid) x
+              ON x.sedeid = d.sedeid
+        )
+        INSERT INTO rollup_energia_mensual AS r (nivel, id, ano, mes, consumo_pkwh, consumo_qvarh, valor_factura,
+                                                 cantidad_aprendices, cantidad_administrativos, facturas)
+        SELECT nivel, id, ano, mes, SUM(consumo_pkwh), SUM(consumo_qvarh), SUM(valor_factura), 0, 0, SUM(facturas)
+        FROM niveles
+        GROUP BY nivel, id, ano, mes
+        ORDER BY nivel, id, ano, mes
+        ON CONFLICT (nivel, id, ano, mes) DO UPDATE SET
+            consumo_pkwh = r.consumo_pkwh + EXCLUDED.consumo_pkwh,
+            consumo_qvarh = r.consumo_qvarh + EXCLUDED.consumo_qvarh,
+            valor_factura = r.valor_factura + EXCLUDED.valor_factura,
+            facturas = r.facturas + EXCLUDED.facturas
+    $sql$;
+    -- Nueva sentencia, nueva instantánea: ya ve las facturas de las transacciones que tenían estas filas
+    EXECUTE $sql$
+        WITH k AS (
+            SELECT DISTINCT sedeid,
+                   COALESCE(ano, EXTRACT(YEAR FROM fecha_inicio_factura)::INT) AS ano,
+                   COALESCE(mes, EXTRACT(MONTH FROM fecha_inicio_factura)::INT) AS mes
+            FROM ($sql$ || cambios || $sql$) t
+        ), d AS (
+            SELECT k.sedeid, k.ano, k.mes,
+                   COALESCE(m.cantidad_aprendices, 0) - s.cantidad_aprendices AS cantidad_aprendices,
+                   COALESCE(m.cantidad_administrativos, 0) - s.cantidad_administrativos AS cantidad_administrativos
+            FROM k
+            JOIN rollup_energia_mensual s ON s.nivel = 'sede' AND s.id = k.sedeid::TEXT AND s.ano = k.ano AND s.mes = k.mes
+            CROSS JOIN LATERAL (
+                SELECT MAX(ce.cantidad_aprendices) AS cantidad_aprendices,
+                       MAX(ce.cantidad_administrativos) AS cantidad_administrativos
+                FROM costos_energia ce
+                WHERE ce.sedeid = k.sedeid
+                  AND COALESCE(ce.ano, EXTRACT(YEAR FROM ce.fecha_inicio_factura)::INT) = k.ano
+                  AND COALESCE(ce.mes, EXTRACT(MONTH FROM ce.fecha_inicio_factura)::INT) = k.mes
+            ) m
+        ), niveles AS (
+            SELECT 'sede' AS nivel, d.sedeid::TEXT AS id, d.* FROM d
+            UNION ALL
+            SELECT 'centro', sc.centroid, d.* FROM d JOIN sede_centro sc ON sc.sedeid = d.sedeid
+            UNION ALL
+            SELECT 'regional', x.regionalid, d.* FROM d
+            JOIN (SELECT DISTINCT sc.sedeid, c.regionalid FROM sede_centro sc JOIN centros c ON c.centroid = sc.centroid) x
+              ON x.sedeid = d.sedeid
+        )
+        UPDATE rollup_energia_mensual r
+        SET cantidad_aprendices = r.cantidad_aprendices + n.cantidad_aprendices,
+            cantidad_administrativos = r.cantidad_administrativos + n.cantidad_administrativos
+        FROM (SELECT nivel, id, ano, mes, SUM(cantidad_aprendices) AS cantidad_aprendices,
+                     SUM(cantidad_administrativos) AS cantidad_administrativos
+              FROM niveles GROUP BY nivel, id, ano, mes) n
+        WHERE r.nivel = n.nivel AND r.id = n.id AND r.ano = n.ano AND r.mes = n.mes
+          AND (n.cantidad_aprendices <> 0 OR n.cantidad_administrativos <> 0)
+    $sql$;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION recalcular_rollup_energia(p_nivel TEXT, p_ids TEXT[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM rollup_energia_mensual WHERE nivel = p_nivel AND id = ANY (p_ids);
+    INSERT INTO rollup_energia_mensual (nivel, id, ano, mes, consumo_pkwh, consumo_qvarh, valor_factura,
+                                        cantidad_aprendices, cantidad_administrativos, facturas)
+    SELECT p_nivel, x.id, s.ano, s.mes, SUM(s.consumo_pkwh), SUM(s.consumo_qvarh), SUM(s.valor_factura),
+           SUM(s.cantidad_aprendices), SUM(s.cantidad_administrativos), SUM(s.facturas)
+    FROM (
+        SELECT sc.centroid AS id, sc.sedeid FROM sede_centro sc
+        WHERE p_nivel = 'centro' AND sc.centroid = ANY (p_ids)
+        UNION
+        SELECT c.regionalid, sc.sedeid FROM centros c JOIN sede_centro sc ON sc.centroid = c.centroid
+        WHERE p_nivel = 'regional' AND c.regionalid = ANY (p_ids)
+    ) x
+    JOIN rollup_energia_mensual s ON s.nivel = 'sede' AND s.id = x.sedeid::TEXT
+    GROUP BY x.id, s.ano, s.mes;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reasignar_rollup_energia() RETURNS trigger AS $$
+DECLARE
+    centroids TEXT[];
+    regionalids TEXT[];
+BEGIN
+    IF TG_TABLE_NAME = 'sede_centro' THEN
+        EXECUTE CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT array_agg(DISTINCT centroid) FROM nuevas'
+            WHEN 'DELETE' THEN 'SELECT array_agg(DISTINCT centroid) FROM viejas'
+            ELSE 'SELECT array_agg(DISTINCT centroid) FROM (SELECT centroid FROM nuevas UNION SELECT centroid FROM viejas) t'
+        END INTO centroids;
+        SELECT array_agg(DISTINCT regionalid) INTO regionalids FROM centros WHERE centroid = ANY (centroids);
+        PERFORM recalcular_rollup_energia('centro', centroids);
+    ELSE
+        SELECT array_agg(DISTINCT t.regionalid) INTO regionalids
+        FROM (SELECT n.regionalid FROM nuevas n JOIN viejas v ON v.centroid = n.centroid
+              WHERE n.regionalid IS DISTINCT FROM v.regionalid
+              UNION
+              SELECT v.regionalid FROM nuevas n JOIN viejas v ON v.centroid = n.centroid
+              WHERE n.regionalid IS DISTINCT FROM v.regionalid) t;
+    END IF;
+    IF regionalids IS NOT NULL THEN
+        PERFORM recalcular_rollup_energia('regional', regionalids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION vaciar_rollup_energia() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM rollup_energia_mensual;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rollup_energia_insert ON costos_energia;
+DROP TRIGGER IF EXISTS rollup_energia_update ON costos_energia;
+DROP TRIGGER IF EXISTS rollup_energia_delete ON costos_energia;
+DROP TRIGGER IF EXISTS rollup_energia_truncate ON costos_energia;
+DROP TRIGGER IF EXISTS rollup_energia_insert ON sede_centro;
+DROP TRIGGER IF EXISTS rollup_energia_update ON sede_centro;
+DROP TRIGGER IF EXISTS rollup_energia_delete ON sede_centro;
+DROP TRIGGER IF EXISTS rollup_energia_update ON centros;
+CREATE TRIGGER rollup_energia_insert AFTER INSERT ON costos_energia
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION aplicar_rollup_energia();
+CREATE TRIGGER rollup_energia_update AFTER UPDATE ON costos_energia
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION aplicar_rollup_energia();
+CREATE TRIGGER rollup_energia_delete AFTER DELETE ON costos_energia
+    REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION aplicar_rollup_energia();
+CREATE TRIGGER rollup_energia_truncate AFTER TRUNCATE ON costos_energia
+    FOR EACH STATEMENT EXECUTE FUNCTION vaciar_rollup_energia();
+CREATE TRIGGER rollup_energia_insert AFTER INSERT ON sede_centro
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION reasignar_rollup_energia();
+CREATE TRIGGER rollup_energia_update AFTER UPDATE ON sede_centro
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION reasignar_rollup_energia();
+CREATE TRIGGER rollup_energia_delete AFTER DELETE ON sede_centro
+    REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION reasignar_rollup_energia();
+CREATE TRIGGER rollup_energia_update AFTER UPDATE ON centros
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION reasignar_rollup_energia();
+
+DELETE FROM rollup_energia_mensual;
+INSERT INTO rollup_energia_mensual (nivel, id, ano, mes, consumo_pkwh, consumo_qvarh, valor_factura,
+                                    cantidad_aprendices, cantidad_administrativos, facturas)
+SELECT 'sede', d.sedeid::TEXT, d.ano, d.mes,
+       SUM(d.consumo_pkwh), SUM(d.consumo_qvarh), SUM(d.valor_factura),
+       COALESCE(MAX(d.cantidad_aprendices), 0), COALESCE(MAX(d.cantidad_administrativos), 0), COUNT(*)
+FROM (
+    SELECT sedeid,
+           COALESCE(ano, EXTRACT(YEAR FROM fecha_inicio_factura)::INT) AS ano,
+           COALESCE(mes, EXTRACT(MONTH FROM fecha_inicio_factura)::INT) AS mes,
+           COALESCE(consumo_pkwh, 0) AS consumo_pkwh, COALESCE(consumo_qvarh, 0) AS consumo_qvarh,
+           COALESCE(valor_factura, 0) AS valor_factura, cantidad_aprendices, cantidad_administrativos
+    FROM costos_energia
+    WHERE sedeid IS NOT NULL
+) d
+WHERE d.ano IS NOT NULL AND d.mes IS NOT NULL
+GROUP BY d.sedeid, d.ano, d.mes;
+SELECT recalcular_rollup_energia('centro', ARRAY(SELECT centroid FROM centros));
+SELECT recalcular_rollup_energia('regional', ARRAY(SELECT regionalid FROM regionales));
+
+COMMIT;
+
+ANALYZE rollup_energia_mensual;
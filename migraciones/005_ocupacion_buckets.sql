@@ -0,0 +1,188 @@
+-- Tabla ocupacion_buckets y sus triggers. Es la única copia de este SQL: init.sql la incluye y
+-- models.py la ejecuta cuando create_all crea la tabla; en bases ya existentes se aplica con psql.
+-- Todo corre en una transacción: el LOCK impide escrituras en ocupacion y ambientes entre el recálculo
+-- y la creación de los triggers (las lecturas siguen). Volver a ejecutarla recalcula la tabla desde cero.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ocupacion_buckets (
+    nivel VARCHAR(10),
+    id INT,
+    periodo VARCHAR(6),
+    inicio DATE,
+    lecturas INT NOT NULL,
+    suma_personas BIGINT NOT NULL,
+    min_personas INT,
+    max_personas INT,
+    tiempo_total INTERVAL NOT NULL,
+    PRIMARY KEY (nivel, id, periodo, inicio)
+);
+
+LOCK TABLE ocupacion, ambientes IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE OR REPLACE FUNCTION recalcular_ocupacion_sedes(p_sedes INT[], p_fechas DATE[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM ocupacion_buckets b
+    USING (SELECT DISTINCT * FROM unnest(p_sedes, p_fechas) AS t (sedeid, fecha)) c
+    WHERE b.nivel = 'sede' AND b.id = c.sedeid AND b.periodo = 'dia' AND b.inicio = c.fecha;
+    INSERT INTO ocupacion_buckets (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+    SELECT 'sede', c.sedeid, 'dia', c.fecha, SUM(b.lecturas), SUM(b.suma_personas), MIN(b.min_personas),
+           MAX(b.max_personas), SUM(b.tiempo_total)
+    FROM (SELECT DISTINCT * FROM unnest(p_sedes, p_fechas) AS t (sedeid, fecha)) c
+    JOIN ambientes a ON a.sedeid = c.sedeid
+    JOIN ocupacion_buckets b ON b.nivel = 'ambiente' AND b.id = a.ambienteid AND b.periodo = 'dia' AND b.inicio = c.fecha
+    GROUP BY c.sedeid, c.fecha;
+
+    DELETE FROM ocupacion_buckets b
+    USING (SELECT DISTINCT sedeid, date_trunc('week', fecha)::DATE AS semana FROM unnest(p_sedes, p_fechas) AS t (sedeid, fecha)) c
+    WHERE b.nivel = 'sede' AND b.id = c.sedeid AND b.periodo = 'semana' AND b.inicio = c.semana;
+    INSERT INTO ocupacion_buckets (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+    SELECT 'sede', c.sedeid, 'semana', c.semana, SUM(b.lecturas), SUM(b.suma_personas), MIN(b.min_personas),
+           MAX(b.max_personas), SUM(b.tiempo_total)
+    FROM (SELECT DISTINCT sedeid, date_trunc('week', fecha)::DATE AS semana FROM unnest(p_sedes, p_fechas) AS t (sedeid, fecha)) c
+    JOIN ocupacion_buckets b ON b.nivel = 'sede' AND b.id = c.sedeid AND b.periodo = 'dia'
+                            AND b.inicio >= c.semana AND b.inicio < c.semana + 7
+    GROUP BY c.sedeid, c.semana;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION recalcular_ocupacion_buckets(p_ambientes INT[], p_fechas DATE[]) RETURNS void AS $$
+DECLARE
+    ids_sedes INT[];
+    fechas DATE[];
+BEGIN
+    DELETE FROM ocupacion_buckets b
+    USING (SELECT DISTINCT * FROM unnest(p_ambientes, p_fechas) AS t (ambienteid, fecha)) c
+    WHERE b.nivel = 'ambiente' AND b.id = c.ambienteid AND b.periodo = 'dia' AND b.inicio = c.fecha;
+    INSERT INTO ocupacion_buckets (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+    SELECT 'ambiente', o.ambienteid, 'dia', o.fecha, COUNT(o.cantidad_de_personas), COALESCE(SUM(o.cantidad_de_personas), 0),
+           MIN(o.cantidad_de_personas), MAX(o.cantidad_de_personas), COALESCE(SUM(o.tiempo_de_ocupacion), INTERVAL '0')
+    FROM (SELECT DISTINCT * FROM unnest(p_ambientes, p_fechas) AS t (ambienteid, fecha)) c
+    JOIN ocupacion o ON o.ambienteid = c.ambienteid AND o.fecha = c.fecha
+    GROUP BY o.ambienteid, o.fecha;
+
+    DELETE FROM ocupacion_buckets b
+    USING (SELECT DISTINCT ambienteid, date_trunc('week', fecha)::DATE AS semana FROM unnest(p_ambientes, p_fechas) AS t (ambienteid, fecha)) c
+    WHERE b.nivel = 'ambiente' AND b.id = c.ambienteid AND b.periodo = 'semana' AND b.inicio = c.semana;
+    INSERT INTO ocupacion_buckets (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+    SELECT 'ambiente', c.ambienteid, 'semana', c.semana, SUM(b.lecturas), SUM(b.suma_personas), MIN(b.min_personas),
+           MAX(b.max_personas), SUM(b.tiempo_total)
+    FROM (SELECT DISTINCT ambienteid, date_trunc('week', fecha)::DATE AS semana FROM unnest(p_ambientes, p_fechas) AS t (ambienteid, fecha)) c
+    JOIN ocupacion_buckets b ON b.nivel = 'ambiente' AND b.id = c.ambienteid AND b.periodo = 'dia'
+                            AND b.inicio >= c.semana AND b.inicio < c.semana + 7
+    GROUP BY c.ambienteid, c.semana;
+
+    SELECT array_agg(a.sedeid), array_agg(c.fecha) INTO ids_sedes, fechas
+    FROM (SELECT DISTINCT * FROM unnest(p_ambientes, p_fechas) AS t (ambienteid, fecha)) c
+    JOIN ambientes a ON a.ambienteid = c.ambienteid;
+    PERFORM recalcular_ocupacion_sedes(ids_sedes, fechas);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION actualizar_ocupacion_buckets() RETURNS trigger AS $$
+DECLARE
+    ids_ambientes INT[];
+    fechas DATE[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        WITH d AS (
+            SELECT n.ambienteid, a.sedeid, n.fecha, COUNT(n.cantidad_de_personas) AS lecturas,
+                   COALESCE(SUM(n.cantidad_de_personas), 0) AS suma_personas, MIN(n.cantidad_de_personas) AS min_personas,
+                   MAX(n.cantidad_de_personas) AS max_personas, COALESCE(SUM(n.tiempo_de_ocupacion), INTERVAL '0') AS tiempo_total
+            FROM nuevas n JOIN ambientes a ON a.ambienteid = n.ambienteid
+            WHERE n.fecha IS NOT NULL
+            GROUP BY n.ambienteid, a.sedeid, n.fecha
+        ), niveles AS (
+            SELECT 'ambiente' AS nivel, ambienteid AS id, 'dia' AS periodo, fecha AS inicio, d.* FROM d
+            UNION ALL
+            SELECT 'ambiente', ambienteid, 'semana', date_trunc('week', fecha)::DATE, d.* FROM d
+            UNION ALL
+            SELECT 'sede', sedeid, 'dia', fecha, d.* FROM d
+            UNION ALL
+            SELECT 'sede', sedeid, 'semana', date_trunc('week', fecha)::DATE, d.* FROM d
+        )
+        INSERT INTO ocupacion_buckets AS b (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+        SELECT nivel, id, periodo, inicio, SUM(lecturas), SUM(suma_personas), MIN(min_personas), MAX(max_personas), SUM(tiempo_total)
+        FROM niveles
+        GROUP BY nivel, id, periodo, inicio
+        ORDER BY nivel, id, periodo, inicio
+        ON CONFLICT (nivel, id, periodo, inicio) DO UPDATE SET
+            lecturas = b.lecturas + EXCLUDED.lecturas,
+            suma_personas = b.suma_personas + EXCLUDED.suma_personas,
+            min_personas = LEAST(b.min_personas, EXCLUDED.min_personas),
+            max_personas = GREATEST(b.max_personas, EXCLUDED.max_personas),
+            tiempo_total = b.tiempo_total + EXCLUDED.tiempo_total;
+        RETURN NULL;
+    END IF;
+
+    -- El mínimo y el máximo no se pueden restar: los días tocados se recalculan desde las lecturas
+    IF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(ambienteid), array_agg(fecha) INTO ids_ambientes, fechas
+        FROM (SELECT ambienteid, fecha FROM nuevas UNION SELECT ambienteid, fecha FROM viejas) t
+        WHERE fecha IS NOT NULL;
+    ELSE
+        SELECT array_agg(ambienteid), array_agg(fecha) INTO ids_ambientes, fechas
+        FROM (SELECT DISTINCT ambienteid, fecha FROM viejas) t
+        WHERE fecha IS NOT NULL;
+    END IF;
+    PERFORM recalcular_ocupacion_buckets(ids_ambientes, fechas);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reasignar_ocupacion_buckets() RETURNS trigger AS $$
+DECLARE
+    ids_sedes INT[];
+    fechas DATE[];
+BEGIN
+    SELECT array_agg(t.sedeid), array_agg(t.inicio) INTO ids_sedes, fechas
+    FROM (SELECT DISTINCT s.sedeid, b.inicio
+          FROM nuevas n JOIN viejas v ON v.ambienteid = n.ambienteid
+          CROSS JOIN LATERAL (VALUES (n.sedeid), (v.sedeid)) AS s (sedeid)
+          JOIN ocupacion_buckets b ON b.nivel = 'ambiente' AND b.id = n.ambienteid AND b.periodo = 'dia'
+          WHERE n.sedeid IS DISTINCT FROM v.sedeid) t;
+    PERFORM recalcular_ocupacion_sedes(ids_sedes, fechas);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION vaciar_ocupacion_buckets() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM ocupacion_buckets;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS ocupacion_buckets_insert ON ocupacion;
+DROP TRIGGER IF EXISTS ocupacion_buckets_update ON ocupacion;
+DROP TRIGGER IF EXISTS ocupacion_buckets_delete ON ocupacion;
+DROP TRIGGER IF EXISTS ocupacion_buckets_truncate ON ocupacion;
+DROP TRIGGER IF EXISTS ocupacion_buckets_update ON ambientes;
+CREATE TRIGGER ocupacion_buckets_insert AFTER INSERT ON ocupacion
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION actualizar_ocupacion_buckets();
+CREATE TRIGGER ocupacion_buckets_update AFTER UPDATE ON ocupacion
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION actualizar_ocupacion_buckets();
+CREATE TRIGGER ocupacion_buckets_delete AFTER DELETE ON ocupacion
+    REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION actualizar_ocupacion_buckets();
+CREATE TRIGGER ocupacion_buckets_truncate AFTER TRUNCATE ON ocupacion
+    FOR EACH STATEMENT EXECUTE FUNCTION vaciar_ocupacion_buckets();
+CREATE TRIGGER ocupacion_buckets_update AFTER UPDATE ON ambientes
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION reasignar_ocupacion_buckets();
+
+DELETE FROM ocupacion_buckets;
+INSERT INTO ocupacion_buckets (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+SELECT 'ambiente', ambienteid, 'dia', fecha, COUNT(cantidad_de_personas), COALESCE(SUM(cantidad_de_personas), 0),
+       MIN(cantidad_de_personas), MAX(cantidad_de_personas), COALESCE(SUM(tiempo_de_ocupacion), INTERVAL '0')
+FROM ocupacion WHERE fecha IS NOT NULL GROUP BY ambienteid, fecha;
+INSERT INTO ocupacion_buckets (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+SELECT 'sede', a.sedeid, 'dia', b.inicio, SUM(b.lecturas), SUM(b.suma_personas), MIN(b.min_personas), MAX(b.max_personas), SUM(b.tiempo_total)
+FROM ocupacion_buckets b JOIN ambientes a ON a.ambienteid = b.id
+WHERE b.nivel = 'ambiente' AND b.periodo = 'dia' GROUP BY a.sedeid, b.inicio;
+INSERT INTO ocupacion_buckets (nivel, id, periodo, inicio, lecturas, suma_personas, min_personas, max_personas, tiempo_total)
+SELECT nivel, id, 'semana', date_trunc('week', inicio)::DATE, SUM(lecturas), SUM(suma_personas), MIN(min_personas),
+       MAX(max_personas), SUM(tiempo_total)
+FROM ocupacion_buckets WHERE periodo = 'dia' GROUP BY nivel, id, date_trunc('week', inicio)::DATE;
+
+COMMIT;
+
+ANALYZE ocupacion_buckets;
@@ -0,0 +1,29 @@
+-- Tablas de resultados del análisis de factor de potencia. Es la única copia de este SQL: init.sql
+-- la incluye y en bases ya existentes se aplica con psql. Quedan vacías hasta la primera corrida
+-- de factor_potencia.py.
+
+CREATE TABLE IF NOT EXISTS factor_potencia_sede (
+    sedeid INT PRIMARY KEY,
+    facturas INT NOT NULL,
+    facturas_penalizadas INT NOT NULL,
+    consumo_pkwh FLOAT NOT NULL,
+    consumo_qvarh FLOAT NOT NULL,
+    factor_potencia FLOAT NOT NULL,
+    factor_potencia_min FLOAT NOT NULL,
+    exceso_qvarh FLOAT NOT NULL,
+    costo_evitable FLOAT NOT NULL,
+    estado VARCHAR(10) NOT NULL,
+    calculado_en TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_factor_potencia_sede_estado_costo ON factor_potencia_sede (estado, costo_evitable);
+
+CREATE TABLE IF NOT EXISTS factor_potencia_factura (
+    costoid INT PRIMARY KEY,
+    sedeid INT NOT NULL,
+    ano INT,
+    mes INT,
+    factor_potencia FLOAT NOT NULL,
+    exceso_qvarh FLOAT NOT NULL,
+    costo_evitable FLOAT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_factor_potencia_factura_sedeid ON factor_potencia_factura (sedeid, ano, mes);
@@ -0,0 +1,69 @@
+-- Tablas de la detección de anomalías de facturación y sus triggers sobre costos_energia. Es la única
+-- copia de este SQL: init.sql la incluye y models.py la ejecuta cuando create_all crea las tablas; en
+-- bases ya existentes se aplica con psql.
+-- Cada sentencia que inserta, borra o corrige (sede, periodo, consumo o valor) facturas agrega sus sedes
+-- a anomalias_pendientes en la misma transacción; anomalias.py reevalúa esas sedes y borra solo las
+-- filas que leyó. Así no se pierden facturas de transacciones que confirman fuera de orden, como
+-- pasaría con una marca de mayor costoid. Volver a ejecutarla deja todas las sedes pendientes.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS anomalias_factura (
+    costoid INT PRIMARY KEY REFERENCES costos_energia(costoid) ON DELETE CASCADE,
+    sedeid INT NOT NULL,
+    ano INT NOT NULL,
+    mes INT NOT NULL,
+    consumo_pkwh FLOAT,
+    valor_factura FLOAT,
+    media_consumo FLOAT,
+    desviacion_consumo FLOAT,
+    z_consumo FLOAT,
+    media_valor FLOAT,
+    desviacion_valor FLOAT,
+    z_valor FLOAT,
+    variacion_anual_consumo FLOAT,
+    variacion_anual_valor FLOAT,
+    motivos VARCHAR(100) NOT NULL,
+    detectado_en TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_anomalias_factura_sedeid ON anomalias_factura (sedeid, ano, mes);
+CREATE INDEX IF NOT EXISTS ix_anomalias_factura_detectado_en ON anomalias_factura (detectado_en, costoid);
+
+CREATE TABLE IF NOT EXISTS anomalias_pendientes (
+    id BIGSERIAL PRIMARY KEY,
+    sedeid INT NOT NULL
+);
+
+-- Versiones anteriores guardaban aquí el mayor costoid evaluado
+DROP TABLE IF EXISTS marcas_trabajos;
+
+CREATE OR REPLACE FUNCTION marcar_anomalias_pendientes() RETURNS trigger AS $$
+BEGIN
+    EXECUTE 'INSERT INTO anomalias_pendientes (sedeid) SELECT DISTINCT sedeid FROM ('
+        || CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT sedeid FROM nuevas'
+            WHEN 'DELETE' THEN 'SELECT sedeid FROM viejas'
+            ELSE 'SELECT unnest(ARRAY[n.sedeid, v.sedeid]) AS sedeid
+                  FROM nuevas n JOIN viejas v ON v.costoid = n.costoid
+                  WHERE (n.sedeid, n.ano, n.mes, n.fecha_inicio_factura, n.consumo_pkwh, n.valor_factura)
+                        IS DISTINCT FROM (v.sedeid, v.ano, v.mes, v.fecha_inicio_factura, v.consumo_pkwh, v.valor_factura)'
+        END
+        || ') t WHERE sedeid IS NOT NULL';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS anomalias_pendientes_insert ON costos_energia;
+DROP TRIGGER IF EXISTS anomalias_pendientes_update ON costos_energia;
+DROP TRIGGER IF EXISTS anomalias_pendientes_delete ON costos_energia;
+CREATE TRIGGER anomalias_pendientes_insert AFTER INSERT ON costos_energia
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION marcar_anomalias_pendientes();
+CREATE TRIGGER anomalias_pendientes_update AFTER UPDATE ON costos_energia
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION marcar_anomalias_pendientes();
+CREATE TRIGGER anomalias_pendientes_delete AFTER DELETE ON costos_energia
+    REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION marcar_anomalias_pendientes();
+
+INSERT INTO anomalias_pendientes (sedeid)
+SELECT DISTINCT sedeid FROM costos_energia WHERE sedeid IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,59 @@
+-- Versión por tabla para los GET condicionales (condicional.py). Es la única copia de este SQL: init.sql
+-- la incluye y models.py la ejecuta cuando create_all crea la tabla; en bases ya existentes se aplica
+-- con psql. Cada sentencia que escribe en regionales, sedes o subestaciones sube la versión de su tabla
+-- en la misma transacción, así el ETag cambia con cualquier escritura, venga de este proceso, de otro
+-- worker o de un script. Son tablas de referencia con pocas escrituras: la fila por tabla no es un
+-- punto de contención.
+-- modificado_en se guarda en segundos enteros, la precisión de Last-Modified, y cada transacción que
+-- escribe lo adelanta al menos un segundo respecto a la anterior (la fila bloqueada ordena las
+-- transacciones): así dos versiones nunca comparten fecha y If-Modified-Since no confunde una
+-- escritura hecha en el mismo segundo con la versión que tiene el cliente. Las sentencias siguientes
+-- de la misma transacción no lo adelantan de nuevo.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS versiones_tablas (
+    tabla VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL,
+    modificado_en TIMESTAMPTZ NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION subir_version_tabla() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO versiones_tablas AS v (tabla, version, modificado_en)
+    VALUES (TG_TABLE_NAME, 1, date_trunc('second', clock_timestamp()))
+    ON CONFLICT (tabla) DO UPDATE SET
+        version = v.version + 1,
+        modificado_en = CASE
+            WHEN v.xmin = pg_current_xact_id()::xid THEN v.modificado_en
+            ELSE date_trunc('second', GREATEST(clock_timestamp(), v.modificado_en + interval '1 second'))
+        END;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS versiones_tablas_escritura ON regionales;
+DROP TRIGGER IF EXISTS versiones_tablas_truncate ON regionales;
+DROP TRIGGER IF EXISTS versiones_tablas_escritura ON sedes;
+DROP TRIGGER IF EXISTS versiones_tablas_truncate ON sedes;
+DROP TRIGGER IF EXISTS versiones_tablas_escritura ON subestaciones;
+DROP TRIGGER IF EXISTS versiones_tablas_truncate ON subestaciones;
+CREATE TRIGGER versiones_tablas_escritura AFTER INSERT OR UPDATE OR DELETE ON regionales
+    FOR EACH STATEMENT EXECUTE FUNCTION subir_version_tabla();
+CREATE TRIGGER versiones_tablas_truncate AFTER TRUNCATE ON regionales
+    FOR EACH STATEMENT EXECUTE FUNCTION subir_version_tabla();
+CREATE TRIGGER versiones_tablas_escritura AFTER INSERT OR UPDATE OR DELETE ON sedes
+    FOR EACH STATEMENT EXECUTE FUNCTION subir_version_tabla();
+CREATE TRIGGER versiones_tablas_truncate AFTER TRUNCATE ON sedes
+    FOR EACH STATEMENT EXECUTE FUNCTION subir_version_tabla();
+CREATE TRIGGER versiones_tablas_escritura AFTER INSERT OR UPDATE OR DELETE ON subestaciones
+    FOR EACH STATEMENT EXECUTE FUNCTION subir_version_tabla();
+CREATE TRIGGER versiones_tablas_truncate AFTER TRUNCATE ON subestaciones
+    FOR EACH STATEMENT EXECUTE FUNCTION subir_version_tabla();
+
+INSERT INTO versiones_tablas (tabla, version, modificado_en)
+VALUES ('regionales', 0, date_trunc('second', now())), ('sedes', 0, date_trunc('second', now())),
+       ('subestaciones', 0, date_trunc('second', now()))
+ON CONFLICT (tabla) DO NOTHING;
+
+COMMIT;
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Enum, Interval, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, ForeignKey, Enum, Interval, DateTime, UniqueConstraint, Index, Sequence, event
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
+import os
 
 # Enum para tipo_de_usuario
 class TipoUsuarioEnum(str, enum.Enum):
@@ -19,7 +20,7 @@ class Usuario(Base):
     apellido = Column(String(255), nullable=False)
     correo_electronico = Column(String(255), unique=True, nullable=False)
     contrasena = Column(String(255), nullable=False)
-    tipo_de_usuario = Column(Enum(TipoUsuarioEnum), nullable=False)
+    tipo_de_usuario = Column(Enum(TipoUsuarioEnum, name='tipo_usuario_enum'), nullable=False)  # Nombre del tipo en init.sql
 
     # Relaciones
     centros = relationship("Centro", back_populates="usuario")
@@ -41,23 +42,26 @@ class Usuario(Base):
 # Modelo para la tabla regionales
 class Regional(Base):
     __tablename__ = 'regionales'
-    regionalid = Column(String, primary_key=True, index=True)  # ID como String
+    regionalid = Column(String(50), primary_key=True, index=True)  # ID como String
     nombre_de_la_region = Column(String(255), nullable=False)
 
 # Modelo para la tabla centros
 class Centro(Base):
     __tablename__ = 'centros'
-    centroid = Column(Integer, primary_key=True, index=True)
+    centroid = Column(String(50), primary_key=True, index=True)  # Código del centro como String
     nombre_del_centro = Column(String(255), nullable=False)
     ciudad = Column(String(255), nullable=False)
-    regionalid = Column(String, ForeignKey('regionales.regionalid'), nullable=False)
+    regionalid = Column(String(50), ForeignKey('regionales.regionalid'), nullable=False)
     
-    usuario_id = Column(Integer, ForeignKey('usuarios.userid'), nullable=False)
+    usuario_id = Column(Integer, ForeignKey('usuarios.userid'), nullable=True)  # El cargador de Excel no asigna usuario
 
     usuario = relationship("Usuario", back_populates="centros")
     
-    # Unicidad para combinación nombre y regional
-    __table_args__ = (UniqueConstraint('nombre_del_centro', 'regionalid', name='uq_nombre_regional'),)
+    # Unicidad para combinación nombre y regional; índice para los centros de una regional
+    __table_args__ = (
+        UniqueConstraint('nombre_del_centro', 'regionalid', name='uq_nombre_regional'),
+        Index('ix_centros_regionalid', 'regionalid'),
+    )
 
 # Modelo para la tabla sedes
 class Sede(Base):
@@ -70,7 +74,10 @@ class Sede(Base):
 class SedeCentro(Base):
     __tablename__ = 'sede_centro'
     sedeid = Column(Integer, ForeignKey('sedes.sedeid'), primary_key=True)
-    centroid = Column(Integer, ForeignKey('centros.centroid'), primary_key=True)
+    centroid = Column(String(50), ForeignKey('centros.centroid'), primary_key=True)
+
+    # La llave primaria empieza por sedeid; las sedes de un centro se buscan por centroid
+    __table_args__ = (Index('ix_sede_centro_centroid', 'centroid'),)
 
 # Modelo para la tabla ambientes
 class Ambiente(Base):
@@ -81,6 +88,11 @@ class Ambiente(Base):
     sedeid = Column(Integer, ForeignKey('sedes.sedeid'), nullable=False)
     sede = relationship("Sede")
 
+    __table_args__ = (
+        Index('ix_ambientes_sedeid', 'sedeid'),
+        Index('ix_ambientes_tipo_de_circuito', 'tipo_de_circuito'),
+    )
+
 # Modelo para la tabla dispositivos
 class Dispositivo(Base):
     __tablename__ = 'dispositivos'
@@ -90,10 +102,18 @@ class Dispositivo(Base):
     consumo_energetico = Column(Float, nullable=True)
     fecha_de_instalacion = Column(Date, nullable=True)
     ambienteid = Column(Integer, ForeignKey('ambientes.ambienteid'), nullable=False)
+    tipo_de_lugar = Column(String(255), nullable=True)
+    referencias_a_mediciones = Column(String, nullable=True)
     ambiente = relationship("Ambiente")
     usuario_id = Column(Integer, ForeignKey('usuarios.userid'), nullable=True)  # Referencia opcional a usuario
     usuario = relationship("Usuario", back_populates="dispositivos")  # Relación bidireccional con usuario
 
+    # Alto consumo por ambiente y rango de fechas de instalación
+    __table_args__ = (
+        Index('ix_dispositivos_ambienteid_consumo', 'ambienteid', 'consumo_energetico'),
+        Index('ix_dispositivos_fecha_de_instalacion', 'fecha_de_instalacion'),
+    )
+
 # Modelo para la tabla ocupacion
 class Ocupacion(Base):
     __tablename__ = 'ocupacion'
@@ -104,6 +124,8 @@ class Ocupacion(Base):
     fecha = Column(Date, nullable=True)
     ambiente = relationship("Ambiente")
 
+    __table_args__ = (Index('ix_ocupacion_ambienteid_fecha', 'ambienteid', 'fecha'),)
+
 # Modelo para la tabla costos_energia
 class CostoEnergia(Base):
     __tablename__ = 'costos_energia'
@@ -121,6 +143,12 @@ class CostoEnergia(Base):
     cantidad_administrativos = Column(Integer, nullable=True)
     sede = relationship("Sede")
 
+    # Costos de una sede por año y mes, y consumo de una sede por rango de fechas de factura
+    __table_args__ = (
+        Index('ix_costos_energia_sedeid_ano_mes', 'sedeid', 'ano', 'mes'),
+        Index('ix_costos_energia_sedeid_fecha_inicio', 'sedeid', 'fecha_inicio_factura'),
+    )
+
 # Modelo para la tabla subestaciones
 class Subestacion(Base):
     __tablename__ = 'subestaciones'
@@ -129,3 +157,148 @@ class Subestacion(Base):
     sedeid = Column(Integer, ForeignKey('sedes.sedeid'), nullable=False)
     nivel_tension_kva = Column(Float, nullable=True)
     sede = relationship("Sede")
+
+    __table_args__ = (Index('ix_subestaciones_sedeid', 'sedeid'),)
+
+CAMBIO_RESUMEN_CONSUMO = Sequence('resumen_consumo_sede_cambio_seq', metadata=Base.metadata)
+
+# Totales de costos_energia por sede; los mantienen los triggers de migraciones/003_resumen_consumo_sede.sql
+class ResumenConsumoSede(Base):
+    __tablename__ = 'resumen_consumo_sede'
+    sedeid = Column(Integer, ForeignKey('sedes.sedeid', ondelete='CASCADE'), primary_key=True)
+    total_consumo_kw = Column(Float, nullable=False)
+    total_consumo_qvarh = Column(Float, nullable=False)
+    total_valor_factura = Column(Float, nullable=False)
+    facturas = Column(Integer, nullable=False)
+    # Valor nuevo de la secuencia cada vez que un trigger toca la fila (kpis.py lo usa como versión)
+    cambio = Column(BigInteger, CAMBIO_RESUMEN_CONSUMO, nullable=False, server_default=CAMBIO_RESUMEN_CONSUMO.next_value())
+
+# Resultado del análisis de factor de potencia por sede (lo reescribe cada corrida de factor_potencia.py).
+# estado: 'normal', 'bajo' (bajo el mínimo) o 'critico'
+class FactorPotenciaSede(Base):
+    __tablename__ = 'factor_potencia_sede'
+    sedeid = Column(Integer, primary_key=True)
+    facturas = Column(Integer, nullable=False)
+    facturas_penalizadas = Column(Integer, nullable=False)
+    consumo_pkwh = Column(Float, nullable=False)
+    consumo_qvarh = Column(Float, nullable=False)
+    factor_potencia = Column(Float, nullable=False)
+    factor_potencia_min = Column(Float, nullable=False)
+    exceso_qvarh = Column(Float, nullable=False)
+    costo_evitable = Column(Float, nullable=False)
+    estado = Column(String(10), nullable=False)
+    calculado_en = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index('ix_factor_potencia_sede_estado_costo', 'estado', 'costo_evitable'),)
+
+# Facturas con factor de potencia bajo el mínimo en la última corrida del análisis
+class FactorPotenciaFactura(Base):
+    __tablename__ = 'factor_potencia_factura'
+    costoid = Column(Integer, primary_key=True)
+    sedeid = Column(Integer, nullable=False)
+    ano = Column(Integer, nullable=True)
+    mes = Column(Integer, nullable=True)
+    factor_potencia = Column(Float, nullable=False)
+    exceso_qvarh = Column(Float, nullable=False)
+    costo_evitable = Column(Float, nullable=False)
+
+    __table_args__ = (Index('ix_factor_potencia_factura_sedeid', 'sedeid', 'ano', 'mes'),)
+
+# Facturas marcadas por la detección de anomalías (anomalias.py) con las estadísticas que las marcaron.
+# Se acumulan entre corridas; al borrar la factura se borra su anomalía.
+class AnomaliaFactura(Base):
+    __tablename__ = 'anomalias_factura'
+    costoid = Column(Integer, ForeignKey('costos_energia.costoid', ondelete='CASCADE'), primary_key=True)
+    sedeid = Column(Integer, nullable=False)
+    ano = Column(Integer, nullable=False)
+    mes = Column(Integer, nullable=False)
+    consumo_pkwh = Column(Float, nullable=True)
+    valor_factura = Column(Float, nullable=True)
+    media_consumo = Column(Float, nullable=True)
+    desviacion_consumo = Column(Float, nullable=True)
+    z_consumo = Column(Float, nullable=True)
+    media_valor = Column(Float, nullable=True)
+    desviacion_valor = Column(Float, nullable=True)
+    z_valor = Column(Float, nullable=True)
+    variacion_anual_consumo = Column(Float, nullable=True)
+    variacion_anual_valor = Column(Float, nullable=True)
+    motivos = Column(String(100), nullable=False)
+    detectado_en = Column(DateTime, nullable=False)
+
+    # Anomalías de una sede por periodo y las más recientes de todas las sedes
+    __table_args__ = (
+        Index('ix_anomalias_factura_sedeid', 'sedeid', 'ano', 'mes'),
+        Index('ix_anomalias_factura_detectado_en', 'detectado_en', 'costoid'),
+    )
+
+# Sedes con facturas insertadas, borradas o corregidas desde la última corrida de anomalias.py; las
+# agregan los triggers de migraciones/007_anomalias_factura.sql (puede haber varias filas por sede)
+class AnomaliaPendiente(Base):
+    __tablename__ = 'anomalias_pendientes'
+    id = Column(BigInteger, primary_key=True)
+    sedeid = Column(Integer, nullable=False)
+
+# Versión de cada tabla de referencia para los GET condicionales (condicional.py); la suben los
+# triggers de migraciones/008_versiones_tablas.sql con cada sentencia que escribe en la tabla
+class VersionTabla(Base):
+    __tablename__ = 'versiones_tablas'
+    tabla = Column(String(63), primary_key=True)
+    version = Column(BigInteger, nullable=False)
+    modificado_en = Column(DateTime(timezone=True), nullable=False)
+
+# Consumo mensual preagregado por nivel ('sede', 'centro' o 'regional') y periodo; la población es el
+# máximo por sede y mes. Lo mantienen los triggers de migraciones/004_rollup_energia_mensual.sql
+class RollupEnergiaMensual(Base):
+    __tablename__ = 'rollup_energia_mensual'
+    nivel = Column(String(10), primary_key=True)
+    id = Column(String(50), primary_key=True)
+    ano = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    consumo_pkwh = Column(Float, nullable=False)
+    consumo_qvarh = Column(Float, nullable=False)
+    valor_factura = Column(Float, nullable=False)
+    cantidad_aprendices = Column(Integer, nullable=False)
+    cantidad_administrativos = Column(Integer, nullable=False)
+    facturas = Column(Integer, nullable=False)
+
+# Lecturas de ocupación agregadas por nivel ('ambiente' o 'sede'), periodo ('dia' o 'semana') y fecha
+# de inicio (el lunes en las semanas ISO); lecturas cuenta las que traen cantidad_de_personas.
+# La mantienen los triggers de migraciones/005_ocupacion_buckets.sql
+class OcupacionBucket(Base):
+    __tablename__ = 'ocupacion_buckets'
+    nivel = Column(String(10), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    periodo = Column(String(6), primary_key=True)
+    inicio = Column(Date, primary_key=True)
+    lecturas = Column(Integer, nullable=False)
+    suma_personas = Column(BigInteger, nullable=False)
+    min_personas = Column(Integer, nullable=True)
+    max_personas = Column(Integer, nullable=True)
+    tiempo_total = Column(Interval, nullable=False)
+
+# Migración que crea cada tabla mantenida por triggers, instala sus funciones y triggers y la llena
+# con los datos existentes; es la misma que incluye init.sql
+MIGRACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+TRIGGERS_RESUMENES = (
+    (ResumenConsumoSede.__table__, '003_resumen_consumo_sede.sql'),
+    (RollupEnergiaMensual.__table__, '004_rollup_energia_mensual.sql'),
+    (OcupacionBucket.__table__, '005_ocupacion_buckets.sql'),
+    (AnomaliaPendiente.__table__, '007_anomalias_factura.sql'),
+    (VersionTabla.__table__, '008_versiones_tablas.sql'),
+)
+
+# SQL de una migración sin su BEGIN/COMMIT (create_all ya corre dentro de una transacción) ni sus
+# comentarios: son los únicos textos con acentos y psycopg2 no los puede enviar a una base SQL_ASCII
+def _sql_migracion(nombre):
+    with open(os.path.join(MIGRACIONES, nombre), encoding='utf-8') as archivo:
+        return "\n".join(linea for linea in archivo.read().splitlines()
+                         if linea.strip() not in ('BEGIN;', 'COMMIT;') and not linea.lstrip().startswith('--'))
+
+# Cuando create_all crea una de esas tablas en Postgres, instalar sus triggers y llenarla con los datos existentes
+@event.listens_for(Base.metadata, "after_create")
+def _crear_triggers_resumen(target, connection, tables=(), **kw):
+    if connection.dialect.name != 'postgresql':
+        return
+    for tabla, migracion in TRIGGERS_RESUMENES:
+        if tabla in tables:
+            connection.exec_driver_sql(_sql_migracion(migracion))
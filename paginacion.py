@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException, Query
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+# Tamaño de página por defecto y máximo de los endpoints de listas
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+# El cursor es opaco para el cliente: el último valor de la clave de orden en base64
+def codificar_cursor(valor):
+    return base64.urlsafe_b64encode(json.dumps(valor).encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+# El valor decodificado debe ser del tipo de la columna de orden (entero o texto); cualquier otro
+# JSON (objetos, listas, números en una llave de texto) haría fallar la comparación en Postgres
+def validar_cursor(valor, columna):
+    if isinstance(valor, bool) or not isinstance(valor, columna.type.python_type):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+    return valor
+
+# Respuesta JSON serializada por pydantic-core (Rust); si el contenido ya son bytes se envía tal cual
+class RespuestaJSON(JSONResponse):
+    def render(self, content):
+        if isinstance(content, bytes):
+            return content
+        return to_json(content)
+
+# Validador y serializador de una lista de filas con el esquema de salida, construido una vez por esquema
+@lru_cache(maxsize=None)
+def _adaptador(esquema):
+    return TypeAdapter(List[esquema])
+
+# Parámetros comunes de paginación por cursor (keyset) y selección de campos
+class Paginacion:
+    def __init__(
+        self,
+        limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+        after: Optional[str] = Query(None, description="Cursor devuelto como next_cursor en la página anterior"),
+        fields: Optional[str] = Query(None, description="Campos a incluir, separados por comas"),
+    ):
+        self.limit = limit
+        self.cursor = after
+        self.after = decodificar_cursor(after) if after else None
+        self.campos = [campo.strip() for campo in fields.split(',') if campo.strip()] if fields else None
+
+    # Es la primera página cuando no se envió cursor
+    @property
+    def primera_pagina(self):
+        return self.cursor is None
+
+    # Armar la respuesta {items, next_cursor} validando las filas (dicts de columnas) con el esquema
+    # de salida. La lista se valida y se serializa a JSON en una sola llamada a pydantic-core, sin
+    # pasar por modelos intermedios ni por response_model; los bytes son los mismos que produce el
+    # esquema. response trae los encabezados ya fijados en el endpoint (ETag, Last-Modified).
+    def respuesta(self, filas, siguiente, esquema, response=None):
+        incluir = None
+        if self.campos:
+            desconocidos = [campo for campo in self.campos if campo not in esquema.model_fields]
+            if desconocidos:
+                raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidos)}")
+            incluir = {'__all__': set(self.campos)}
+        adaptador = _adaptador(esquema)
+        items = adaptador.dump_json(adaptador.validate_python(filas), include=incluir)
+        cursor = to_json(codificar_cursor(siguiente) if siguiente is not None else None)
+        encabezados = dict(response.headers) if response is not None else None
+        return RespuestaJSON(b'{"items":' + items + b',"next_cursor":' + cursor + b'}', headers=encabezados)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, constr, validator
-from typing import Optional
-from datetime import date, timedelta
+from typing import Generic, Optional, List, TypeVar, Union
+from datetime import date, datetime, timedelta
 from enum import Enum
 from pydantic import BaseModel
 
@@ -188,6 +188,100 @@ class ResumenConsumo(BaseModel):
     total_consumo_qvarh: float
     total_valor_factura: float
 
+# Fila mensual de rollup_energia_mensual (nivel: sede, centro, regional o nacional)
+class RollupEnergiaMensual(BaseModel):
+    nivel: str
+    id: str
+    ano: int
+    mes: int
+    consumo_pkwh: float
+    consumo_qvarh: float
+    valor_factura: float
+    cantidad_aprendices: int
+    cantidad_administrativos: int
+    facturas: int
+
+# Bucket diario o semanal de ocupacion_buckets con sus indicadores
+class BucketOcupacion(BaseModel):
+    nivel: str
+    id: int
+    periodo: str
+    inicio: date
+    lecturas: int
+    suma_personas: int
+    min_personas: Optional[int] = None
+    max_personas: Optional[int] = None
+    tiempo_total: timedelta
+    promedio_personas: Optional[float] = None
+    utilizacion: Optional[float] = None
+
+class ResumenOcupacion(BaseModel):
+    lecturas: int
+    promedio_personas: Optional[float] = None
+    min_personas: Optional[int] = None
+    max_personas: Optional[int] = None
+    tiempo_total: timedelta
+    utilizacion: Optional[float] = None
+
+# Indicadores de intensidad energética de una sede en un mes (percentiles entre las sedes del mismo mes)
+class KpiEnergia(BaseModel):
+    sedeid: int
+    ano: int
+    mes: int
+    consumo_pkwh: float
+    valor_factura: float
+    cantidad_aprendices: Optional[int] = None
+    cantidad_administrativos: Optional[int] = None
+    kwh_por_aprendiz: Optional[float] = None
+    kwh_por_administrativo: Optional[float] = None
+    costo_por_kwh: Optional[float] = None
+    percentil_kwh_por_aprendiz: Optional[float] = None
+    percentil_kwh_por_administrativo: Optional[float] = None
+    percentil_costo_por_kwh: Optional[float] = None
+
+# Resultado del análisis de factor de potencia de una sede
+class FactorPotenciaSede(BaseModel):
+    sedeid: int
+    facturas: int
+    facturas_penalizadas: int
+    consumo_pkwh: float
+    consumo_qvarh: float
+    factor_potencia: float
+    factor_potencia_min: float
+    exceso_qvarh: float
+    costo_evitable: float
+    estado: str
+    calculado_en: datetime
+
+class FactorPotenciaFactura(BaseModel):
+    costoid: int
+    sedeid: int
+    ano: Optional[int] = None
+    mes: Optional[int] = None
+    factor_potencia: float
+    exceso_qvarh: float
+    costo_evitable: float
+
+# Factura marcada por la detección de anomalías; z_* son desviaciones respecto a la media móvil
+# de la sede y variacion_anual_* la variación respecto al mismo mes del año anterior
+class AnomaliaFactura(BaseModel):
+    costoid: int
+    sedeid: int
+    ano: int
+    mes: int
+    consumo_pkwh: Optional[float] = None
+    valor_factura: Optional[float] = None
+    media_consumo: Optional[float] = None
+    desviacion_consumo: Optional[float] = None
+    z_consumo: Optional[float] = None
+    media_valor: Optional[float] = None
+    desviacion_valor: Optional[float] = None
+    z_valor: Optional[float] = None
+    variacion_anual_consumo: Optional[float] = None
+    variacion_anual_valor: Optional[float] = None
+    motivos: str
+    detectado_en: datetime
+
 # Pydantic schema for CostoEnergia with optional fields
 class CostoEnergiaBase(BaseModel):
     sedeid: int
@@ -236,4 +330,39 @@ class Subestacion(SubestacionBase):
     subestacionid: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Resultado de una carga masiva desde archivo
+class ErrorFila(BaseModel):
+    fila: int
+    errores: List[str]
+
+class ResultadoCarga(BaseModel):
+    filas_leidas: int
+    insertadas: int
+    rechazadas: int
+    errores: List[ErrorFila]
+
+class ResultadoIngesta(BaseModel):
+    aceptadas: int
+    rechazadas: int
+    errores: List[ErrorFila]
+
+# Resultado por elemento de una operación por lotes (indice = posición en la lista enviada)
+class ResultadoItemLote(BaseModel):
+    indice: int
+    estado: str
+    id: Optional[Union[int, str]] = None
+    errores: Optional[List[str]] = None
+
+class ResultadoLote(BaseModel):
+    exitosos: int
+    fallidos: int
+    resultados: List[ResultadoItemLote]
+
+# Página de resultados con paginación por cursor; Pagina[Sede] documenta los items con su esquema
+Item = TypeVar('Item')
+
+class Pagina(BaseModel, Generic[Item]):
+    items: List[Item]
+    next_cursor: Optional[str] = None
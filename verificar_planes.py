@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import date
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+import cache
+import crud
+import crud_async
+import database
+import anomalias
+import factor_potencia
+import models
+
+# Verificación de planes de consulta: siembra una base dedicada con volúmenes realistas,
+# ejecuta las funciones de crud.py y crud_async.py, captura el SQL que emiten y corre EXPLAIN
+# sobre cada sentencia. Falla (código de salida 1) si una consulta caliente deja de usar un
+# índice (Seq Scan sobre una tabla grande) o si su plan supera el presupuesto de filas o de costo.
+
+# Base de datos dedicada: sus tablas se vacían y se vuelven a sembrar en cada corrida
+DBNAME = 'verificacion_planes'
+
+# Filas por tabla con --escala 1. La última fila de cada tabla padre queda sin hijos
+# para poder ejecutar los delete_* sin violar llaves foráneas.
+VOLUMENES = {
+    'usuarios': 2000,
+    'centros': 1200,
+    'sedes': 6000,
+    'ambientes': 60000,
+    'dispositivos': 300000,
+    'ocupacion': 1000000,
+    'subestaciones': 12000,
+}
+REGIONALES = 33
+MESES_DE_COSTOS = 36
+
+# Tablas tan pequeñas que un Seq Scan es el plan correcto; con --escala menor que 1 también lo es
+# para cualquier tabla con menos filas que MINIMO_SEQ_SCAN
+TABLAS_PEQUENAS = {'regionales'}
+MINIMO_SEQ_SCAN = 1000
+
+SENTENCIAS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+SIEMBRA = """
+TRUNCATE usuarios, regionales, centros, sedes, sede_centro, ambientes, dispositivos,
+         ocupacion, costos_energia, subestaciones RESTART IDENTITY CASCADE;
+
+INSERT INTO usuarios (nombre, apellido, correo_electronico, contrasena, tipo_de_usuario)
+SELECT 'Nombre ' || i, 'Apellido ' || i, 'usuario' || i || '@ejemplo.com', 'x',
+       (ARRAY['directivo', 'administrador', 'analista'])[i % 3 + 1]::tipo_usuario_enum
+FROM generate_series(1, :usuarios) AS i;
+
+INSERT INTO regionales (regionalid, nombre_de_la_region)
+SELECT i::text, 'Regional ' || i FROM generate_series(1, :regionales) AS i;
+
+INSERT INTO centros (centroid, nombre_del_centro, ciudad, regionalid)
+SELECT (9000 + i)::text, 'Centro de Formación ' || i, 'Municipio ' || (i % 400), (i % (:regionales - 1) + 1)::text
+FROM generate_series(1, :centros) AS i;
+
+INSERT INTO sedes (nombre_de_la_sede, direccion)
+SELECT 'Sede ' || i, 'Calle ' || (i % 200) || ' # ' || (i % 97) FROM generate_series(1, :sedes) AS i;
+
+INSERT INTO sede_centro (sedeid, centroid)
+SELECT i, (9000 + i % (:centros - 1) + 1)::text FROM generate_series(1, :sedes - 1) AS i;
+
+INSERT INTO ambientes (nombre, tipo_de_circuito, sedeid)
+SELECT 'Ambiente ' || i, 'Circuito ' || (i % 20), i % (:sedes - 1) + 1
+FROM generate_series(1, :ambientes) AS i;
+
+INSERT INTO dispositivos (nombre_del_dispositivo, consumo_energetico, fecha_de_instalacion, ambienteid)
+SELECT 'Dispositivo ' || i, (i * 37 % 5000) / 10.0, DATE '2015-01-01' + i % 3650, i % (:ambientes - 1) + 1
+FROM generate_series(1, :dispositivos) AS i;
+
+INSERT INTO ocupacion (ambienteid, cantidad_de_personas, tiempo_de_ocupacion, fecha)
+SELECT i % (:ambientes - 1) + 1, i % 40, (i % 8) * INTERVAL '1 hour', DATE '2022-01-01' + i / (:ambientes - 1)
+FROM generate_series(1, :ocupacion) AS i;
+
+INSERT INTO costos_energia (sedeid, ano, mes, fecha_inicio_factura, fecha_fin_factura,
+                            consumo_pkwh, consumo_qvarh, valor_factura, contrato)
+SELECT s, 2021 + m / 12, m % 12 + 1, make_date(2021 + m / 12, m % 12 + 1, 1),
+       (make_date(2021 + m / 12, m % 12 + 1, 1) + INTERVAL '1 month - 1 day')::date,
+       1000 + (s * 7 + m * 13) % 9000, 100 + (s + m) % 900, 800000 + (s * 31 + m) % 5000000, 'Contrato ' || s
+FROM generate_series(1, :sedes - 1) AS s, generate_series(0, :meses - 1) AS m;
+
+INSERT INTO subestaciones (nombre_sub, sedeid, nivel_tension_kva)
+SELECT 'Subestación ' || i, i % (:sedes - 1) + 1, (i % 10 + 1) * 75
+FROM generate_series(1, :subestaciones) AS i;
+"""
+
+TABLAS = ('usuarios', 'regionales', 'centros', 'sedes', 'sede_centro', 'ambientes', 'dispositivos',
+          'ocupacion', 'costos_energia', 'subestaciones', 'resumen_consumo_sede', 'rollup_energia_mensual',
+          'ocupacion_buckets', 'factor_potencia_sede', 'factor_potencia_factura', 'anomalias_factura',
+          'anomalias_pendientes')
+
+def volumenes(escala):
+    return {tabla: max(10, int(filas * escala)) for tabla, filas in VOLUMENES.items()}
+
+# Vaciar y sembrar la base dedicada, correr el análisis de factor de potencia y la detección de
+# anomalías sobre los costos sembrados y actualizar las estadísticas del planificador
+def sembrar(engine, v):
+    with engine.begin() as conexion:
+        for sentencia in SIEMBRA.split(';'):
+            if sentencia.strip():
+                conexion.execute(text(sentencia), {**v, 'regionales': REGIONALES, 'meses': MESES_DE_COSTOS})
+    with Session(engine) as db:
+        factor_potencia.ejecutar(db)
+        anomalias.ejecutar(db, completo=True)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.execute(text("ANALYZE " + ", ".join(TABLAS)))
+
+# Adaptador para correr las funciones de crud_async sobre la sesión síncrona de la verificación
+class _SesionAsync:
+    def __init__(self, db):
+        self.db = db
+
+    async def execute(self, consulta):
+        return self.db.execute(consulta)
+
+def _async(funcion, **argumentos):
+    return lambda db: asyncio.run(funcion(_SesionAsync(db), **argumentos))
+
+# Casos verificados: función a ejecutar y presupuesto de su plan.
+# filas y costo son los máximos estimados del nodo raíz; proporcional indica que el presupuesto
+# crece con --escala (filtros cuyo resultado depende del tamaño de la tabla, no de un padre) y
+# costo_proporcional que solo crece el costo (agregados que recorren la tabla y devuelven pocas filas).
+# Con --escala menor que 1 los presupuestos no se reducen.
+# seq_scan lista las tablas grandes que la consulta puede recorrer completas.
+def casos(v):
+    mitad = {tabla: filas // 2 for tabla, filas in v.items()}
+    ultimo = v
+    fecha = date(2022, 1, 5)
+    return [
+        # USUARIOS
+        {'nombre': 'get_usuario', 'llamar': lambda db: crud.get_usuario(db, mitad['usuarios']), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_usuario_by_correo', 'llamar': lambda db: crud.get_usuario_by_correo(db, 'usuario7@ejemplo.com'),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'get_usuarios_by_tipo', 'llamar': lambda db: crud.get_usuarios_by_tipo(db, 'analista'),
+         'filas': 1000, 'costo': 200, 'proporcional': True, 'seq_scan': ('usuarios',)},
+        {'nombre': 'update_usuario', 'llamar': lambda db: crud.update_usuario(db, mitad['usuarios'], {'nombre': 'Otro'}),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_usuario', 'llamar': lambda db: crud.delete_usuario(db, ultimo['usuarios']), 'filas': 1, 'costo': 20},
+        # REGIONALES
+        {'nombre': 'get_regional', 'llamar': lambda db: crud.get_regional(db, '5'), 'filas': 1, 'costo': 20},
+        {'nombre': 'update_regional', 'llamar': lambda db: crud.update_regional(db, '5', {'nombre_de_la_region': 'Otra'}),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_regional', 'llamar': lambda db: crud.delete_regional(db, str(REGIONALES)), 'filas': 1, 'costo': 20},
+        # CENTROS
+        {'nombre': 'get_centro', 'llamar': lambda db: crud.get_centro(db, 9005), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_centros_by_region', 'llamar': lambda db: crud.get_centros_by_region(db, 5),
+         'filas': 200, 'costo': 200, 'proporcional': True},
+        {'nombre': 'update_centro', 'llamar': lambda db: crud.update_centro(db, 9005, {'ciudad': 'Otra'}), 'filas': 1, 'costo': 20},
+        {'nombre': 'delete_centro', 'llamar': lambda db: crud.delete_centro(db, 9000 + ultimo['centros']), 'filas': 1, 'costo': 20},
+        # SEDES
+        {'nombre': 'get_sede', 'llamar': lambda db: crud.get_sede(db, mitad['sedes']), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_sedes_by_centro', 'llamar': lambda db: crud.get_sedes_by_centro(db, 9005), 'filas': 50, 'costo': 100},
+        {'nombre': 'update_sede', 'llamar': lambda db: crud.update_sede(db, mitad['sedes'], {'direccion': 'Otra'}), 'filas': 1, 'costo': 20},
+        {'nombre': 'delete_sede', 'llamar': lambda db: crud.delete_sede(db, ultimo['sedes']), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_sedeids_existentes', 'llamar': lambda db: crud.get_sedeids_existentes(db, set(range(1, v['sedes'] // 120 + 1))),
+         'filas': 50, 'costo': 500, 'proporcional': True},
+        # AMBIENTES
+        {'nombre': 'get_ambiente', 'llamar': lambda db: crud.get_ambiente(db, mitad['ambientes']), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_ambientes_by_sede', 'llamar': lambda db: crud.get_ambientes_by_sede(db, 5), 'filas': 50, 'costo': 100},
+        {'nombre': 'get_ambientes_por_tipo_de_circuito', 'llamar': lambda db: crud.get_ambientes_por_tipo_de_circuito(db, 'Circuito 3'),
+         'filas': 5000, 'costo': 2500, 'proporcional': True},
+        {'nombre': 'update_ambiente', 'llamar': lambda db: crud.update_ambiente(db, mitad['ambientes'], {'nombre': 'Otro'}),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_ambiente', 'llamar': lambda db: crud.delete_ambiente(db, ultimo['ambientes']), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_ambienteids_existentes', 'llamar': lambda db: crud.get_ambienteids_existentes(db, set(range(1, v['ambientes'] // 120 + 1))),
+         'filas': 500, 'costo': 2500, 'proporcional': True},
+        # DISPOSITIVOS
+        {'nombre': 'get_dispositivo', 'llamar': lambda db: crud.get_dispositivo(db, mitad['dispositivos']), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_dispositivos_by_ambiente', 'llamar': lambda db: crud.get_dispositivos_by_ambiente(db, 5),
+         'filas': 50, 'costo': 100},
+        {'nombre': 'get_dispositivos_por_fecha_instalacion',
+         'llamar': lambda db: crud.get_dispositivos_por_fecha_instalacion(db, date(2020, 3, 1), date(2020, 3, 31)),
+         'filas': 5000, 'costo': 5000, 'proporcional': True},
+        {'nombre': 'obtener_dispositivos_alto_consumo', 'llamar': lambda db: crud.obtener_dispositivos_alto_consumo(db, 5, 250.0),
+         'filas': 50, 'costo': 100},
+        {'nombre': 'update_dispositivo', 'llamar': lambda db: crud.update_dispositivo(db, mitad['dispositivos'], {'consumo_energetico': 1.5}),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_dispositivo', 'llamar': lambda db: crud.delete_dispositivo(db, mitad['dispositivos']), 'filas': 1, 'costo': 20},
+        # OCUPACIÓN
+        {'nombre': 'get_ocupacion', 'llamar': lambda db: crud.get_ocupacion(db, mitad['ocupacion']), 'filas': 1, 'costo': 20},
+        {'nombre': 'obtener_ocupacion_promedio',
+         'llamar': lambda db: crud.obtener_ocupacion_promedio(db, 5, date(2022, 1, 1), date(2022, 12, 31)), 'filas': 1, 'costo': 50},
+        {'nombre': 'get_resumen_ocupacion',
+         'llamar': lambda db: crud.get_resumen_ocupacion(db, 'sede', 5, date(2022, 1, 5), date(2022, 2, 20)), 'filas': 10, 'costo': 50},
+        {'nombre': 'get_serie_ocupacion',
+         'llamar': lambda db: crud.get_serie_ocupacion(db, 'sede', 5, 'dia', date(2022, 1, 1), date(2022, 1, 31)), 'filas': 31, 'costo': 100},
+        {'nombre': 'get_ocupacion_por_ambiente_y_fecha', 'llamar': lambda db: crud.get_ocupacion_por_ambiente_y_fecha(db, 5, fecha),
+         'filas': 10, 'costo': 50},
+        {'nombre': 'update_ocupacion', 'llamar': lambda db: crud.update_ocupacion(db, mitad['ocupacion'], {'cantidad_de_personas': 3}),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_ocupacion', 'llamar': lambda db: crud.delete_ocupacion(db, mitad['ocupacion']), 'filas': 1, 'costo': 20},
+        # COSTOS ENERGÍA
+        {'nombre': 'get_costo_energia', 'llamar': lambda db: crud.get_costo_energia(db, 100), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_costos_energia_por_ano_mes', 'llamar': lambda db: crud.get_costos_energia_por_ano_mes(db, 5, 2022, 6),
+         'filas': 10, 'costo': 50},
+        {'nombre': 'get_consumo_energetico_por_fecha',
+         'llamar': lambda db: crud.get_consumo_energetico_por_fecha(db, 5, date(2022, 1, 1), date(2022, 12, 31)),
+         'filas': 50, 'costo': 200},
+        # Las dos tablas tienen una fila por sede: con ~200 sedes por región el hash join es el plan barato
+        {'nombre': 'get_resumen_consumo_total_por_region', 'llamar': lambda db: crud.get_resumen_consumo_total_por_region(db, '5'),
+         'filas': 1, 'costo': 1000, 'costo_proporcional': True, 'seq_scan': ('sede_centro', 'resumen_consumo_sede')},
+        # El total nacional suma al leer las filas mensuales de todas las sedes (no hay fila nacional guardada)
+        {'nombre': 'get_rollup_energia_mensual', 'llamar': lambda db: crud.get_rollup_energia_mensual(db, 'nacional'),
+         'filas': MESES_DE_COSTOS, 'costo': 15000, 'costo_proporcional': True, 'seq_scan': ('rollup_energia_mensual',)},
+        {'nombre': 'get_rollup_energia_mensual_regional',
+         'llamar': lambda db: crud.get_rollup_energia_mensual(db, 'regional', '5', 2022, 2022), 'filas': 12, 'costo': 100},
+        {'nombre': 'get_factor_potencia_sede', 'llamar': lambda db: crud.get_factor_potencia_sede(db, 5), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_sedes_por_factor_potencia', 'llamar': lambda db: crud.get_sedes_por_factor_potencia(db, 'critico', 50),
+         'filas': 50, 'costo': 200},
+        {'nombre': 'get_facturas_factor_potencia', 'llamar': lambda db: crud.get_facturas_factor_potencia(db, 5),
+         'filas': MESES_DE_COSTOS, 'costo': 100},
+        {'nombre': 'get_anomalias_recientes', 'llamar': lambda db: crud.get_anomalias_recientes(db, 50), 'filas': 50, 'costo': 200},
+        {'nombre': 'get_anomalias_sede', 'llamar': lambda db: crud.get_anomalias_sede(db, 5), 'filas': MESES_DE_COSTOS, 'costo': 100},
+        {'nombre': 'update_costo_energia', 'llamar': lambda db: crud.update_costo_energia(db, 100, {'valor_factura': 1.0}),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_costo_energia', 'llamar': lambda db: crud.delete_costo_energia(db, 100), 'filas': 1, 'costo': 20},
+        # SUBESTACIONES
+        {'nombre': 'get_subestacion', 'llamar': lambda db: crud.get_subestacion(db, mitad['subestaciones']), 'filas': 1, 'costo': 20},
+        {'nombre': 'get_subestaciones_por_sede', 'llamar': lambda db: crud.get_subestaciones_por_sede(db, 5), 'filas': 20, 'costo': 50},
+        {'nombre': 'obtener_subestaciones_por_nivel_tension', 'llamar': lambda db: crud.obtener_subestaciones_por_nivel_tension(db, 150.0),
+         'filas': 2000, 'costo': 1000, 'proporcional': True, 'seq_scan': ('subestaciones',)},
+        {'nombre': 'update_subestacion', 'llamar': lambda db: crud.update_subestacion(db, mitad['subestaciones'], {'nombre_sub': 'Otra'}),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_subestacion', 'llamar': lambda db: crud.delete_subestacion(db, mitad['subestaciones']), 'filas': 1, 'costo': 20},
+        # LOTES
+        {'nombre': 'get_ids_existentes', 'llamar': lambda db: crud.get_ids_existentes(db, models.Dispositivo, set(range(1, 1001))),
+         'filas': 1000, 'costo': 5000},
+        {'nombre': 'update_lote',
+         'llamar': lambda db: crud.update_lote(db, models.Dispositivo, [{'deviceid': i, 'consumo_energetico': 1.0} for i in range(1, 101)]),
+         'filas': 1, 'costo': 20},
+        {'nombre': 'delete_lote', 'llamar': lambda db: crud.delete_lote(db, models.Ocupacion, range(1, 1001)), 'filas': 1000, 'costo': 5000},
+        # LISTAS PAGINADAS (crud_async)
+        {'nombre': 'async.get_usuarios_by_tipo', 'llamar': _async(crud_async.get_usuarios_by_tipo, tipo_de_usuario='analista'),
+         'filas': 101, 'costo': 100},
+        {'nombre': 'async.get_centros_by_region', 'llamar': _async(crud_async.get_centros_by_region, regionalid=5), 'filas': 101, 'costo': 200},
+        {'nombre': 'async.get_centros_por_ciudad', 'llamar': _async(crud_async.get_centros_por_ciudad, ciudad='municipio 7'),
+         'filas': 101, 'costo': 200, 'seq_scan': ('centros',)},
+        {'nombre': 'async.get_sedes_by_centro', 'llamar': _async(crud_async.get_sedes_by_centro, centroid=9005), 'filas': 101, 'costo': 200},
+        {'nombre': 'async.get_ambientes_by_sede', 'llamar': _async(crud_async.get_ambientes_by_sede, sedeid=5), 'filas': 101, 'costo': 100},
+        {'nombre': 'async.get_ambientes_por_tipo_de_circuito',
+         'llamar': _async(crud_async.get_ambientes_por_tipo_de_circuito, tipo_de_circuito='Circuito 3', after=mitad['ambientes']),
+         'filas': 101, 'costo': 1000},
+        {'nombre': 'async.get_dispositivos_by_ambiente', 'llamar': _async(crud_async.get_dispositivos_by_ambiente, ambienteid=5),
+         'filas': 101, 'costo': 100},
+        {'nombre': 'async.obtener_dispositivos_alto_consumo',
+         'llamar': _async(crud_async.obtener_dispositivos_alto_consumo, ambienteid=5, consumo_minimo=250.0), 'filas': 101, 'costo': 100},
+        {'nombre': 'async.get_costos_energia_por_ano_mes',
+         'llamar': _async(crud_async.get_costos_energia_por_ano_mes, sedeid=5, ano=2022, mes=6), 'filas': 101, 'costo': 50},
+        {'nombre': 'async.get_consumo_energetico_por_fecha',
+         'llamar': _async(crud_async.get_consumo_energetico_por_fecha, sedeid=5, fecha_inicio=date(2022, 1, 1), fecha_fin=date(2022, 12, 31)),
+         'filas': 101, 'costo': 200},
+        {'nombre': 'async.get_ocupacion_por_ambiente_y_fecha',
+         'llamar': _async(crud_async.get_ocupacion_por_ambiente_y_fecha, ambienteid=5, fecha=fecha), 'filas': 101, 'costo': 50},
+        {'nombre': 'async.get_subestaciones_por_sede', 'llamar': _async(crud_async.get_subestaciones_por_sede, sedeid=5),
+         'filas': 101, 'costo': 50},
+    ]
+
+def _nodos(plan):
+    yield plan
+    for hijo in plan.get('Plans', []):
+        yield from _nodos(hijo)
+
+# Comparar el plan de una sentencia con el presupuesto del caso y devolver las violaciones;
+# filas_tablas son las filas de cada tabla según las estadísticas del planificador
+def revisar_plan(plan, caso, escala, filas_tablas):
+    factor = max(1, escala)
+    factor_filas = factor if caso.get('proporcional') else 1
+    factor_costo = factor if caso.get('proporcional') or caso.get('costo_proporcional') else 1
+    permitidas = TABLAS_PEQUENAS | set(caso.get('seq_scan', ()))
+    problemas = []
+    for nodo in _nodos(plan):
+        tabla = nodo.get('Relation Name')
+        if (nodo['Node Type'] == 'Seq Scan' and tabla not in permitidas
+                and filas_tablas.get(tabla, 0) >= MINIMO_SEQ_SCAN):
+            problemas.append(f"Seq Scan sobre {tabla}")
+    if plan['Plan Rows'] > caso['filas'] * factor_filas:
+        problemas.append(f"filas estimadas {plan['Plan Rows']} > {caso['filas'] * factor_filas:g}")
+    if plan['Total Cost'] > caso['costo'] * factor_costo:
+        problemas.append(f"costo {plan['Total Cost']} > {caso['costo'] * factor_costo:g}")
+    return problemas
+
+# Filas de cada tabla según pg_class (las deja al día el ANALYZE de sembrar)
+def filas_por_tabla(conexion):
+    consulta = text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace")
+    return {tabla: filas for tabla, filas in conexion.execute(consulta)}
+
+def indices(plan):
+    return sorted({nodo['Index Name'] for nodo in _nodos(plan) if 'Index Name' in nodo})
+
+# Ejecutar cada caso dentro de una transacción que se revierte al final, capturar sus
+# sentencias y correr EXPLAIN sobre cada una con los mismos parámetros
+def verificar(engine, v, escala):
+    capturadas = []
+    capturando = False
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if capturando and statement.lstrip().upper().startswith(SENTENCIAS):
+            # En executemany basta con el plan del primer juego de parámetros
+            capturadas.append((statement, parameters[0] if executemany else parameters))
+
+    resultados = []
+    with engine.connect() as conexion:
+        transaccion = conexion.begin()
+        filas_tablas = filas_por_tabla(conexion)
+        try:
+            for caso in casos(v):
+                capturadas.clear()
+                db = Session(bind=conexion, join_transaction_mode="create_savepoint")
+                capturando = True
+                try:
+                    caso['llamar'](db)
+                    error = None
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                finally:
+                    capturando = False
+                    db.close()
+
+                resultado = {'caso': caso['nombre'], 'sentencias': [], 'problemas': []}
+                if error:
+                    resultado['problemas'].append(error)
+                elif not capturadas:
+                    resultado['problemas'].append("no emitió SQL")
+                for sentencia, parametros in capturadas:
+                    explain = conexion.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sentencia, parametros).scalar()
+                    plan = explain[0]['Plan']
+                    resultado['problemas'].extend(revisar_plan(plan, caso, escala, filas_tablas))
+                    resultado['sentencias'].append({
+                        'sql': " ".join(sentencia.split()),
+                        'nodo': plan['Node Type'],
+                        'filas': plan['Plan Rows'],
+                        'costo': plan['Total Cost'],
+                        'indices': indices(plan),
+                    })
+                resultados.append(resultado)
+        finally:
+            transaccion.rollback()
+    return resultados
+
+def imprimir(resultado):
+    estado = "FALLA" if resultado['problemas'] else "ok"
+    detalle = "; ".join(
+        f"{s['nodo']} filas={s['filas']} costo={s['costo']}" + (f" [{', '.join(s['indices'])}]" if s['indices'] else "")
+        for s in resultado['sentencias']
+    )
+    print(f"{estado:<6}{resultado['caso']:<45}{detalle}")
+    for problema in resultado['problemas']:
+        print(f"{'':<8}- {problema}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica con EXPLAIN los planes de las consultas de crud.py y crud_async.py.")
+    parser.add_argument("--dbname", default=DBNAME, help="Base de datos dedicada (se vacía y se vuelve a sembrar)")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplicador de los volúmenes sembrados")
+    parser.add_argument("--sin-siembra", action="store_true", help="Reutilizar los datos sembrados en la corrida anterior")
+    parser.add_argument("--salida", default=None, help="Archivo JSON donde guardar los planes")
+    args = parser.parse_args()
+
+    # Sin el log de SQL de database.py, y con caché local para que ningún caso se resuelva sin ir a la base
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    cache.almacen = cache.CacheLocal()
+
+    engine = create_engine(make_url(database.DATABASE_URL).set(database=args.dbname))
+    v = volumenes(args.escala)
+    if not args.sin_siembra:
+        print(f"Sembrando {args.dbname}: " + ", ".join(f"{tabla}={filas}" for tabla, filas in v.items()))
+        sembrar(engine, v)
+
+    resultados = verificar(engine, v, args.escala)
+    for resultado in resultados:
+        imprimir(resultado)
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Planes guardados en {args.salida}")
+
+    fallidos = [resultado['caso'] for resultado in resultados if resultado['problemas']]
+    print(f"{len(resultados) - len(fallidos)}/{len(resultados)} casos dentro del presupuesto")
+    sys.exit(1 if fallidos else 0)